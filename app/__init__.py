@@ -11,19 +11,33 @@ def create_app(config_class='config.DevelopmentConfig'):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config_class)
 
-    # Ensure the instance folder exists
-    try:
-        os.makedirs(app.instance_path)
-    except OSError:
-        pass # Directory already exists
+    # Encode responses with orjson when it is installed (see JSON_BACKEND)
+    from .json_provider import make_json_provider
+    app.json = make_json_provider(app)
 
-    # Initialize logging
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Ensure the instance folder exists, unless the databases are all in memory
+    if app.config['DATABASE'] != ':memory:' or app.config['RATE_LIMIT_DATABASE'] != ':memory:':
+        try:
+            os.makedirs(app.instance_path)
+        except OSError:
+            pass # Directory already exists
+
+    # Initialize logging: a queue and a writer thread, with request ids
+    from . import logs
+    logs.init_app(app)
 
     # Initialize database
     from . import database
     database.init_app(app)
 
+    # Fail fast on rate limit settings that can't work
+    from . import admission
+    admission.check_config(app.config)
+
+    # Initialize request and SQL metrics
+    from . import metrics
+    metrics.init_app(app)
+
     # Register blueprints
     from . import routes
     app.register_blueprint(routes.bp, url_prefix='/api')
@@ -35,7 +49,7 @@ def create_app(config_class='config.DevelopmentConfig'):
 
     @app.errorhandler(500)
     def internal_error(error):
-        logging.error(f"Internal Server Error: {error}")
+        logging.error("Internal Server Error: %s", error)
         return jsonify({'error': 'Internal Server Error'}), 500
 
     @app.route('/')
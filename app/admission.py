@@ -0,0 +1,213 @@
+# ==============================================================================
+#  FILE: app/admission.py
+#  DESCRIPTION: Admission control and per-client rate limits for write routes.
+# ==============================================================================
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+import functools
+from flask import request, jsonify, current_app
+
+from .metrics import REGISTRY
+
+# One bucket per client key. A bucket that has refilled completely holds no
+# information, so it is deleted and a missing row means a full bucket.
+CREATE_BUCKETS_SQL = """
+    CREATE TABLE IF NOT EXISTS TokenBuckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+"""
+# Lets evict_full() find refilled buckets without scanning every client's.
+CREATE_BUCKETS_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_token_buckets_updated_at ON TokenBuckets (updated_at)"
+# Refills the bucket for the time since its last update and takes one token,
+# in one statement. The WHERE skips the update when less than a token is
+# left, and RETURNING then gives no row. Parameters: key, burst - 1, now,
+# burst, rate, burst, rate.
+TAKE_TOKEN_SQL = """
+    INSERT INTO TokenBuckets (key, tokens, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = min(?, tokens + (excluded.updated_at - updated_at) * ?) - 1,
+        updated_at = excluded.updated_at
+    WHERE min(?, tokens + (excluded.updated_at - updated_at) * ?) >= 1
+    RETURNING tokens
+"""
+BUCKET_SQL = "SELECT tokens, updated_at FROM TokenBuckets WHERE key = ?"
+EVICT_FULL_BUCKETS_SQL = "DELETE FROM TokenBuckets WHERE updated_at <= ?"
+
+class AdmissionGate:
+    """
+    Caps the write requests one worker runs at once at `limit`.
+
+    Up to `queue_size` more wait for a slot, each until its own deadline;
+    anything beyond that is turned away at once instead of piling up behind
+    SQLite's single writer and holding a worker thread meanwhile.
+    """
+
+    def __init__(self, limit=4, queue_size=16):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.pid = os.getpid()
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def enter(self, timeout):
+        """
+        Takes a slot, waiting at most `timeout` seconds. Returns None once
+        admitted, else why not: 'queue_full' or 'queue_timeout'.
+        """
+        with self._cond:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                return None
+            if self.waiting >= self.queue_size:
+                return 'queue_full'
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.in_flight < self.limit, timeout):
+                    return 'queue_timeout'
+                self.in_flight += 1
+                return None
+            finally:
+                self.waiting -= 1
+
+    def leave(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+class TokenBucketLimiter:
+    """
+    Token buckets shared by every worker through a small SQLite file of their own.
+
+    Each client gets `burst` tokens, refilled at `rate` per second, and each
+    request takes one. A check is a single UPSERT in autocommit mode, with
+    synchronous=OFF: losing the last moments of limiter state in a crash
+    only forgives a few requests. The file is separate from the studio's
+    database, so checks never wait for the booking write lock.
+    """
+
+    def __init__(self, database, rate=1.0, burst=20, busy_timeout_ms=1000):
+        self.database = database
+        self.rate = rate
+        self.burst = burst
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._next_eviction = 0.0
+        self._conn = sqlite3.connect(database, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+        if database != ':memory:':
+            self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = OFF')
+        self._conn.execute(CREATE_BUCKETS_SQL)
+        self._conn.execute(CREATE_BUCKETS_INDEX_SQL)
+
+    def take(self, key, now=None):
+        """Takes a token for `key`. Returns 0 if allowed, else the seconds until one is available."""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(TAKE_TOKEN_SQL, (key, self.burst - 1, now, self.burst, self.rate,
+                                                      self.burst, self.rate)).fetchone()
+            if row is not None:
+                return 0
+            tokens, updated_at = self._conn.execute(BUCKET_SQL, (key,)).fetchone()
+        available = min(self.burst, tokens + (now - updated_at) * self.rate)
+        return (1 - available) / self.rate
+
+    def evict_full(self, now, interval):
+        """Deletes the buckets that have refilled, at most once per `interval` seconds in each worker."""
+        with self._lock:
+            if now < self._next_eviction:
+                return 0
+            self._next_eviction = now + interval
+            return self._conn.execute(EVICT_FULL_BUCKETS_SQL, (now - self.burst / self.rate,)).rowcount
+
+    def close(self):
+        self._conn.close()
+
+def check_config(config):
+    """Raises ValueError at start-up for rate limit settings that can't work."""
+    if not config['RATE_LIMIT_ENABLED']:
+        return
+    if not config['RATE_LIMIT_PER_SECOND'] > 0:
+        raise ValueError("Invalid RATE_LIMIT_PER_SECOND: must be positive. "
+                         "Set RATE_LIMIT_ENABLED = False to turn the rate limit off.")
+    if not config['RATE_LIMIT_BURST'] >= 1:
+        raise ValueError("Invalid RATE_LIMIT_BURST: must be at least 1.")
+
+_admission_lock = threading.Lock()
+
+def get_admission_gate():
+    """Returns this process's write admission gate."""
+    with _admission_lock:
+        gate = current_app.extensions.get('admission_gate')
+        # A forked worker must not inherit the parent's in-flight count.
+        if gate is None or gate.pid != os.getpid():
+            config = current_app.config
+            gate = AdmissionGate(config['WRITE_CONCURRENCY_LIMIT'], config['WRITE_QUEUE_SIZE'])
+            current_app.extensions['admission_gate'] = gate
+        return gate
+
+def get_rate_limiter():
+    """Returns this process's connection to the shared token buckets, or None when rate limiting is off."""
+    config = current_app.config
+    if not config['RATE_LIMIT_ENABLED']:
+        return None
+    with _admission_lock:
+        limiter = current_app.extensions.get('rate_limiter')
+        # SQLite connections must not be used across fork().
+        if limiter is None or limiter.pid != os.getpid():
+            limiter = TokenBucketLimiter(config['RATE_LIMIT_DATABASE'], config['RATE_LIMIT_PER_SECOND'],
+                                         config['RATE_LIMIT_BURST'])
+            current_app.extensions['rate_limiter'] = limiter
+        return limiter
+
+def client_key():
+    """Who a write request counts against: its client's email when it names one, else its IP address."""
+    body = request.get_json(silent=True)
+    email = body.get('client_email') if isinstance(body, dict) else request.args.get('email')
+    if isinstance(email, str) and email.strip():
+        return 'email:' + email.strip().lower()
+    return 'ip:' + (request.remote_addr or 'unknown')
+
+def rejected(status, error, retry_after, reason):
+    REGISTRY.inc('admission_rejected_total', (reason,))
+    return jsonify({'error': error}), status, {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+def admit_writes(view):
+    """
+    Wraps a write route in the client's rate limit (429) and the worker's
+    admission gate (503), both answered at once with Retry-After.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            now = time.time()
+            try:
+                wait = limiter.take(client_key(), now)
+                limiter.evict_full(now, config['RATE_LIMIT_EVICT_INTERVAL'])
+            except sqlite3.Error as e:
+                # Fail open: an unavailable limiter must not stop bookings.
+                logging.error("Rate limit check failed: %s", e)
+                wait = 0
+            if wait:
+                return rejected(429, 'Too many requests, please slow down.', wait, 'rate_limited')
+
+        gate = get_admission_gate()
+        started = time.perf_counter()
+        reason = gate.enter(config['WRITE_QUEUE_TIMEOUT'])
+        if reason is not None:
+            return rejected(503, 'The studio is busy, please try again.', config['WRITE_RETRY_AFTER'], reason)
+        REGISTRY.observe('admission_queue_wait_seconds', (), time.perf_counter() - started)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            gate.leave()
+    return wrapper
@@ -0,0 +1,290 @@
+# ==============================================================================
+#  FILE: app/booking.py
+#  DESCRIPTION: Booking rules shared by the single and batch booking routes.
+# ==============================================================================
+import re
+import json
+import time
+import sqlite3
+from collections import namedtuple
+
+from .schedules import materialize
+
+REQUIRED_FIELDS = ['class_id', 'client_name', 'client_email']
+
+# Users are resolved with two set-based statements whatever the batch size;
+# the emails and names travel as a single JSON parameter.
+CREATE_USERS_SQL = """
+    INSERT INTO Users (name, email, password_hash)
+    SELECT json_extract(value, '$[1]'), json_extract(value, '$[0]'), 'dummy_password'
+    FROM json_each(?) WHERE true
+    ON CONFLICT (email) DO NOTHING
+"""
+FIND_USERS_SQL = "SELECT user_id, email FROM Users WHERE email IN (SELECT value FROM json_each(?))"
+TAKE_SLOT_SQL = """
+    UPDATE Classes SET available_slots = available_slots - 1
+    WHERE class_id = ? AND available_slots > 0 AND start_time > ?
+    RETURNING available_slots
+"""
+CLASS_START_SQL = "SELECT start_time FROM Classes WHERE class_id = ?"
+INSERT_BOOKING_SQL = "INSERT INTO Bookings (user_id, class_id) VALUES (?, ?)"
+IS_BOOKED_SQL = "SELECT 1 FROM Bookings WHERE user_id = ? AND class_id = ?"
+
+# Every class has its own queue counters: next_position only grows and hands
+# out tickets, waiting is the current queue length. Joining, leaving and
+# promoting each touch one counter row and one index entry.
+JOIN_QUEUE_SQL = """
+    INSERT INTO WaitlistQueues (class_id, next_position, waiting) VALUES (?, 1, 1)
+    ON CONFLICT (class_id) DO UPDATE SET next_position = next_position + 1, waiting = waiting + 1
+    RETURNING next_position, waiting
+"""
+LEAVE_QUEUE_SQL = "UPDATE WaitlistQueues SET waiting = waiting - 1 WHERE class_id = ?"
+INSERT_WAITLIST_SQL = "INSERT INTO Waitlist (class_id, user_id, position) VALUES (?, ?, ?)"
+WAITLIST_HEAD_SQL = "SELECT waitlist_id, user_id FROM Waitlist WHERE class_id = ? ORDER BY position LIMIT 1"
+DELETE_WAITLIST_SQL = "DELETE FROM Waitlist WHERE waitlist_id = ?"
+FIND_WAITLIST_SQL = """
+    SELECT w.class_id FROM Waitlist w JOIN Users u ON u.user_id = w.user_id
+    WHERE w.waitlist_id = ? AND u.email = ?
+"""
+FIND_BOOKING_SQL = """
+    SELECT b.class_id, c.start_time FROM Bookings b
+    JOIN Users u ON u.user_id = b.user_id
+    JOIN Classes c ON c.class_id = b.class_id
+    WHERE b.booking_id = ? AND u.email = ?
+"""
+DELETE_BOOKING_SQL = "DELETE FROM Bookings WHERE booking_id = ?"
+GIVE_BACK_SLOT_SQL = "UPDATE Classes SET available_slots = min(capacity, available_slots + 1) WHERE class_id = ?"
+
+# Finished bookings by Idempotency-Key, written in the booking's own transaction.
+FIND_IDEMPOTENT_SQL = """
+    SELECT request_hash, booking_id, waitlist_id, position, expires_at FROM IdempotencyKeys
+    WHERE key = ? AND expires_at > ?
+"""
+# An expired key that hasn't been evicted yet is simply replaced.
+REMEMBER_IDEMPOTENT_SQL = """
+    INSERT OR REPLACE INTO IdempotencyKeys (key, request_hash, booking_id, waitlist_id, position, expires_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# The per-item error when a booking's user can't be stored; validate_booking()
+# normally catches the cause first.
+INVALID_CLIENT = 'Invalid client: client_name and client_email must be non-empty strings.'
+
+# What a booking attempt ended with: a booking_id, or a place on the waitlist.
+Reservation = namedtuple('Reservation', 'booking_id waitlist_id position')
+
+class IdempotencyConflict(ValueError):
+    """Raised when an Idempotency-Key is reused for a different booking."""
+
+    def __init__(self):
+        super().__init__("This Idempotency-Key was already used for a different booking.")
+
+class ClassFull(ValueError):
+    """Raised by reserve_slot() when the class has no slot left."""
+
+    def __init__(self, class_id):
+        super().__init__("No available slots for this class.")
+        self.class_id = class_id
+
+def validate_booking(data):
+    """
+    Checks one booking payload.
+
+    Returns (booking, None) with the normalized fields on success,
+    or (None, error) with the message book_class has always returned.
+    """
+    if not data or not isinstance(data, dict) or not all(k in data for k in REQUIRED_FIELDS):
+        return None, f'Missing data: {", ".join(REQUIRED_FIELDS)} are required.'
+    # bool is an int subclass, but True is no class id.
+    if not isinstance(data['class_id'], int) or isinstance(data['class_id'], bool):
+        return None, 'Invalid class_id: must be an integer.'
+    if not isinstance(data['client_name'], str) or not data['client_name'].strip():
+        return None, 'Invalid client_name: must be a non-empty string.'
+    if not isinstance(data['client_email'], str):
+        return None, 'Invalid email format.'
+    client_email = data['client_email'].lower() # Normalize email
+    if not re.match(r"[^@]+@[^@]+\.[^@]+", client_email):
+        return None, 'Invalid email format.'
+    return {'class_id': data['class_id'], 'client_name': data['client_name'], 'client_email': client_email}, None
+
+def resolve_users(cursor, bookings):
+    """Finds or creates the users behind the bookings; returns {email: user_id}."""
+    people = json.dumps([[b['client_email'], b['client_name']] for b in bookings])
+    emails = json.dumps(sorted({b['client_email'] for b in bookings}))
+    cursor.execute(CREATE_USERS_SQL, (people,))
+    cursor.execute(FIND_USERS_SQL, (emails,))
+    return {row[1]: row[0] for row in cursor.fetchall()}
+
+def reserve_slot(cursor, user_id, class_id, now_utc):
+    """
+    Takes a slot in the class and records the booking; returns the booking_id.
+
+    Raises ValueError with the client-facing reason when the class cannot be
+    booked. The caller must roll back (the transaction or a savepoint) so the
+    slot taken here is given back.
+    """
+    if class_id < 0:
+        # An occurrence of a recurring schedule gets its Classes row on first booking.
+        class_id = materialize(cursor, class_id, now_utc)
+    # Take a slot only if the class has one left and hasn't started yet.
+    cursor.execute(TAKE_SLOT_SQL, (class_id, now_utc))
+    if cursor.fetchone() is None:
+        # Only the failure path pays for a second lookup to explain why.
+        cursor.execute(CLASS_START_SQL, (class_id,))
+        class_info = cursor.fetchone()
+        if not class_info:
+            raise ValueError("Class not found.")
+        if class_info[0] <= now_utc:
+            raise ValueError("Cannot book a class that has already started.")
+        raise ClassFull(class_id)
+
+    # The unique (user_id, class_id) index rejects double bookings.
+    try:
+        cursor.execute(INSERT_BOOKING_SQL, (user_id, class_id))
+    except sqlite3.IntegrityError:
+        raise ValueError("You are already booked for this class.")
+    return cursor.lastrowid
+
+def join_waitlist(cursor, user_id, class_id):
+    """Puts the user at the back of the class's waitlist; returns (waitlist_id, position)."""
+    cursor.execute(IS_BOOKED_SQL, (user_id, class_id))
+    if cursor.fetchone():
+        raise ValueError("You are already booked for this class.")
+    cursor.execute(JOIN_QUEUE_SQL, (class_id,))
+    ticket, waiting = cursor.fetchone()
+    # The unique (user_id, class_id) index rejects joining twice.
+    try:
+        cursor.execute(INSERT_WAITLIST_SQL, (class_id, user_id, ticket))
+    except sqlite3.IntegrityError:
+        raise ValueError("You are already on the waitlist for this class.")
+    return cursor.lastrowid, waiting
+
+def reserve_or_wait(cursor, user_id, class_id, now_utc):
+    """
+    Books a slot, or joins the waitlist if the class is full, so clients get
+    a queue position instead of an error to retry on. Returns a Reservation.
+    """
+    try:
+        return Reservation(reserve_slot(cursor, user_id, class_id, now_utc), None, None)
+    except ClassFull as e:
+        waitlist_id, position = join_waitlist(cursor, user_id, e.class_id)
+        return Reservation(None, waitlist_id, position)
+
+def find_reservation(cursor, key, request_hash):
+    """
+    Returns the stored Reservation for an unexpired Idempotency-Key, or None.
+    Raises IdempotencyConflict if the key was used for a different request.
+    """
+    cursor.execute(FIND_IDEMPOTENT_SQL, (key, int(time.time())))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if row[0] != request_hash:
+        raise IdempotencyConflict()
+    return Reservation(*row[1:4])
+
+def reserve_once(cursor, user_id, booking, now_utc):
+    """
+    reserve_or_wait() for a booking that may carry an Idempotency-Key.
+
+    The key's outcome is stored in the same transaction as the booking, so it
+    is recorded exactly when the booking is. A key found here (another worker
+    finished it while we waited for the write lock) is answered from the store.
+    """
+    key = booking.get('idempotency_key')
+    if key is not None:
+        stored = find_reservation(cursor, key, booking['request_hash'])
+        if stored is not None:
+            return stored
+    reservation = reserve_or_wait(cursor, user_id, booking['class_id'], now_utc)
+    if key is not None:
+        cursor.execute(REMEMBER_IDEMPOTENT_SQL, (key, booking['request_hash']) + tuple(reservation)
+                       + (booking['idempotency_expires_at'],))
+    return reservation
+
+def promote_waitlist(cursor, class_id):
+    """
+    Hands a freed slot to the head of the class's waitlist and returns the new
+    booking_id, or None if nobody is waiting (the caller gives the slot back).
+    """
+    while True:
+        cursor.execute(WAITLIST_HEAD_SQL, (class_id,))
+        head = cursor.fetchone()
+        if head is None:
+            return None
+        cursor.execute(DELETE_WAITLIST_SQL, (head[0],))
+        cursor.execute(LEAVE_QUEUE_SQL, (class_id,))
+        try:
+            cursor.execute(INSERT_BOOKING_SQL, (head[1], class_id))
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            # Booked in the meantime, e.g. after a capacity increase; try the next one.
+            continue
+
+def cancel_booking(cursor, booking_id, email, now_utc):
+    """
+    Cancels a booking made by `email`; the slot goes straight to the head of
+    the waitlist in the same transaction. Returns the promoted booking_id or
+    None. Raises LookupError if there is no such booking, ValueError if the
+    class has already started.
+    """
+    cursor.execute(FIND_BOOKING_SQL, (booking_id, email))
+    booking = cursor.fetchone()
+    if booking is None:
+        raise LookupError("Booking not found.")
+    class_id, start_time = booking
+    if start_time <= now_utc:
+        raise ValueError("Cannot cancel a class that has already started.")
+    cursor.execute(DELETE_BOOKING_SQL, (booking_id,))
+    promoted = promote_waitlist(cursor, class_id)
+    if promoted is None:
+        cursor.execute(GIVE_BACK_SLOT_SQL, (class_id,))
+    return promoted
+
+def leave_waitlist(cursor, waitlist_id, email):
+    """Removes `email` from a waitlist; raises LookupError if there is no such entry."""
+    cursor.execute(FIND_WAITLIST_SQL, (waitlist_id, email))
+    entry = cursor.fetchone()
+    if entry is None:
+        raise LookupError("Waitlist entry not found.")
+    cursor.execute(DELETE_WAITLIST_SQL, (waitlist_id,))
+    cursor.execute(LEAVE_QUEUE_SQL, (entry[0],))
+
+def reserve_each(cursor, bookings, now_utc):
+    """
+    Books every item inside the current transaction, waitlisting those for
+    full classes.
+
+    Each item runs in its own savepoint, so a failed item is undone without
+    affecting the others. Users are resolved for all items at once; if one
+    item's user can't be created, each item resolves its own in its savepoint
+    instead, so only that item fails. Returns a list of (Reservation, error)
+    pairs, where error is the ValueError (e.g. IdempotencyConflict) an item
+    failed with.
+    """
+    cursor.execute('SAVEPOINT booking_users')
+    try:
+        user_ids = resolve_users(cursor, bookings)
+    except sqlite3.IntegrityError:
+        cursor.execute('ROLLBACK TO booking_users')
+        user_ids = None
+    cursor.execute('RELEASE booking_users')
+    outcomes = []
+    for booking in bookings:
+        cursor.execute('SAVEPOINT booking_item')
+        try:
+            if user_ids is None:
+                user_id = resolve_users(cursor, [booking])[booking['client_email']]
+            else:
+                user_id = user_ids[booking['client_email']]
+            reservation = reserve_once(cursor, user_id, booking, now_utc)
+        except sqlite3.IntegrityError:
+            cursor.execute('ROLLBACK TO booking_item')
+            outcomes.append((None, ValueError(INVALID_CLIENT)))
+        except ValueError as e:
+            cursor.execute('ROLLBACK TO booking_item')
+            outcomes.append((None, e))
+        else:
+            outcomes.append((reservation, None))
+        cursor.execute('RELEASE booking_item')
+    return outcomes
@@ -0,0 +1,67 @@
+# ==============================================================================
+#  FILE: app/cache.py
+#  DESCRIPTION: Versioned response cache for read-heavy listings.
+# ==============================================================================
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from flask import current_app
+
+DATA_VERSION_SQL = "SELECT generation, version FROM DataVersions WHERE name = ?"
+
+# version is the (generation, version) pair from DataVersions when the body
+# was built. expires_at is the UTC start time of the earliest class in the
+# body: once that class starts, it drops out of the listing.
+CachedResponse = namedtuple('CachedResponse', 'version expires_at etag body headers')
+
+def data_version(db, name):
+    """Reads the shared (generation, version) pair that writes to `name` bump."""
+    row = db.execute(DATA_VERSION_SQL, (name,)).fetchone()
+    return tuple(row) if row else None
+
+def make_etag(body):
+    """A strong ETag: the same bytes always produce the same tag, in every worker."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+class ResponseCache:
+    """A small thread-safe LRU of serialized responses for one worker process."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, now_utc):
+        """Returns the cached response if it was built from `version` and hasn't expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None or entry.version != version
+                    or (entry.expires_at is not None and now_utc >= entry.expires_at)):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def get_response_cache(name):
+    """Returns this process's response cache for `name`, or None when caching is off."""
+    if not current_app.config['RESPONSE_CACHE_ENABLED']:
+        return None
+    caches = current_app.extensions.setdefault('response_caches', {})
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches.setdefault(name, ResponseCache(current_app.config['RESPONSE_CACHE_MAX_ENTRIES']))
+    return cache
@@ -2,81 +2,315 @@
 #  FILE: app/database.py
 #  DESCRIPTION: Database connection with explicit initialization command.
 # ==============================================================================
+import os
+import sys
+import time
+import atexit
+import random
 import sqlite3
 import logging
+import pathlib
 import datetime
+import threading
 import click
 from flask import g, current_app
 from flask.cli import with_appcontext
 
 # Import timezone utilities from the same package
-from .utils import to_utc, DEFAULT_TZ
+from .utils import to_utc, DEFAULT_TZ_NAME, get_timezone
+from .migrations import migrate, check_query_plans, schema_version, LATEST_VERSION
+from .importer import FORMATS, detect_format, read_rows, import_classes
+from .schedules import WEEKDAYS, INSERT_SCHEDULE_SQL, validate_schedule
+from .metrics import REGISTRY, InstrumentedConnection
+from .shards import get_shards, shard_for_studio, prepare_shard
 
-def get_db():
-    if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
+class ConnectionPool:
+    """
+    A per-process pool of SQLite connections that are configured once.
+
+    With read_only, connections are opened through a mode=ro URI: under WAL
+    they read the last committed state and never take the write lock. With
+    template, each new in-memory connection starts as a copy of the seeded
+    template database (see clone_template()).
+    """
+
+    def __init__(self, database, size=8, busy_timeout_ms=5000, cache_size_kib=16384,
+                 mmap_size=0, cached_statements=128, journal_mode='WAL', synchronous='NORMAL',
+                 factory=sqlite3.Connection, read_only=False, template=False):
+        self.database = database
+        self.read_only = read_only
+        self.template = template and database == ':memory:'
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.factory = factory
+        self.pid = os.getpid()
+        self._idle = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._counters = {'created': 0, 'reused': 0, 'returned': 0, 'discarded': 0}
+
+    def _connect(self):
+        """Opens a new connection and applies the per-connection PRAGMAs."""
+        database = self.database
+        if self.read_only:
+            database = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=self.busy_timeout_ms / 1000.0,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,  # Connections move between request threads.
+            factory=self.factory,
+            uri=self.read_only
+        )
+        conn.row_factory = sqlite3.Row
+        # The journal mode is a property of the file, set by the writers.
+        if not self.read_only:
+            conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+            conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        # A negative cache_size is interpreted by SQLite as KiB rather than pages.
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_size_kib)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        if self.template:
+            clone_template(conn)
+        return conn
+
+    def acquire(self):
+        """Borrows an idle connection, opening a new one if none is available."""
+        with self._lock:
+            self._in_use += 1
+            if self._idle:
+                self._counters['reused'] += 1
+                return self._idle.pop()
+            self._counters['created'] += 1
+        try:
+            return self._connect()
+        except sqlite3.Error:
+            with self._lock:
+                self._in_use -= 1
+            raise
+
+    def release(self, conn):
+        """Returns a connection to the pool, closing it if the pool is full."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+            if os.getpid() == self.pid and len(self._idle) < self.size:
+                self._idle.append(conn)
+                self._counters['returned'] += 1
+                return
+            self._counters['discarded'] += 1
+        conn.close()
+
+    def close(self):
+        """Closes every idle connection held by the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Returns a snapshot of the pool's counters."""
+        with self._lock:
+            return dict(self._counters, idle=len(self._idle), in_use=self._in_use, size=self.size)
+
+def get_pool(read_only=False, database=None):
+    """Returns this process's connection pool (or read-only pool) for a database, DATABASE by default."""
+    database = database or current_app.config['DATABASE']
+    pools = current_app.extensions.setdefault('sqlite_pools', {})
+    name = f'{database} (read-only)' if read_only else str(database)
+    pool = pools.get(name)
+    # A pool inherited across fork() must not be used; start over in the child.
+    if pool is None or pool.pid != os.getpid():
+        config = current_app.config
+        pool = ConnectionPool(
+            database,
+            size=config['DB_POOL_SIZE'],
+            busy_timeout_ms=config['DB_BUSY_TIMEOUT_MS'],
+            cache_size_kib=config['DB_CACHE_SIZE_KIB'],
+            mmap_size=config['DB_MMAP_SIZE'],
+            cached_statements=config['DB_CACHED_STATEMENTS'],
+            journal_mode=config['DB_JOURNAL_MODE'],
+            synchronous=config['DB_SYNCHRONOUS'],
+            factory=InstrumentedConnection if config['METRICS_ENABLED'] else sqlite3.Connection,
+            read_only=read_only,
+            template=config['DB_TEMPLATE']
         )
-        g.db.row_factory = sqlite3.Row
-    return g.db
+        pools[name] = pool
+    return pool
+
+def pool_stats():
+    """Returns the stats of every connection pool opened by this process."""
+    pools = current_app.extensions.get('sqlite_pools', {})
+    return {name: pool.stats() for name, pool in pools.items()}
+
+def get_db(shard=None):
+    """The request's connection to a shard; the first (or only) shard by default."""
+    database = (shard or get_shards()[0]).database
+    dbs = g.setdefault('dbs', {})
+    if database not in dbs:
+        pool = get_pool(database=database)
+        dbs[database] = (pool, pool.acquire())
+    return dbs[database][1]
+
+_snapshot_lock = threading.Lock()
+
+def get_read_snapshot(database=None):
+    """Returns this process's in-memory read snapshot of a database, taking the first copy on first use."""
+    database = str(database or current_app.config['DATABASE'])
+    with _snapshot_lock:
+        snapshots = current_app.extensions.setdefault('read_snapshots', {})
+        snapshot = snapshots.get(database)
+        # Threads don't survive fork(); each worker keeps its own copy.
+        if snapshot is None or snapshot.pid != os.getpid():
+            from .snapshot import ReadSnapshot  # Only deployments that enable it pay for the import.
+            config = current_app.config
+            snapshot = ReadSnapshot(
+                get_pool(read_only=True, database=database),
+                interval=config['READ_SNAPSHOT_INTERVAL'],
+                pool_size=config['DB_POOL_SIZE'],
+                factory=InstrumentedConnection if config['METRICS_ENABLED'] else sqlite3.Connection
+            )
+            snapshots[database] = snapshot
+            atexit.register(snapshot.stop)
+        return snapshot
+
+def snapshot_ages():
+    """Returns the age in seconds of every read snapshot kept by this process."""
+    snapshots = current_app.extensions.get('read_snapshots', {})
+    return {name: snapshot.age() for name, snapshot in snapshots.items() if snapshot.pid == os.getpid()}
+
+def get_read_db(shard=None):
+    """
+    The connection for read-only routes, which never competes for the write lock.
+
+    With READ_SNAPSHOT_ENABLED it reads the in-memory snapshot, unless that is
+    older than READ_SNAPSHOT_MAX_STALENESS; otherwise a mode=ro connection.
+    An in-memory database is private to its connection, so there it is get_db().
+    """
+    config = current_app.config
+    shard = shard or get_shards()[0]
+    database = shard.database
+    if database == ':memory:':
+        return get_db(shard)
+    read_dbs = g.setdefault('read_dbs', {})
+    if database not in read_dbs:
+        if config['READ_SNAPSHOT_ENABLED']:
+            snapshot = get_read_snapshot(database)
+            if snapshot.age() <= config['READ_SNAPSHOT_MAX_STALENESS']:
+                conn, lease = snapshot.acquire()
+                read_dbs[database] = (conn, lambda: snapshot.release(conn, lease))
+                return conn
+            REGISTRY.inc('read_snapshot_stale_total')
+        pool = get_pool(read_only=True, database=database)
+        conn = pool.acquire()
+        read_dbs[database] = (conn, lambda: pool.release(conn))
+    return read_dbs[database][0]
+
+def close_read_db(e=None):
+    """Returns the read connections at the end of each request, so the next one sees a fresh snapshot."""
+    for _, release in g.pop('read_dbs', {}).values():
+        release()
 
 def close_db(e=None):
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    for pool, db in g.pop('dbs', {}).values():
+        pool.release(db)
+    close_read_db()
+
+def is_busy_error(error):
+    """Returns True if the error means another connection holds the write lock."""
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+def run_write_transaction(db, work, retries=None, base_delay=None):
+    """
+    Runs work(cursor) inside BEGIN IMMEDIATE and commits its result.
+
+    The write lock is taken up front so concurrent writers queue on SQLite's
+    busy handler instead of failing half-way through. If the database is still
+    busy, the whole transaction is retried with jittered exponential backoff.
+    Outside of an app context, pass `retries` and `base_delay` explicitly.
+    """
+    if retries is None:
+        retries = current_app.config['DB_BUSY_RETRIES']
+    if base_delay is None:
+        base_delay = current_app.config['DB_BUSY_RETRY_BASE_DELAY']
+    for attempt in range(retries + 1):
+        cursor = db.cursor()
+        try:
+            started = time.perf_counter()
+            cursor.execute('BEGIN IMMEDIATE')
+            REGISTRY.observe('sqlite_lock_wait_seconds', (), time.perf_counter() - started)
+            result = work(cursor)
+            db.commit()
+            return result
+        except Exception as e:
+            db.rollback()
+            if not is_busy_error(e):
+                raise
+            if attempt == retries:
+                REGISTRY.inc('sqlite_busy_giveups_total')
+                raise
+        REGISTRY.inc('sqlite_busy_retries_total')
+        time.sleep(random.uniform(0, base_delay * 2 ** attempt))
 
 def create_schema(db):
-    """Creates the database tables from scratch."""
+    """Drops all tables and rebuilds them by applying every migration."""
     cursor = db.cursor()
-    cursor.executescript('''
-        DROP TABLE IF EXISTS Users;
-        DROP TABLE IF EXISTS Classes;
-        DROP TABLE IF EXISTS Bookings;
-        
-        CREATE TABLE Users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR(100) NOT NULL,
-            email VARCHAR(100) NOT NULL UNIQUE,
-            password_hash VARCHAR(255) NOT NULL
-        );
-        CREATE TABLE Classes (
-            class_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR(100) NOT NULL,
-            start_time TEXT NOT NULL,
-            instructor VARCHAR(100) NOT NULL,
-            capacity INTEGER NOT NULL,
-            available_slots INTEGER NOT NULL
-        );
-        CREATE TABLE Bookings (
-            booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            class_id INTEGER NOT NULL,
-            booking_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES Users(user_id),
-            FOREIGN KEY (class_id) REFERENCES Classes(class_id)
-        );
-    ''')
-    db.commit()
+    # Drop whatever the migrations created so far, not a hard-coded list.
+    tables = [row[0] for row in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    cursor.executescript(''.join(f'DROP TABLE IF EXISTS "{table}";' for table in tables)
+                         + 'PRAGMA user_version = 0;')
+    migrate(db)
+
+_template_lock = threading.Lock()
+_template = None
+
+def clone_template(db):
+    """
+    Replaces everything in db with the schema and seed data, copied with the
+    backup API from a template built once per process. Copying the pages is
+    about a hundred times faster than create_schema() and seed_data().
+    """
+    global _template
+    with _template_lock:
+        # A connection inherited across fork() must not be used; build another.
+        if _template is None or _template[0] != os.getpid():
+            template = sqlite3.connect(':memory:', check_same_thread=False)
+            create_schema(template)
+            seed_data(template)
+            _template = (os.getpid(), template)
+        if db.in_transaction:
+            db.rollback()
+        _template[1].backup(db)
 
 def seed_data(db):
     """Populates the database with a richer set of sample data."""
     cursor = db.cursor()
+    default_tz = get_timezone(DEFAULT_TZ_NAME)
     
     # --- Add Classes ---
     classes_data = [
         # Upcoming classes
-        ('Yoga Flow', to_utc(datetime.datetime(2025, 7, 8, 8, 0), DEFAULT_TZ), 'Chloe', 20, 20),
-        ('HIIT Blast', to_utc(datetime.datetime(2025, 7, 8, 18, 30), DEFAULT_TZ), 'Mike', 15, 15),
-        ('Spin Cycle', to_utc(datetime.datetime(2025, 7, 9, 7, 0), DEFAULT_TZ), 'David', 25, 25),
-        ('CrossFit', to_utc(datetime.datetime(2025, 7, 9, 19, 0), DEFAULT_TZ), 'Sarah', 12, 10), # A class with some spots already taken
-        ('Meditation', to_utc(datetime.datetime(2025, 7, 15, 20, 0), DEFAULT_TZ), 'Anya', 30, 30),
+        ('Yoga Flow', to_utc(datetime.datetime(2025, 7, 8, 8, 0), default_tz), 'Chloe', 20, 20),
+        ('HIIT Blast', to_utc(datetime.datetime(2025, 7, 8, 18, 30), default_tz), 'Mike', 15, 15),
+        ('Spin Cycle', to_utc(datetime.datetime(2025, 7, 9, 7, 0), default_tz), 'David', 25, 25),
+        ('CrossFit', to_utc(datetime.datetime(2025, 7, 9, 19, 0), default_tz), 'Sarah', 12, 10), # A class with some spots already taken
+        ('Meditation', to_utc(datetime.datetime(2025, 7, 15, 20, 0), default_tz), 'Anya', 30, 30),
         
         # A class that is fully booked
-        ('Power Lifting', to_utc(datetime.datetime(2025, 7, 10, 17, 0), DEFAULT_TZ), 'Mike', 5, 0),
+        ('Power Lifting', to_utc(datetime.datetime(2025, 7, 10, 17, 0), default_tz), 'Mike', 5, 0),
 
         # A class that has already passed (should not appear in the /classes list)
-        ('Morning Zumba', to_utc(datetime.datetime(2025, 7, 7, 9, 0), DEFAULT_TZ), 'Isabella', 25, 5)
+        ('Morning Zumba', to_utc(datetime.datetime(2025, 7, 7, 9, 0), default_tz), 'Isabella', 25, 5)
     ]
     cursor.executemany('INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) VALUES (?, ?, ?, ?, ?);', classes_data)
     
@@ -90,16 +324,138 @@ def seed_data(db):
     cursor.executemany('INSERT INTO Users (name, email, password_hash) VALUES (?, ?, ?);', users_data)
     db.commit()
 
+def studio_shard(studio):
+    """The shard for a --studio option, as a usage error if there is no such studio."""
+    try:
+        return shard_for_studio(studio)
+    except LookupError as e:
+        raise click.BadParameter(str(e), param_hint='--studio')
+
 @click.command('init-db')
 @with_appcontext
 def init_db_command():
-    """Clear the existing data and create new tables."""
-    db = get_db()
-    create_schema(db)
-    seed_data(db)
-    click.echo('Initialized the database.')
+    """Clear the existing data and create new tables, in every shard."""
+    for shard in get_shards():
+        db = get_db(shard)
+        create_schema(db)
+        prepare_shard(db, shard.number)
+        seed_data(db)
+        if shard.studio is None:
+            click.echo('Initialized the database.')
+        else:
+            click.echo(f'Initialized studio {shard.studio} (shard {shard.number}).')
+
+@click.command('import-classes')
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Input format; guessed from the file extension by default.')
+@click.option('--timezone', 'zone', default=DEFAULT_TZ_NAME, show_default=True,
+              help='Timezone for rows without a timezone column.')
+@click.option('--chunk-rows', type=click.IntRange(1), default=5000, show_default=True,
+              help='Rows converted and inserted per executemany call.')
+@click.option('--commit-rows', type=click.IntRange(1), default=100000, show_default=True,
+              help='Rows written per transaction.')
+@click.option('--defer-indexes', is_flag=True,
+              help='Drop the Classes indexes during the load and rebuild them at the end, in one transaction.')
+@click.option('--max-errors', type=click.IntRange(0), default=0, show_default=True,
+              help='Invalid rows to skip before giving up.')
+@click.option('--studio', help='The studio (shard) to import into; required when SHARDS lists several.')
+@with_appcontext
+def import_classes_command(path, fmt, zone, chunk_rows, commit_rows, defer_indexes, max_errors, studio):
+    """Upsert classes from a CSV or JSON Lines file ('-' reads stdin)."""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the input format from the file name; pass --format.')
+    try:
+        default_tz = get_timezone(zone)
+    except KeyError:  # pytz.UnknownTimeZoneError
+        raise click.BadParameter(f'Unknown timezone {zone!r}.', param_hint='--timezone')
+    db = get_db(studio_shard(studio))
+    if schema_version(db) < LATEST_VERSION:
+        raise click.ClickException('The database schema is out of date; run `flask migrate-db` first.')
+
+    invalid = 0
+
+    def on_error(line_number, message):
+        nonlocal invalid
+        invalid += 1
+        if invalid > max_errors:
+            raise click.ClickException(f'Line {line_number}: {message} Rows up to the last commit were kept.')
+        click.echo(f'Skipping line {line_number}: {message}', err=True)
+
+    def on_progress(stats):
+        click.echo(f"... {stats['read']} rows read ({stats['read'] / stats['seconds']:.0f} rows/s)")
+
+    # newline='' lets the csv module handle line breaks inside quoted fields.
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+    try:
+        stats = import_classes(db, read_rows(stream, fmt), default_tz, chunk_rows=chunk_rows,
+                               commit_rows=commit_rows, defer_indexes=defer_indexes,
+                               on_error=on_error, on_progress=on_progress)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    rate = stats['read'] / stats['seconds'] if stats['seconds'] else 0.0
+    click.echo(f"Imported {stats['read'] - stats['invalid']} classes: {stats['written']} new or changed, "
+               f"{stats['invalid']} invalid rows skipped, {stats['seconds']:.1f}s ({rate:.0f} rows/s).")
+
+@click.command('add-schedule')
+@click.argument('name')
+@click.argument('instructor')
+@click.option('--weekday', type=click.Choice(WEEKDAYS, case_sensitive=False), required=True)
+@click.option('--time', 'local_time', required=True, help='Local start time, HH:MM.')
+@click.option('--timezone', 'zone', default=DEFAULT_TZ_NAME, show_default=True)
+@click.option('--capacity', type=int, required=True)
+@click.option('--starts-on', help='First local date, YYYY-MM-DD; today by default.')
+@click.option('--ends-on', help='Last local date, YYYY-MM-DD; open-ended by default.')
+@click.option('--studio', help='The studio (shard) that runs the class; required when SHARDS lists several.')
+@with_appcontext
+def add_schedule_command(name, instructor, weekday, local_time, zone, capacity, starts_on, ends_on, studio):
+    """Add a weekly recurring class."""
+    try:
+        if starts_on is None:
+            starts_on = datetime.datetime.now(get_timezone(zone)).date().isoformat()
+        params = validate_schedule(name, instructor, weekday, local_time, zone, capacity, starts_on, ends_on)
+    except (ValueError, KeyError) as e:  # KeyError: pytz.UnknownTimeZoneError
+        raise click.UsageError(str(e))
+    db = get_db(studio_shard(studio))
+    schedule_id = run_write_transaction(db, lambda cursor: cursor.execute(INSERT_SCHEDULE_SQL, params).lastrowid)
+    click.echo(f'Added schedule {schedule_id}: {name} with {instructor} every {weekday} at {params[3][:5]} {zone}.')
+
+@click.command('migrate-db')
+@with_appcontext
+def migrate_db_command():
+    """Apply pending schema migrations in place, keeping existing data, in every shard."""
+    for shard in get_shards():
+        db = get_db(shard)
+        applied = migrate(db)
+        try:
+            prepare_shard(db, shard.number)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        prefix = '' if shard.studio is None else f'{shard.studio}: '
+        if applied:
+            click.echo(f'{prefix}Applied migrations: {", ".join(map(str, applied))}.')
+        else:
+            click.echo(f'{prefix}Database is up to date.')
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """Fail if any route query falls back to a full table SCAN."""
+    from .routes import ROUTE_QUERIES
+    failures = check_query_plans(get_db(), ROUTE_QUERIES)
+    for name, scans in failures.items():
+        click.echo(f'{name}: {"; ".join(scans)}')
+    if failures:
+        raise click.ClickException('Some route queries scan whole tables.')
+    click.echo('All route queries use indexes.')
 
 def init_app(app):
     """Register database functions with the Flask app."""
     app.teardown_appcontext(close_db)
+    app.teardown_request(close_read_db)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
+    app.cli.add_command(import_classes_command)
+    app.cli.add_command(add_schedule_command)
+    app.cli.add_command(check_query_plans_command)
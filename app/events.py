@@ -0,0 +1,192 @@
+# ==============================================================================
+#  FILE: app/events.py
+#  DESCRIPTION: Slot-availability change feed for Server-Sent Events.
+# ==============================================================================
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from flask import current_app
+
+from .database import get_pool
+
+# SlotEvents is filled by a trigger on Classes (see migration 8), so every
+# committed change to available_slots is logged whichever path made it.
+LATEST_EVENT_SQL = "SELECT COALESCE(MAX(event_id), 0) FROM SlotEvents"
+OLDEST_EVENT_SQL = "SELECT MIN(event_id) FROM SlotEvents"
+EVENTS_AFTER_SQL = """
+    SELECT event_id, class_id, available_slots FROM SlotEvents
+    WHERE event_id > ? ORDER BY event_id LIMIT ?
+"""
+
+def format_event(event_id, class_id, available_slots):
+    """One SSE message; the id lets a reconnecting client resume after it."""
+    data = json.dumps({'class_id': class_id, 'available_slots': available_slots}, separators=(',', ':'))
+    return f'id: {event_id}\ndata: {data}\n\n'
+
+def read_events(db, after_id, limit):
+    """
+    Returns up to `limit` logged events after `after_id` as (event_id, message),
+    or None if the log no longer goes back that far.
+    """
+    oldest = db.execute(OLDEST_EVENT_SQL).fetchone()[0]
+    rows = db.execute(EVENTS_AFTER_SQL, (after_id, limit)).fetchall()
+    if rows and oldest > after_id + 1:
+        return None
+    return [(row[0], format_event(*row)) for row in rows]
+
+class EventHub:
+    """
+    Fans the latest events out to every subscriber thread of one process.
+
+    Events live in one ring buffer shared by all subscribers, which only
+    remember the last event_id they sent, so an idle subscriber costs a
+    blocked thread and nothing else.
+    """
+
+    def __init__(self, buffer_size=4096):
+        self._events = deque(maxlen=buffer_size)
+        self._changed = threading.Condition()
+        self.last_id = 0
+
+    def publish(self, events):
+        """Appends (event_id, message) pairs in event_id order and wakes the subscribers."""
+        if not events:
+            return
+        with self._changed:
+            self._events.extend(events)
+            self.last_id = events[-1][0]
+            self._changed.notify_all()
+
+    def reset(self, last_id):
+        """Starts from `last_id` without history, e.g. when the tailer first connects."""
+        with self._changed:
+            self.last_id = max(self.last_id, last_id)
+
+    def wait(self, after_id, timeout):
+        """
+        Blocks for up to `timeout` seconds until there are events after
+        `after_id`. Returns them, or None if they already left the buffer.
+        """
+        with self._changed:
+            if self.last_id <= after_id:
+                self._changed.wait(timeout)
+            if self.last_id <= after_id:
+                return []
+            if not self._events or self._events[0][0] > after_id + 1:
+                return None
+            # Newer events are at the right; walk back only as far as needed.
+            pending = []
+            for event in reversed(self._events):
+                if event[0] <= after_id:
+                    break
+                pending.append(event)
+            pending.reverse()
+            return pending
+
+class ChangeLogTailer:
+    """
+    Polls SlotEvents from one connection per process and publishes new rows.
+
+    This is how events cross worker processes: every worker commits to the
+    same log and tails it. PRAGMA data_version only changes when another
+    connection has committed, so an idle poll costs one PRAGMA.
+    """
+
+    def __init__(self, pool, hub, interval=0.1, batch=1000):
+        self.pool = pool
+        self.hub = hub
+        self.interval = interval
+        self.batch = batch
+        self.pid = os.getpid()
+        self._stop = threading.Event()
+        # Start at the current end of the log before anyone subscribes, so new
+        # subscribers never mistake the whole log for a backlog.
+        db = pool.acquire()
+        try:
+            hub.reset(db.execute(LATEST_EVENT_SQL).fetchone()[0])
+        except Exception:
+            pool.release(db)
+            raise
+        self._thread = threading.Thread(target=self._run, args=(db,), name='slot-events-tailer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self, db):
+        last_id = self.hub.last_id
+        seen_version = None
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    version = db.execute('PRAGMA data_version').fetchone()[0]
+                    if version == seen_version:
+                        continue
+                    seen_version = version
+                    while True:
+                        rows = db.execute(EVENTS_AFTER_SQL, (last_id, self.batch)).fetchall()
+                        self.hub.publish([(row[0], format_event(*row)) for row in rows])
+                        if rows:
+                            last_id = rows[-1][0]
+                        if len(rows) < self.batch:
+                            break
+                except Exception as e:
+                    # Keep tailing; the next poll retries.
+                    seen_version = None
+                    logging.error("Slot event tailer failed: %s", e)
+        finally:
+            self.pool.release(db)
+
+_tailer_lock = threading.Lock()
+
+def get_event_hub(database=None):
+    """Returns this process's event hub for a database (DATABASE by default), starting its tailer on first use."""
+    database = str(database or current_app.config['DATABASE'])
+    with _tailer_lock:
+        tailers = current_app.extensions.setdefault('slot_events_tailers', {})
+        tailer = tailers.get(database)
+        # Threads don't survive fork(); each worker tails the log itself.
+        if tailer is None or tailer.pid != os.getpid():
+            config = current_app.config
+            tailer = ChangeLogTailer(get_pool(database=database), EventHub(config['SSE_BUFFER_EVENTS']),
+                                     interval=config['SSE_POLL_INTERVAL'])
+            tailers[database] = tailer
+            atexit.register(tailer.stop)
+        return tailer.hub
+
+def subscribe(hub, pool, after_id, heartbeat, max_seconds, backlog):
+    """
+    Yields SSE text for one subscriber: the logged events after `after_id`,
+    then live ones, with a comment line as a heartbeat. Ends after
+    `max_seconds` so the client reconnects with its Last-Event-ID and the
+    worker thread is freed.
+    """
+    yield 'retry: 1000\n\n'
+    deadline = time.monotonic() + max_seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = hub.wait(after_id, min(heartbeat, remaining))
+        if events is None:
+            # Too far behind for the buffer (or resuming): read the log itself.
+            db = pool.acquire()
+            try:
+                events = read_events(db, after_id, backlog)
+            finally:
+                pool.release(db)
+            if events is None:
+                # The log was pruned past this point; the client must refetch.
+                yield 'event: reset\ndata: {}\n\n'
+                after_id = hub.last_id
+                continue
+        if not events:
+            yield ': keep-alive\n\n'
+            continue
+        yield ''.join(message for _, message in events)
+        after_id = events[-1][0]
@@ -0,0 +1,165 @@
+# ==============================================================================
+#  FILE: app/group_commit.py
+#  DESCRIPTION: Optional writer thread that commits concurrent bookings together.
+# ==============================================================================
+import os
+import time
+import queue
+import atexit
+import logging
+import datetime
+import threading
+from concurrent.futures import Future
+from flask import current_app
+
+from .booking import reserve_each
+from .database import get_pool, run_write_transaction
+from .utils import UTC
+
+class WriterStopped(RuntimeError):
+    """Set on the Futures of bookings that the writer thread can no longer apply."""
+
+class GroupCommitWriter:
+    """
+    Applies booking intents from many request threads in shared transactions.
+
+    Request threads submit() a validated booking and wait on the returned
+    Future. A single writer thread drains up to `max_batch` intents, waiting at
+    most `max_wait` seconds for the window to fill, books them all in one
+    BEGIN IMMEDIATE transaction (one savepoint each, see booking.reserve_each)
+    and commits once. Each Future then resolves to its own (Reservation, error),
+    as in reserve_each(): one of the two is None.
+
+    If the thread stops, for whatever reason, the writer is marked dead and
+    every booking still queued fails with WriterStopped instead of waiting
+    forever; get_booking_writer() then starts a new one.
+    """
+
+    def __init__(self, pool, max_batch=64, max_wait=0.002, retries=5, base_delay=0.01):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.retries = retries
+        self.base_delay = base_delay
+        self.pid = os.getpid()
+        self.batches = 0
+        self.intents = 0
+        self.dead = False
+        self._queue = queue.Queue()
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='booking-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, booking):
+        """Queues a validated booking; the Future yields (Reservation, error), error being the ValueError or None."""
+        future = Future()
+        with self._lock:
+            if self._stopping or self.dead:
+                raise WriterStopped('The booking writer is shutting down.')
+            self._queue.put((booking, future))
+        return future
+
+    def stop(self, timeout=5):
+        """Applies what is already queued, then stops the writer thread."""
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                # Take whatever is already queued, then wait out the window.
+                remaining = deadline - time.monotonic()
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Let _run() see the stop marker.
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        batch = []
+        try:
+            db = self.pool.acquire()
+            try:
+                while True:
+                    item = self._queue.get()
+                    if item is None:
+                        return
+                    batch = self._collect(item)
+                    self._apply(db, batch)
+                    batch = []
+            finally:
+                self.pool.release(db)
+        except Exception as e:
+            logging.error("Booking writer stopped: %s", e)
+        finally:
+            self._fail_pending(batch)
+
+    def _fail_pending(self, batch):
+        with self._lock:
+            self.dead = True
+        error = WriterStopped('The booking writer stopped.')
+        # The batch being applied when it stopped, then whatever is still queued.
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(error)
+
+    def _apply(self, db, batch):
+        # Bookings whose request stopped waiting for them (see Future.cancel()) are skipped.
+        batch[:] = [(booking, future) for booking, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        bookings = [booking for booking, _ in batch]
+
+        def reserve_all(cursor):
+            now_utc = datetime.datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')
+            return reserve_each(cursor, bookings, now_utc)
+
+        try:
+            outcomes = run_write_transaction(db, reserve_all, self.retries, self.base_delay)
+        except Exception as e:
+            logging.error("Group commit of %d bookings failed: %s", len(batch), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.intents += len(batch)
+        for (_, future), outcome in zip(batch, outcomes):
+            future.set_result(outcome)
+
+_writer_lock = threading.Lock()
+
+def get_booking_writer(database=None):
+    """Returns this process's group-commit writer for a database (DATABASE by default), starting it on first use."""
+    with _writer_lock:
+        return _get_or_start_writer(str(database or current_app.config['DATABASE']))
+
+def _get_or_start_writer(database):
+    writers = current_app.extensions.setdefault('booking_writers', {})
+    writer = writers.get(database)
+    # Threads don't survive fork(); a worker forked from a preloaded master starts its own.
+    if writer is None or writer.pid != os.getpid() or writer.dead:
+        config = current_app.config
+        writer = GroupCommitWriter(
+            get_pool(database=database),
+            max_batch=config['GROUP_COMMIT_MAX_BATCH'],
+            max_wait=config['GROUP_COMMIT_MAX_WAIT_MS'] / 1000.0,
+            retries=config['DB_BUSY_RETRIES'],
+            base_delay=config['DB_BUSY_RETRY_BASE_DELAY']
+        )
+        writers[database] = writer
+        atexit.register(writer.stop)
+    return writer
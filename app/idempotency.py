@@ -0,0 +1,131 @@
+# ==============================================================================
+#  FILE: app/idempotency.py
+#  DESCRIPTION: Idempotency-Key support for POST /api/book.
+# ==============================================================================
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from flask import current_app
+
+from .booking import Reservation, IdempotencyConflict, FIND_IDEMPOTENT_SQL
+
+# Expired keys go in one range DELETE over ix_idempotency_keys_expires_at.
+EVICT_EXPIRED_SQL = "DELETE FROM IdempotencyKeys WHERE expires_at <= ?"
+MAX_KEY_LENGTH = 255
+
+# A finished key: the request it was used for, what it got back and until when.
+StoredOutcome = namedtuple('StoredOutcome', 'request_hash reservation expires_at')
+
+def parse_key(value):
+    """Checks an Idempotency-Key header value and returns it; raises ValueError."""
+    key = value.strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise ValueError(f'Invalid Idempotency-Key: expected 1 to {MAX_KEY_LENGTH} printable characters.')
+    return key
+
+def request_hash(booking):
+    """Fingerprints a validated booking, so a key can't be replayed for a different one."""
+    body = json.dumps([booking['class_id'], booking['client_name'], booking['client_email']])
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+def load_outcome(db, key):
+    """Reads an unexpired key from IdempotencyKeys; a plain read, no write transaction."""
+    row = db.execute(FIND_IDEMPOTENT_SQL, (key, int(time.time()))).fetchone()
+    if row is None:
+        return None
+    return StoredOutcome(row[0], Reservation(*row[1:4]), row[4])
+
+class IdempotencyCache:
+    """
+    A thread-safe LRU of finished keys for one worker process, plus the keys
+    that one of its request threads is executing right now.
+
+    A request that finds its key in flight waits for that execution instead of
+    racing it for the write lock, then reads the outcome it left behind.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.pid = os.getpid()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._next_eviction = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now):
+        """Returns the StoredOutcome for an unexpired key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, outcome):
+        with self._lock:
+            self._entries[key] = outcome
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def begin(self, key):
+        """
+        Claims a key for execution. Returns (event, True) for the caller that
+        runs it, or the running execution's (event, False) to wait on.
+        """
+        with self._lock:
+            event = self._in_flight.get(key)
+            if event is not None:
+                return event, False
+            event = self._in_flight[key] = threading.Event()
+            return event, True
+
+    def finish(self, key, event, outcome=None):
+        """Ends an execution from begin(), recording its outcome if it has one, and wakes its waiters."""
+        if outcome is not None:
+            self.put(key, outcome)
+        with self._lock:
+            self._in_flight.pop(key, None)
+        event.set()
+
+    def eviction_due(self, now, interval):
+        """True at most once per `interval` seconds, for the caller that should evict."""
+        with self._lock:
+            if now < self._next_eviction:
+                return False
+            self._next_eviction = now + interval
+            return True
+
+def find_outcome(cache, db, key, fingerprint):
+    """
+    Returns the Reservation a key already produced, from the LRU or (unless
+    db is None) the table, or None. Raises IdempotencyConflict if it was for
+    another request.
+    """
+    outcome = cache.get(key, time.time())
+    if outcome is None and db is not None:
+        outcome = load_outcome(db, key)
+        if outcome is not None:
+            cache.put(key, outcome)
+    if outcome is None:
+        return None
+    if outcome.request_hash != fingerprint:
+        raise IdempotencyConflict()
+    return outcome.reservation
+
+def get_idempotency_cache(database=None):
+    """Returns this process's Idempotency-Key cache for a database, DATABASE by default."""
+    caches = current_app.extensions.setdefault('idempotency_caches', {})
+    database = str(database or current_app.config['DATABASE'])
+    cache = caches.get(database)
+    # Requests in flight belong to the process that forked us, not to this one.
+    if cache is None or cache.pid != os.getpid():
+        cache = caches[database] = IdempotencyCache(current_app.config['IDEMPOTENCY_CACHE_MAX_ENTRIES'])
+    return cache
@@ -0,0 +1,193 @@
+# ==============================================================================
+#  FILE: app/importer.py
+#  DESCRIPTION: Streaming bulk import of classes from CSV or JSON Lines.
+# ==============================================================================
+import csv
+import json
+import time
+import datetime
+from contextlib import contextmanager
+
+from .utils import get_timezone, to_utc, UTC, DB_FORMAT
+
+FORMATS = ('csv', 'jsonl')
+
+# The natural key is (name, instructor, start_time), backed by a unique index.
+# Re-importing a class only changes its capacity, and seats that are already
+# booked stay booked. Rows whose capacity is unchanged are not written at all,
+# so importing the same timetable twice is a no-op.
+UPSERT_CLASS_SQL = """
+    INSERT INTO Classes (name, start_time, instructor, capacity, available_slots)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (name, instructor, start_time) DO UPDATE SET
+        capacity = excluded.capacity,
+        available_slots = max(0, excluded.capacity - (capacity - available_slots))
+    WHERE capacity != excluded.capacity
+"""
+BUMP_CLASSES_VERSION_SQL = "UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'"
+
+def detect_format(path):
+    """Guesses the input format from the file extension; returns None if unknown."""
+    lowered = path.lower()
+    if lowered.endswith('.csv'):
+        return 'csv'
+    if lowered.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+def read_rows(stream, fmt):
+    """Yields (line_number, row) from a CSV or JSON Lines text stream, one at a time."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+def _text(row, field):
+    value = row.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'Missing {field}.')
+    return value.strip()
+
+def _count(value, field):
+    # CSV gives strings and JSON gives numbers; bools are not counts.
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise ValueError(f'Invalid {field}: must be a non-negative integer.')
+
+def convert_row(row, default_tz):
+    """
+    Validates one imported class and returns the parameters for UPSERT_CLASS_SQL.
+
+    start_time is a local 'YYYY-MM-DD HH:MM[:SS]' (or ISO 8601 with 'T') in the
+    row's timezone column, or in default_tz when that is empty. A start_time
+    with an explicit UTC offset is used as is. Raises ValueError if invalid.
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Row is not a JSON object.')
+    name = _text(row, 'name')
+    instructor = _text(row, 'instructor')
+
+    try:
+        local = datetime.datetime.fromisoformat(_text(row, 'start_time'))
+    except ValueError:
+        raise ValueError('Invalid start_time: expected YYYY-MM-DD HH:MM[:SS].')
+    if local.tzinfo is not None:
+        start_time = local.astimezone(UTC).strftime(DB_FORMAT)
+    else:
+        zone = row.get('timezone')
+        try:
+            if zone and not isinstance(zone, str):
+                raise KeyError(zone)
+            tz = get_timezone(zone.strip()) if zone else default_tz
+        except KeyError:  # pytz.UnknownTimeZoneError
+            raise ValueError('Invalid timezone specified.')
+        start_time = to_utc(local.replace(microsecond=0), tz)
+
+    capacity = _count(row.get('capacity'), 'capacity')
+    if capacity == 0:
+        raise ValueError('Invalid capacity: must be a positive integer.')
+    available = row.get('available_slots')
+    available_slots = capacity if available in (None, '') else _count(available, 'available_slots')
+    if available_slots > capacity:
+        raise ValueError('Invalid available_slots: cannot exceed capacity.')
+    return name, start_time, instructor, capacity, available_slots
+
+def _schema_objects(cursor, kind, table):
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = ? AND tbl_name = ? AND sql IS NOT NULL",
+                   (kind, table))
+    return [(kind, name, sql) for name, sql in cursor.fetchall()]
+
+@contextmanager
+def bulk_transaction(db, defer_indexes=False):
+    """
+    Runs a bulk load into Classes as one BEGIN IMMEDIATE transaction.
+
+    The DataVersions triggers are dropped for its duration and the version is
+    bumped once at the end instead of once per row. DDL is transactional, so
+    no other connection ever sees them missing. With defer_indexes, the plain
+    indexes are dropped and rebuilt the same way, which is cheaper than
+    maintaining them row by row; unique indexes stay since the upsert needs them.
+    """
+    cursor = db.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        suspended = [obj for obj in _schema_objects(cursor, 'trigger', 'Classes') if 'DataVersions' in obj[2]]
+        if defer_indexes:
+            suspended += [obj for obj in _schema_objects(cursor, 'index', 'Classes')
+                          if not obj[2].upper().startswith('CREATE UNIQUE')]
+        for kind, name, _ in suspended:
+            cursor.execute(f'DROP {kind.upper()} "{name}"')
+        changes = db.total_changes
+        yield cursor
+        if db.total_changes != changes:
+            cursor.execute(BUMP_CLASSES_VERSION_SQL)
+        for _, _, sql in suspended:
+            cursor.execute(sql)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+def _chunks(rows, default_tz, chunk_rows, stats, on_error):
+    """Groups valid converted rows into lists of at most chunk_rows, counting invalid ones."""
+    chunk = []
+    for line_number, row in rows:
+        stats['read'] += 1
+        try:
+            chunk.append(convert_row(row, default_tz))
+        except ValueError as e:
+            stats['invalid'] += 1
+            on_error(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_classes(db, rows, default_tz, chunk_rows=5000, commit_rows=100000, defer_indexes=False,
+                   on_error=None, on_progress=None):
+    """
+    Upserts classes from (line_number, row) pairs such as read_rows() yields.
+
+    Rows are converted and written chunk_rows at a time with executemany, and
+    committed every commit_rows rows, so memory stays flat however large the
+    input is. With defer_indexes the whole load is a single transaction, so a
+    failed import never leaves Classes without its indexes.
+
+    on_error(line_number, message) is called for each invalid row, which is
+    skipped; it may raise to abort the import. on_progress(stats) is called
+    after every commit but the last. Returns the stats: rows read, rows
+    written (new or changed), invalid rows and elapsed seconds.
+    """
+    stats = {'read': 0, 'written': 0, 'invalid': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    chunks = _chunks(rows, default_tz, chunk_rows, stats, on_error or (lambda line_number, message: None))
+    more = True
+    while more:
+        with bulk_transaction(db, defer_indexes) as cursor:
+            pending = 0
+            for chunk in chunks:
+                cursor.executemany(UPSERT_CLASS_SQL, chunk)
+                stats['written'] += cursor.rowcount
+                pending += len(chunk)
+                # Commit in large steps so that other writers and the WAL
+                # checkpoint get a turn during very long imports.
+                if not defer_indexes and pending >= commit_rows:
+                    break
+            else:
+                more = False
+        stats['seconds'] = time.perf_counter() - started
+        if more and on_progress:
+            on_progress(stats)
+    return stats
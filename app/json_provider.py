@@ -0,0 +1,64 @@
+# ==============================================================================
+#  FILE: app/json_provider.py
+#  DESCRIPTION: Pluggable JSON encoding for responses, orjson when available.
+# ==============================================================================
+from functools import partial
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is used without it.
+    orjson = None
+
+JSON_BACKENDS = ('auto', 'orjson', 'stdlib')
+
+class StdlibProvider(DefaultJSONProvider):
+    """
+    Flask's default JSON provider, writing non-ASCII text as UTF-8 like
+    orjson does rather than as \\u escapes, so that workers on either
+    backend send the same bytes, and ETags, for the same data.
+    """
+    ensure_ascii = False
+
+class OrjsonProvider(StdlibProvider):
+    """
+    Flask's JSON provider with orjson doing the encoding.
+
+    The output matches StdlibProvider's byte for byte: sorted keys, compact
+    unless debugging, UTF-8 text, and the same fallback for dates, decimals
+    and dataclasses. Decoding is left to the default provider.
+    """
+
+    def _option(self, pretty=False):
+        option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                  | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        return option | orjson.OPT_INDENT_2 if pretty else option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # json.dumps options orjson has no equivalent for, e.g. custom separators.
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._option(pretty) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def make_json_provider(app):
+    """Returns the provider JSON_BACKEND asks for: 'orjson', 'stdlib', or 'auto' (orjson if installed)."""
+    backend = app.config['JSON_BACKEND']
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Invalid JSON_BACKEND {backend!r}: expected one of {', '.join(JSON_BACKENDS)}.")
+    if backend == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_BACKEND is 'orjson' but orjson is not installed.")
+    if backend == 'stdlib' or orjson is None:
+        return StdlibProvider(app)
+    return OrjsonProvider(app)
+
+def compact_dumps(provider):
+    """A dumps() that formats like the provider's compact responses, for streamed bodies."""
+    if isinstance(provider, OrjsonProvider):
+        return provider.dumps
+    return partial(provider.dumps, separators=(',', ':'))
@@ -0,0 +1,208 @@
+# ==============================================================================
+#  FILE: app/listings.py
+#  DESCRIPTION: Keyset pagination and filters for the listing endpoints.
+# ==============================================================================
+import json
+import base64
+import datetime
+from itertools import islice
+from operator import itemgetter
+
+from .utils import to_utc, from_utc_many
+
+# Sentinels that turn inclusive/exclusive time bounds into (start_time, class_id)
+# keys; also SQLite's INTEGER range, which a cursor's class_id must be within.
+MIN_ID = -(2 ** 63)
+MAX_ID = 2 ** 63 - 1
+
+# Listing rows are plain tuples (see tuple_cursor()) in the order of these
+# columns, read by position. The sort keys are their (start_time, class_id).
+# Rows merged from several studios carry the studio after the columns.
+CLASS_COLUMNS = "class_id, name, start_time, instructor, available_slots"
+BOOKING_COLUMNS = "c.class_id, c.name, c.instructor, c.start_time, b.booking_date"
+CLASS_SORT_KEY = itemgetter(2, 0)
+BOOKING_SORT_KEY = itemgetter(3, 0)
+
+def encode_cursor(start_time, class_id):
+    """Packs the sort key of the last row of a page into an opaque token."""
+    raw = json.dumps([start_time, class_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Unpacks a token from encode_cursor(); raises ValueError if it was tampered with."""
+    try:
+        start_time, class_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if (isinstance(start_time, str) and isinstance(class_id, int) and not isinstance(class_id, bool)
+                and MIN_ID <= class_id <= MAX_ID):
+            return start_time, class_id
+    except (ValueError, TypeError):
+        pass
+    raise ValueError('Invalid cursor.')
+
+def parse_limit(args, default, maximum):
+    """Reads ?limit=, capped at `maximum`."""
+    raw = args.get('limit')
+    if raw is None:
+        return default
+    # isdigit() also accepts digits such as '²' that int() doesn't.
+    if not (raw.isascii() and raw.isdecimal()) or int(raw) < 1:
+        raise ValueError('Invalid limit: must be a positive integer.')
+    return min(int(raw), maximum)
+
+def _parse_local(value, tz, name, end_of_day=False):
+    """Converts a local 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM[:SS]' in tz to a UTC DB string."""
+    try:
+        local = datetime.datetime.fromisoformat(value)
+        if local.tzinfo is not None:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f'Invalid {name}: expected YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS].')
+    # A bare date as the upper bound includes that whole day.
+    if end_of_day and len(value) == 10:
+        local += datetime.timedelta(days=1)
+    return to_utc(local, tz)
+
+def parse_filters(args, tz):
+    """
+    Reads the listing filters from the query string.
+
+    'from' and 'to' are local times in the requested timezone; 'from' is
+    inclusive and 'to' is exclusive (a bare 'to' date includes that day).
+    """
+    filters = {
+        'instructor': args.get('instructor') or None,
+        'name': args.get('name') or None,
+        'from': None,
+        'to': None,
+        'cursor': None,
+    }
+    if args.get('from'):
+        filters['from'] = _parse_local(args['from'], tz, 'from')
+    if args.get('to'):
+        filters['to'] = _parse_local(args['to'], tz, 'to', end_of_day=True)
+    if args.get('cursor'):
+        filters['cursor'] = decode_cursor(args['cursor'])
+    return filters
+
+def lower_bound(filters, after=None):
+    """
+    Folds every lower bound into one (start_time, class_id) key, so the query
+    has a single index range to seek to. Paging deep costs the same as page one.
+
+    `after` is an exclusive time bound such as "now" for upcoming classes.
+    """
+    keys = []
+    if after is not None:
+        keys.append((after, MAX_ID))
+    if filters['from'] is not None:
+        keys.append((filters['from'], MIN_ID))
+    if filters['cursor'] is not None:
+        keys.append(filters['cursor'])
+    return max(keys) if keys else None
+
+def _where(filters, lower, prefix=''):
+    clauses, params = [], []
+    if lower is not None:
+        clauses.append(f"{prefix}start_time >= ? AND ({prefix}start_time > ? OR {prefix}class_id > ?)")
+        params += [lower[0], lower[0], lower[1]]
+    if filters['to'] is not None:
+        clauses.append(f"{prefix}start_time < ?")
+        params.append(filters['to'])
+    if filters['instructor'] is not None:
+        clauses.append(f"{prefix}instructor = ?")
+        params.append(filters['instructor'])
+    if filters['name'] is not None:
+        clauses.append(f"{prefix}name = ?")
+        params.append(filters['name'])
+    return clauses, params
+
+def _limit_param(limit):
+    # One extra row tells whether there is a next page; -1 means no LIMIT.
+    return limit + 1 if limit is not None else -1
+
+def classes_query(filters, now_utc, limit):
+    """Builds the page query for upcoming classes; fetches one extra row to detect more."""
+    clauses, params = _where(filters, lower_bound(filters, after=now_utc))
+    sql = (f"SELECT {CLASS_COLUMNS} FROM Classes WHERE {' AND '.join(clauses)} "
+           f"ORDER BY start_time, class_id LIMIT ?")
+    return sql, params + [_limit_param(limit)]
+
+def bookings_query(filters, email, limit):
+    """Builds the page query for a user's bookings; fetches one extra row to detect more."""
+    clauses, params = _where(filters, lower_bound(filters), prefix='c.')
+    sql = (f"SELECT {BOOKING_COLUMNS} FROM Users u "
+           f"JOIN Bookings b ON b.user_id = u.user_id "
+           f"JOIN Classes c ON c.class_id = b.class_id "
+           f"WHERE {' AND '.join(['u.email = ?'] + clauses)} "
+           f"ORDER BY c.start_time, c.class_id LIMIT ?")
+    return sql, [email] + params + [_limit_param(limit)]
+
+def tuple_cursor(db):
+    """A cursor that returns plain tuples, which are cheaper to fetch than sqlite3.Row."""
+    cursor = db.cursor()
+    cursor.row_factory = None
+    return cursor
+
+def split_page(rows, limit, sort_key):
+    """Returns (rows of this page, cursor for the next page or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], encode_cursor(*sort_key(rows[limit - 1]))
+
+def _add_studios(items, rows):
+    # Only rows tagged with a studio (a sharded deployment) get the field.
+    if rows and len(rows[0]) > 5:
+        for item, row in zip(items, rows):
+            item["studio"] = row[5]
+    return items
+
+def classes_to_json(rows, tz):
+    """Maps CLASS_COLUMNS rows to the response objects, converting start times to tz."""
+    start_times = from_utc_many([row[2] for row in rows], tz)
+    return _add_studios([
+        {
+            "class_id": row[0],
+            "name": row[1],
+            "start_time": start_time,
+            "instructor": row[3],
+            "available_slots": row[4]
+        } for row, start_time in zip(rows, start_times)
+    ], rows)
+
+def bookings_to_json(rows, tz):
+    """Maps BOOKING_COLUMNS rows to the response objects, converting both times to tz."""
+    start_times = from_utc_many([row[3] for row in rows], tz)
+    booking_dates = from_utc_many([row[4] for row in rows], tz)
+    return _add_studios([
+        {
+            "name": row[1],
+            "instructor": row[2],
+            "start_time": start_time,
+            "booking_date": booking_date
+        } for row, start_time, booking_date in zip(rows, start_times, booking_dates)
+    ], rows)
+
+def stream_json(rows, to_json, tz, dumps, chunk_rows, ndjson=False):
+    """
+    Yields rows from a cursor or any other iterator as one JSON array, or as NDJSON lines.
+
+    Rows are fetched, converted and serialized one chunk at a time, so memory
+    stays flat however many rows the query returns.
+    """
+    if not ndjson:
+        yield '['
+    first = True
+    source = iter(rows)
+    while True:
+        rows = list(islice(source, chunk_rows))
+        if not rows:
+            break
+        if ndjson:
+            yield ''.join(dumps(item) + '\n' for item in to_json(rows, tz))
+        else:
+            # One encoder call per chunk: the array minus its brackets.
+            chunk = dumps(to_json(rows, tz))[1:-1]
+            yield chunk if first else ',' + chunk
+        first = False
+    if not ndjson:
+        yield ']'
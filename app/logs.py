@@ -0,0 +1,174 @@
+# ==============================================================================
+#  FILE: app/logs.py
+#  DESCRIPTION: Queue-based logging: request threads enqueue, one thread writes.
+# ==============================================================================
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import datetime
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+
+from .metrics import REGISTRY
+
+LOG_FORMATS = ('json', 'text')
+MAX_REQUEST_ID_LENGTH = 128
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Pass as extra= on high-volume success messages to make them subject to
+# LOG_SUCCESS_SAMPLE_RATE.
+SAMPLED = {'sampled': True}
+
+# (request id, endpoint, perf_counter at start) of the request being handled
+# in this context. One lookup, cheaper than going through Flask's proxies.
+_request_log = contextvars.ContextVar('request_log', default=None)
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the request id, endpoint and time into the request, in the request thread."""
+
+    def filter(self, record):
+        context = _request_log.get()
+        if context is not None:
+            record.request_id, record.endpoint, started = context
+            record.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        return True
+
+class SuccessSampler(logging.Filter):
+    """Keeps a `rate` fraction of the records logged with extra=SAMPLED, and every other record."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return self.rate >= 1.0 or not getattr(record, 'sampled', False) or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, and the request fields when there are any."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in ('request_id', 'endpoint', 'duration_ms'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+# Arguments of these types can't change after the call, so merging them into
+# the message can safely wait for the listener thread.
+IMMUTABLE_ARGS = frozenset((str, int, float, bool, bytes, type(None)))
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    A QueueHandler that leaves formatting to the listener thread where it can.
+
+    The standard one formats the message before enqueueing it, so the request
+    thread would still pay for it. Here a record whose %-style arguments are
+    all strings, numbers or None is enqueued as is, and the listener merges
+    them and writes the JSON. Other arguments (a dict, a list, any object)
+    could change before the listener gets to them, so those messages are
+    merged in the calling thread, as QueueHandler would. When the queue is
+    full, records are dropped and counted rather than blocking.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args and (isinstance(args, dict) or any(type(arg) not in IMMUTABLE_ARGS for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            REGISTRY.inc('log_records_dropped_total')
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+def _start_listener(stream):
+    global _listener
+    _listener = QueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener():
+    # Stopping drains the queue, so the last records of a worker are written.
+    if _listener is not None:
+        _listener.stop()
+
+def _restart_in_child():
+    # The listener thread doesn't survive fork(); a preloaded worker starts its
+    # own, on a new queue, as the parent's may be mid-use and holds its records.
+    if _listener is not None:
+        _handler.queue = queue.Queue(_handler.queue.maxsize)
+        _start_listener(*_listener.handlers)
+
+os.register_at_fork(after_in_child=_restart_in_child)
+
+def configure_logging(config):
+    """
+    Routes the root logger through a bounded queue to a listener thread that
+    formats and writes to stderr, once per process. Like logging.basicConfig(),
+    it leaves a root logger that already has handlers (e.g. from pytest or
+    the server) alone. Returns the listener, or None if it didn't install one.
+    """
+    global _handler
+    fmt = config['LOG_FORMAT']
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"Invalid LOG_FORMAT {fmt!r}: expected one of {', '.join(LOG_FORMATS)}.")
+    root = logging.getLogger()
+    with _lock:
+        if _listener is not None or root.handlers:
+            return None
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+        _handler = DeferredQueueHandler(queue.Queue(config['LOG_QUEUE_SIZE']))
+        _handler.addFilter(SuccessSampler(config['LOG_SUCCESS_SAMPLE_RATE']))
+        _handler.addFilter(RequestContextFilter())
+        root.addHandler(_handler)
+        root.setLevel(config['LOG_LEVEL'])
+        _start_listener(stream)
+        atexit.register(_stop_listener)
+        return _listener
+
+def _before_request():
+    started = time.perf_counter()
+    # Keep a caller's id so its logs and ours correlate, if it is a sane one.
+    request_id = request.headers.get('X-Request-ID', '')
+    if not 0 < len(request_id) <= MAX_REQUEST_ID_LENGTH or not request_id.isprintable():
+        request_id = os.urandom(8).hex()
+    g.request_id = request_id
+    _request_log.set((request_id, request.url_rule.rule if request.url_rule else None, started))
+
+def _after_request(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+def _teardown_request(exc):
+    # Worker threads serve one request after another; don't leak the context.
+    _request_log.set(None)
+
+def init_app(app):
+    """Configures process logging and tags every request with an X-Request-ID for its records."""
+    configure_logging(app.config)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,342 @@
+# ==============================================================================
+#  FILE: app/metrics.py
+#  DESCRIPTION: Low-overhead request/SQL instrumentation and a /metrics endpoint.
+# ==============================================================================
+import os
+import re
+import glob
+import json
+import time
+import fcntl
+import atexit
+import bisect
+import contextlib
+import sqlite3
+import threading
+from flask import g, request, current_app
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint, method and status.'),
+    'sqlite_statement_duration_seconds': ('summary', 'Time spent executing each SQL statement.'),
+    'sqlite_lock_wait_seconds': ('histogram', 'Time spent waiting in BEGIN IMMEDIATE for the write lock.'),
+    'sqlite_busy_retries_total': ('counter', 'Write transactions retried after SQLITE_BUSY.'),
+    'sqlite_busy_giveups_total': ('counter', 'Write transactions that failed after every busy retry.'),
+    'read_snapshot_stale_total': ('counter', 'Reads sent to the read-only pool because the snapshot was too old.'),
+    'read_snapshot_copy_seconds': ('histogram', 'Time spent copying the database into a read snapshot.'),
+    'admission_rejected_total': ('counter', 'Write requests turned away by rate limit or admission control.'),
+    'admission_queue_wait_seconds': ('histogram', 'Time write requests waited for an admission slot.'),
+    'log_records_dropped_total': ('counter', 'Log records dropped because the log queue was full.'),
+}
+
+class Registry:
+    """
+    Counters, summaries and histograms for one process.
+
+    Every update is a dict lookup and a few additions under one lock, so
+    recording stays well under a microsecond. Values are kept per process
+    and merged across workers when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, seconds, buckets=LATENCY_BUCKETS):
+        """Records a duration; `buckets=None` keeps only the count and sum."""
+        key = (name, labels)
+        with self._lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [0, 0.0, [0] * (len(buckets) + 1) if buckets else None, buckets]
+            entry[0] += 1
+            entry[1] += seconds
+            if buckets:
+                entry[2][bisect.bisect_left(buckets, seconds)] += 1
+
+    def snapshot(self):
+        """A JSON-serializable copy of every value."""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), count, total, counts and list(counts), buckets and list(buckets)]
+                               for (name, labels), (count, total, counts, buckets) in self.histograms.items()],
+            }
+
+REGISTRY = Registry()
+# A forked worker starts from zero instead of re-reporting its parent's numbers.
+os.register_at_fork(after_in_child=REGISTRY.reset)
+
+_labels_cache = {}
+
+def statement_label(sql):
+    """Normalizes SQL to a bounded label: collapsed whitespace, IN-lists folded, truncated."""
+    label = _labels_cache.get(sql)
+    if label is None:
+        label = re.sub(r'\s+', ' ', sql).strip()
+        label = re.sub(r'\(\?(, ?\?)+\)', '(?...)', label)[:160]
+        if len(_labels_cache) < 4096:
+            _labels_cache[sql] = label
+    return label
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times every execute()/executemany() per normalized statement."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            REGISTRY.observe('sqlite_statement_duration_seconds', (statement_label(sql),),
+                             time.perf_counter() - started, buckets=None)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            REGISTRY.observe('sqlite_statement_duration_seconds', (statement_label(sql),),
+                             time.perf_counter() - started, buckets=None)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose cursors, including those behind execute(), are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these shortcuts bypass cursor(), so route them through it.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# --- Multi-process aggregation ---
+
+# Values of workers that have exited, so that totals never go down.
+AGGREGATE_FILE = 'metrics-aggregate.json'
+
+_published_pid = None  # The process that owns metrics-{pid}.json, once it has written it.
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+@contextlib.contextmanager
+def _locked(directory, mode):
+    """Holds the directory's lock file: shared to read the snapshots, exclusive to fold one into the aggregate."""
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as f:
+        fcntl.flock(f, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _replace(path, snap):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(snap, f)
+    os.replace(tmp, path)
+
+def _fold(directory, snap, pid):
+    """Adds `snap` to the aggregate and removes the snapshot of `pid`; call with the lock held exclusively."""
+    aggregate = os.path.join(directory, AGGREGATE_FILE)
+    _replace(aggregate, _dump(*_merge([s for s in (_read(aggregate), snap) if s])))
+    try:
+        os.remove(_snapshot_path(directory, pid))
+    except FileNotFoundError:
+        pass
+
+def write_snapshot(directory):
+    """
+    Atomically publishes this process's values for the other workers to merge.
+    A file already at this pid belongs to an earlier worker that was killed
+    before it could fold itself in, so it is folded in first.
+    """
+    global _published_pid
+    path = _snapshot_path(directory, os.getpid())
+    if _published_pid != os.getpid():
+        with _locked(directory, fcntl.LOCK_EX):
+            stale = _read(path)
+            if stale:
+                _fold(directory, stale, os.getpid())
+        _published_pid = os.getpid()
+    _replace(path, REGISTRY.snapshot())
+
+def remove_snapshot(directory):
+    """Folds this process's final values into the aggregate as it exits, in place of its own snapshot."""
+    with _locked(directory, fcntl.LOCK_EX):
+        _fold(directory, REGISTRY.snapshot(), os.getpid())
+
+def mark_process_dead(directory, pid):
+    """Folds in the snapshot of a worker that was killed, e.g. from gunicorn's child_exit hook."""
+    with _locked(directory, fcntl.LOCK_EX):
+        stale = _read(_snapshot_path(directory, pid))
+        if stale:
+            _fold(directory, stale, pid)
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, count, total, counts, buckets in snap['histograms']:
+            key = (name, tuple(labels))
+            merged = histograms.setdefault(key, [0, 0.0, [0] * len(counts) if counts else None, buckets])
+            merged[0] += count
+            merged[1] += total
+            if counts:
+                merged[2] = [a + b for a, b in zip(merged[2], counts)]
+    return counters, histograms
+
+def _dump(counters, histograms):
+    """The snapshot() layout for merged values."""
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), *entry] for (name, labels), entry in histograms.items()],
+    }
+
+def collect(directory=None):
+    """
+    Merges the live values of this process with the snapshots of the others
+    and the aggregate of those that have exited. A worker that was killed
+    keeps its last snapshot in the sum until its pid is reused or it is
+    marked dead, so the totals only ever grow.
+    """
+    snapshots = [REGISTRY.snapshot()]
+    if directory:
+        # Skip our own file only once we have written it; until then it is a killed predecessor's.
+        own = _snapshot_path(directory, os.getpid()) if _published_pid == os.getpid() else None
+        with _locked(directory, fcntl.LOCK_SH):
+            for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+                name = os.path.basename(path)
+                if path == own or not (name == AGGREGATE_FILE or name[len('metrics-'):-len('.json')].isdecimal()):
+                    continue
+                try:
+                    snap = _read(path)
+                except (OSError, ValueError):
+                    continue  # Being replaced right now; next scrape will see it.
+                if snap:
+                    snapshots.append(snap)
+    return _merge(snapshots)
+
+LABEL_NAMES = {
+    'http_request_duration_seconds': ('endpoint', 'method', 'status'),
+    'sqlite_statement_duration_seconds': ('statement',),
+    'admission_rejected_total': ('reason',),
+}
+
+def _format_labels(name, labels, extra=()):
+    names = LABEL_NAMES.get(name, ())
+    pairs = list(zip(names, labels)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def render(counters, histograms, gauges=()):
+    """Renders merged values in the Prometheus text exposition format."""
+    lines = []
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(('counter', labels, value))
+    for (name, labels), value in histograms.items():
+        by_name.setdefault(name, []).append(('histogram', labels, value))
+    for name in sorted(by_name):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for entry_kind, labels, value in by_name[name]:
+            if entry_kind == 'counter':
+                lines.append(f'{name}{_format_labels(name, labels)} {value}')
+                continue
+            count, total, counts, buckets = value
+            if counts:
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(name, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(name, labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(name, labels)} {count}')
+    for name, help_text, samples in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(name, (), labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+# --- Flask wiring ---
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REGISTRY.observe('http_request_duration_seconds', (endpoint, request.method, str(response.status_code)),
+                         time.perf_counter() - started)
+    directory = current_app.config['METRICS_MULTIPROC_DIR']
+    if directory:
+        state = current_app.extensions['metrics']
+        now = time.monotonic()
+        if now - state['last_flush'] >= current_app.config['METRICS_FLUSH_INTERVAL']:
+            state['last_flush'] = now
+            write_snapshot(directory)
+    return response
+
+def process_gauges():
+    """Point-in-time values of this worker, labelled with its pid."""
+    from .database import pool_stats, snapshot_ages
+    pid = ('pid', os.getpid())
+    gauges = [('read_snapshot_age_seconds', 'Seconds since the read snapshot last matched the database.',
+               [([('database', name), pid], round(age, 3)) for name, age in snapshot_ages().items()])]
+    pools = pool_stats()
+    for field, help_text in (('in_use', 'Connections borrowed from the pool.'), ('idle', 'Idle pooled connections.')):
+        gauges.append((f'sqlite_pool_{field}', help_text,
+                       [([('database', name), pid], stats[field]) for name, stats in pools.items()]))
+    gate = current_app.extensions.get('admission_gate')
+    if gate is not None and gate.pid == os.getpid():
+        gauges.append(('admission_in_flight', 'Write requests running in this worker.', [([pid], gate.in_flight)]))
+        gauges.append(('admission_waiting', 'Write requests queued for a slot in this worker.', [([pid], gate.waiting)]))
+    caches = current_app.extensions.get('response_caches', {})
+    for field in ('hits', 'misses'):
+        gauges.append((f'response_cache_{field}', f'Response cache {field} in this worker.',
+                       [([('cache', name), pid], getattr(cache, field)) for name, cache in caches.items()]))
+    return gauges
+
+def metrics_view():
+    counters, histograms = collect(current_app.config['METRICS_MULTIPROC_DIR'])
+    body = render(counters, histograms, process_gauges())
+    return current_app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    """Attaches the request hooks and the /metrics endpoint when METRICS_ENABLED is set."""
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.extensions['metrics'] = {'last_flush': 0.0}
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    directory = app.config['METRICS_MULTIPROC_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(remove_snapshot, directory)
@@ -0,0 +1,211 @@
+# ==============================================================================
+#  FILE: app/migrations.py
+#  DESCRIPTION: Numbered, in-place schema migrations and query plan checks.
+# ==============================================================================
+import sqlite3
+
+# Each migration is (version, name, statements). Versions only ever grow;
+# never edit a migration that has shipped, add a new one instead.
+MIGRATIONS = [
+    (1, 'base tables', (
+        '''CREATE TABLE IF NOT EXISTS Users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Classes (
+            class_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            start_time TEXT NOT NULL,
+            instructor VARCHAR(100) NOT NULL,
+            capacity INTEGER NOT NULL,
+            available_slots INTEGER NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Bookings (
+            booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            class_id INTEGER NOT NULL,
+            booking_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES Users(user_id),
+            FOREIGN KEY (class_id) REFERENCES Classes(class_id)
+        )''',
+    )),
+    (2, 'one booking per user and class', (
+        # Databases created before this constraint may hold duplicates; keep the first.
+        '''DELETE FROM Bookings WHERE booking_id NOT IN (
+            SELECT MIN(booking_id) FROM Bookings GROUP BY user_id, class_id
+        )''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_bookings_user_class ON Bookings (user_id, class_id)',
+    )),
+    (3, 'indexes for route queries', (
+        # Covers the upcoming-classes range scan and its ORDER BY.
+        'CREATE INDEX IF NOT EXISTS ix_classes_start_time ON Classes (start_time, name, instructor, available_slots)',
+        # Bookings of a class, e.g. for joins that start from Classes.
+        'CREATE INDEX IF NOT EXISTS ix_bookings_class ON Bookings (class_id)',
+    )),
+    (4, 'data versions for response caching', (
+        # A generation token tells databases apart (e.g. after init-db), and
+        # the version is bumped by triggers on every write to Classes, so any
+        # worker can tell whether a cached listing is still current.
+        '''CREATE TABLE IF NOT EXISTS DataVersions (
+            name TEXT PRIMARY KEY,
+            generation TEXT NOT NULL DEFAULT (lower(hex(randomblob(8)))),
+            version INTEGER NOT NULL DEFAULT 0
+        )''',
+        "INSERT OR IGNORE INTO DataVersions (name) VALUES ('classes')",
+        '''CREATE TRIGGER IF NOT EXISTS tr_classes_insert_version AFTER INSERT ON Classes
+        BEGIN UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS tr_classes_update_version AFTER UPDATE ON Classes
+        BEGIN UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS tr_classes_delete_version AFTER DELETE ON Classes
+        BEGIN UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'; END''',
+    )),
+    (5, 'keyset pagination and listing filters', (
+        # Ordered by the (start_time, class_id) page key so pages need no sort.
+        'DROP INDEX IF EXISTS ix_classes_start_time',
+        'CREATE INDEX IF NOT EXISTS ix_classes_start_time_id ON Classes (start_time, class_id, name, instructor, available_slots)',
+        # Filter indexes leave out available_slots so bookings don't have to update them.
+        'CREATE INDEX IF NOT EXISTS ix_classes_instructor ON Classes (instructor, start_time, class_id)',
+        'CREATE INDEX IF NOT EXISTS ix_classes_name ON Classes (name, start_time, class_id)',
+    )),
+    (6, 'natural key for class imports', (
+        # `flask import-classes` upserts on this key. On a database that
+        # already holds two identical classes this fails and leaves the schema
+        # at version 5; merge them by hand first, as bookings may point at both.
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_classes_natural_key ON Classes (name, instructor, start_time)',
+    )),
+    (7, 'recurring class schedules', (
+        # A weekly slot: weekday (Monday is 0) and local_time in timezone,
+        # from starts_on to ends_on inclusive, both local dates.
+        '''CREATE TABLE IF NOT EXISTS ClassSchedules (
+            schedule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            instructor VARCHAR(100) NOT NULL,
+            weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+            local_time TEXT NOT NULL,
+            timezone TEXT NOT NULL,
+            capacity INTEGER NOT NULL,
+            starts_on TEXT NOT NULL,
+            ends_on TEXT NOT NULL DEFAULT '9999-12-31'
+        )''',
+        'CREATE INDEX IF NOT EXISTS ix_class_schedules_ends_on ON ClassSchedules (ends_on)',
+        # Occurrences only get a Classes row once someone books them.
+        'ALTER TABLE Classes ADD COLUMN schedule_id INTEGER REFERENCES ClassSchedules(schedule_id)',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS ux_classes_occurrence ON Classes (schedule_id, start_time)
+        WHERE schedule_id IS NOT NULL''',
+        # Schedules feed the classes listing, so they share its data version.
+        '''CREATE TRIGGER IF NOT EXISTS tr_class_schedules_insert_version AFTER INSERT ON ClassSchedules
+        BEGIN UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS tr_class_schedules_update_version AFTER UPDATE ON ClassSchedules
+        BEGIN UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS tr_class_schedules_delete_version AFTER DELETE ON ClassSchedules
+        BEGIN UPDATE DataVersions SET version = version + 1 WHERE name = 'classes'; END''',
+    )),
+    (8, 'slot availability change log', (
+        # Every committed change to available_slots, whichever path made it,
+        # for GET /api/classes/stream. Each worker tails this table.
+        '''CREATE TABLE IF NOT EXISTS SlotEvents (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            available_slots INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS tr_classes_slot_events AFTER UPDATE OF available_slots ON Classes
+        WHEN NEW.available_slots IS NOT OLD.available_slots
+        BEGIN INSERT INTO SlotEvents (class_id, available_slots) VALUES (NEW.class_id, NEW.available_slots); END''',
+        # Keep the last 100000 events, enough for clients to resume after a
+        # reconnect; older Last-Event-IDs get a reset event instead.
+        '''CREATE TRIGGER IF NOT EXISTS tr_slot_events_prune AFTER INSERT ON SlotEvents
+        BEGIN DELETE FROM SlotEvents WHERE event_id <= NEW.event_id - 100000; END''',
+    )),
+    (9, 'waitlists', (
+        '''CREATE TABLE IF NOT EXISTS WaitlistQueues (
+            class_id INTEGER PRIMARY KEY,
+            next_position INTEGER NOT NULL,
+            waiting INTEGER NOT NULL,
+            FOREIGN KEY (class_id) REFERENCES Classes(class_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Waitlist (
+            waitlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES Users(user_id),
+            FOREIGN KEY (class_id) REFERENCES Classes(class_id)
+        )''',
+        # The head of a class's queue is the first entry of this index.
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_waitlist_class_position ON Waitlist (class_id, position)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_waitlist_user_class ON Waitlist (user_id, class_id)',
+    )),
+    (10, 'idempotency keys', (
+        # The outcome of POST /api/book per Idempotency-Key; expires_at is in
+        # Unix seconds and indexed so expired keys go in one range DELETE.
+        '''CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+            key TEXT PRIMARY KEY,
+            request_hash TEXT NOT NULL,
+            booking_id INTEGER,
+            waitlist_id INTEGER,
+            position INTEGER,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON IdempotencyKeys (expires_at)',
+    )),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(db):
+    """Returns the migration version recorded in the database header."""
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db):
+    """Applies every pending migration in order and returns their versions."""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.commit()
+
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        if version <= schema_version(db):
+            continue
+        cursor = db.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Another worker may have applied it while we waited for the lock.
+            if version <= schema_version(db):
+                db.rollback()
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            cursor.execute(f'PRAGMA user_version = {version}')
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def full_scans(db, sql, params=()):
+    """Returns the EXPLAIN QUERY PLAN steps of a statement that scan a whole table."""
+    plan = db.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    # Scanning a constant row or a table-valued function such as json_each()
+    # walks the statement's own parameters, not a stored table.
+    return [row[3] for row in plan
+            if row[3].startswith('SCAN ') and row[3] != 'SCAN CONSTANT ROW' and 'VIRTUAL TABLE' not in row[3]]
+
+def check_query_plans(db, queries):
+    """Maps each named query that falls back to a SCAN to its offending plan steps."""
+    failures = {}
+    for name, (sql, params) in queries.items():
+        scans = full_scans(db, sql, params)
+        if scans:
+            failures[name] = scans
+    return failures
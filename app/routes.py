@@ -2,110 +2,477 @@
 #  FILE: app/routes.py
 #  DESCRIPTION: API endpoints with timezone and validation handling.
 # ==============================================================================
+import time
+import heapq
 import sqlite3
 import datetime
 import logging
-import re
-import pytz
-from flask import request, jsonify, Blueprint
+from itertools import islice
+from urllib.parse import urlencode
+from flask import request, jsonify, Blueprint, current_app, stream_with_context
 
-from .database import get_db
-from .utils import from_utc, UTC
+from .database import get_db, get_read_db, get_pool, run_write_transaction, is_busy_error
+from .events import get_event_hub, subscribe, EVENTS_AFTER_SQL
+from .booking import (validate_booking, resolve_users, reserve_once, reserve_each, cancel_booking,
+                      leave_waitlist, IdempotencyConflict, FIND_USERS_SQL, TAKE_SLOT_SQL, CLASS_START_SQL,
+                      IS_BOOKED_SQL, WAITLIST_HEAD_SQL, FIND_WAITLIST_SQL, FIND_BOOKING_SQL, FIND_IDEMPOTENT_SQL)
+from .idempotency import (get_idempotency_cache, parse_key, request_hash, find_outcome, StoredOutcome,
+                          EVICT_EXPIRED_SQL)
+from .cache import CachedResponse, DATA_VERSION_SQL, data_version, get_response_cache, make_etag
+from .listings import (parse_filters, parse_limit, lower_bound, classes_query, bookings_query, split_page,
+                       tuple_cursor, classes_to_json, bookings_to_json, stream_json, CLASS_SORT_KEY,
+                       BOOKING_SORT_KEY)
+from .schedules import (virtual_classes, horizon, schedules_query, SCHEDULE_SQL, MATERIALIZED_SQL,
+                        FIND_OCCURRENCE_SQL)
+from .json_provider import compact_dumps
+from .admission import admit_writes
+from .shards import get_shards, shard_for_studio, shard_for_id, tag_rows, gather
+from .utils import get_timezone, UTC
+from .logs import SAMPLED
 
 bp = Blueprint('api', __name__)
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# --- SQL run by the routes below (booking SQL lives in booking.py) ---
+SAMPLE_FILTERS = [
+    {'instructor': None, 'name': None, 'from': None, 'to': None, 'cursor': None},
+    {'instructor': 'Mike', 'name': None, 'from': '2025-07-01 00:00:00', 'to': '2025-08-01 00:00:00',
+     'cursor': ('2025-07-08 02:30:00', 1)},
+    {'instructor': None, 'name': 'Yoga Flow', 'from': None, 'to': None, 'cursor': None},
+]
+
+# Every read or keyed write the routes run, with sample parameters, so that
+# `flask check-query-plans` and the tests can EXPLAIN them.
+ROUTE_QUERIES = {
+    'data_version': (DATA_VERSION_SQL, ('classes',)),
+    'find_users': (FIND_USERS_SQL, ('["alice@example.com"]',)),
+    'take_slot': (TAKE_SLOT_SQL, (1, '2025-01-01 00:00:00')),
+    'class_start': (CLASS_START_SQL, (1,)),
+    'schedule': (SCHEDULE_SQL, (1,)),
+    'materialized_occurrences': (MATERIALIZED_SQL, ('[1, 2]', '2025-01-01 00:00:00', '2025-04-01 00:00:00')),
+    'find_occurrence': (FIND_OCCURRENCE_SQL, (1, '2025-01-01 00:00:00')),
+    'slot_events': (EVENTS_AFTER_SQL, (1, 1000)),
+    'is_booked': (IS_BOOKED_SQL, (1, 1)),
+    'waitlist_head': (WAITLIST_HEAD_SQL, (1,)),
+    'find_waitlist': (FIND_WAITLIST_SQL, (1, 'alice@example.com')),
+    'find_booking': (FIND_BOOKING_SQL, (1, 'alice@example.com')),
+    'find_idempotency_key': (FIND_IDEMPOTENT_SQL, ('3f1c9a0e-key', 1735689600)),
+    'evict_idempotency_keys': (EVICT_EXPIRED_SQL, (1735689600,)),
+}
+for i, sample in enumerate(SAMPLE_FILTERS):
+    ROUTE_QUERIES[f'classes_page_{i}'] = classes_query(sample, '2025-01-01 00:00:00', 100)
+    ROUTE_QUERIES[f'schedules_{i}'] = schedules_query(sample, '2025-01-01')
+    ROUTE_QUERIES[f'bookings_page_{i}'] = bookings_query(sample, 'alice@example.com', 100)
+
+def stream_format():
+    """Returns 'ndjson' or 'json' when the client asked for a streamed listing, else None."""
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if request.args.get('stream') in ('1', 'true'):
+        return 'json'
+    return None
+
+def request_shards():
+    """The shard of ?studio=, or every shard without it; raises ValueError for an unknown studio."""
+    studio = request.args.get('studio')
+    if studio is None:
+        return get_shards()
+    try:
+        return [shard_for_studio(studio)]
+    except LookupError as e:
+        raise ValueError(str(e))
+
+def read_listing_args(tz_default='UTC'):
+    """Parses the timezone, filter, paging and studio arguments shared by the listings."""
+    try:
+        user_tz = get_timezone(request.args.get('timezone', tz_default))
+    except KeyError:  # pytz.UnknownTimeZoneError
+        raise ValueError('Invalid timezone specified.')
+    filters = parse_filters(request.args, user_tz)
+    # Streamed exports return every row unless a limit is asked for explicitly.
+    default = None if stream_format() else current_app.config['PAGE_SIZE_DEFAULT']
+    limit = parse_limit(request.args, default, current_app.config['PAGE_SIZE_MAX'])
+    return user_tz, filters, limit, request_shards()
+
+def streamed_listing(rows, to_json, tz):
+    """Streams the rows of an executed query (or any row iterator) through a generator response."""
+    fmt = stream_format()
+    chunks = stream_json(rows, to_json, tz, compact_dumps(current_app.json),
+                         current_app.config['STREAM_CHUNK_ROWS'], ndjson=fmt == 'ndjson')
+    mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else 'application/json'
+    return current_app.response_class(stream_with_context(chunks), mimetype=mimetype)
+
+def page_headers(next_cursor):
+    """X-Next-Cursor and an RFC 8288 Link header pointing at the next page."""
+    if next_cursor is None:
+        return {}
+    args = request.args.to_dict()
+    args['cursor'] = next_cursor
+    return {'X-Next-Cursor': next_cursor, 'Link': f'<{request.base_url}?{urlencode(args)}>; rel="next"'}
+
+def upcoming_classes(db, filters, now, limit):
+    """
+    Merges the Classes rows with the not yet booked occurrences of recurring
+    schedules, in (start_time, class_id) order, so both page and stream alike.
+    Occurrences are only expanded up to SCHEDULE_HORIZON_DAYS ahead.
+    """
+    now_utc = now.strftime('%Y-%m-%d %H:%M:%S')
+    upper = horizon(now, current_app.config['SCHEDULE_HORIZON_DAYS'])
+    if filters['to'] is not None:
+        upper = min(upper, filters['to'])
+    virtual = virtual_classes(db, filters, lower_bound(filters, after=now_utc), upper)
+    cursor = tuple_cursor(db)
+    cursor.execute(*classes_query(filters, now_utc, limit))
+    return heapq.merge(cursor, virtual, key=CLASS_SORT_KEY)
+
+def merge_shards(fetch, shards, key):
+    """
+    Runs fetch(shard) on every shard in parallel and merges the sorted rows
+    they return by `key`, each tagged with its studio. Ids are unique across
+    shards, so a keyset cursor from the merged order works on every shard.
+    """
+    results = gather(fetch, shards)
+    if len(shards) == 1:
+        return tag_rows(results[0], shards[0])
+    return heapq.merge(*(tag_rows(rows, shard) for rows, shard in zip(results, shards)), key=key)
+
 @bp.route('/classes', methods=['GET'])
 def get_classes():
     try:
-        user_tz_str = request.args.get('timezone', 'UTC')
-        user_tz = pytz.timezone(user_tz_str)
-    except pytz.UnknownTimeZoneError:
-        return jsonify({'error': 'Invalid timezone specified.'}), 400
+        user_tz, filters, limit, shards = read_listing_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    db = get_db()
-    cursor = db.cursor()
-    
-    now_utc = datetime.datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute("SELECT class_id, name, start_time, instructor, available_slots FROM Classes WHERE start_time > ? ORDER BY start_time ASC", (now_utc,))
-    classes_utc = cursor.fetchall()
-
-    # Convert UTC times from DB to user's specified timezone for display
-    classes_list = [
-        {
-            "class_id": row["class_id"],
-            "name": row["name"],
-            "start_time": from_utc(row["start_time"], user_tz),
-            "instructor": row["instructor"],
-            "available_slots": row["available_slots"]
-        } for row in classes_utc
-    ]
-    
-    return jsonify(classes_list)
+    dbs = {shard: get_read_db(shard) for shard in shards}
+    now = datetime.datetime.now(UTC)
+    now_utc = now.strftime('%Y-%m-%d %H:%M:%S')
+    if stream_format():
+        rows = merge_shards(lambda shard: upcoming_classes(dbs[shard], filters, now, limit), shards, CLASS_SORT_KEY)
+        return streamed_listing(islice(rows, limit) if limit else rows, classes_to_json, user_tz)
 
-@bp.route('/book', methods=['POST'])
-def book_class():
-    data = request.get_json()
-    # Check for missing fields
-    required = ['class_id', 'client_name', 'client_email']
-    if not data or not all(k in data for k in required):
-        return jsonify({'error': f'Missing data: {", ".join(required)} are required.'}), 400
-
-    # Add basic input validation
-    if not isinstance(data['class_id'], int):
-        return jsonify({'error': 'Invalid class_id: must be an integer.'}), 400
-    
-    client_email = data['client_email'].lower() # Normalize email
-    if not re.match(r"[^@]+@[^@]+\.[^@]+", client_email):
-        return jsonify({'error': 'Invalid email format.'}), 400
+    # Read the versions before the rows: a write landing in between then only
+    # makes the stored entry look older than it is, never newer.
+    cache = get_response_cache('classes')
+    cache_key = (user_tz.zone, limit, tuple(shard.studio for shard in shards)) + tuple(sorted(filters.items()))
+    version = tuple(data_version(dbs[shard], 'classes') for shard in shards) if cache else None
+    cached = cache.get(cache_key, version, now_utc) if cache else None
+
+    if cached is None:
+        # Each shard reads its own page, in parallel; the merge keeps the first limit + 1.
+        rows = merge_shards(lambda shard: list(islice(upcoming_classes(dbs[shard], filters, now, limit), limit + 1)),
+                            shards, CLASS_SORT_KEY)
+        rows = list(islice(rows, limit + 1))
+        classes_utc, next_cursor = split_page(rows, limit, CLASS_SORT_KEY)
 
-    class_id = data['class_id']
-    client_name = data['client_name']
+        # Convert UTC times from DB to user's specified timezone for display
+        body = jsonify(classes_to_json(classes_utc, user_tz)).get_data()
+        # The schedule expansion window moves on at every UTC midnight.
+        expires_at = horizon(now, 1)
+        if classes_utc:
+            expires_at = min(expires_at, classes_utc[0][2])  # start_time
+        cached = CachedResponse(version, expires_at, make_etag(body), body, page_headers(next_cursor))
+        if cache:
+            cache.put(cache_key, cached)
 
-    db = get_db()
-    cursor = db.cursor()
+    response = current_app.response_class(cached.body, mimetype='application/json', headers=cached.headers)
+    response.set_etag(cached.etag)
+    return response.make_conditional(request)
 
+@bp.route('/classes/stream', methods=['GET'])
+def stream_slot_changes():
+    """Pushes {class_id, available_slots} as Server-Sent Events whenever seats change, for one studio."""
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    if last_event_id is not None and not last_event_id.isdigit():
+        return jsonify({'error': 'Invalid Last-Event-ID: must be an event id.'}), 400
+    # Event ids count per shard, so a stream follows one studio's log.
     try:
-        cursor.execute('BEGIN')
+        shard = shard_for_studio(request.args.get('studio'))
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 400
 
-        cursor.execute("SELECT user_id FROM Users WHERE email = ?", (client_email,))
-        user = cursor.fetchone()
-        if user:
-            user_id = user['user_id']
-        else:
-            cursor.execute("INSERT INTO Users (name, email, password_hash) VALUES (?, ?, ?)",
-                           (client_name, client_email, 'dummy_password'))
-            user_id = cursor.lastrowid
+    hub = get_event_hub(shard.database)
+    config = current_app.config
+    after_id = int(last_event_id) if last_event_id is not None else hub.last_id
+    # No stream_with_context: the request's pooled connection goes back as
+    # soon as this returns, and the stream borrows one only to catch up.
+    events = subscribe(hub, get_pool(database=shard.database), after_id, config['SSE_HEARTBEAT_SECONDS'],
+                       config['SSE_MAX_STREAM_SECONDS'], config['SSE_BACKLOG_BATCH'])
+    return current_app.response_class(events, mimetype='text/event-stream',
+                                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def reservation_json(reservation):
+    """The response object for a booking, or for a place on the waitlist."""
+    if reservation.booking_id is not None:
+        return {'success': True, 'message': 'Booking confirmed!', 'booking_id': reservation.booking_id}
+    return {'success': False, 'waitlisted': True, 'message': 'The class is full; you are on the waitlist.',
+            'waitlist_id': reservation.waitlist_id, 'position': reservation.position}
+
+def busy_response(e):
+    """Answers 503 once a write transaction has exhausted its busy retries."""
+    logging.error("Booking gave up after busy retries: %s", e)
+    return jsonify({'error': 'The studio is busy, please try again.'}), 503, {'Retry-After': '1'}
 
-        # Check class availability and that it hasn't started
+def reserve_in_group(booking, shard):
+    """
+    Hands a booking to the shard's group-commit writer and waits at most
+    GROUP_COMMIT_TIMEOUT for its transaction. Returns the Reservation or
+    raises the booking's error, or TimeoutError if the writer didn't answer.
+    """
+    from .group_commit import get_booking_writer, WriterStopped
+    timeout = current_app.config['GROUP_COMMIT_TIMEOUT']
+    try:
+        future = get_booking_writer(shard.database).submit(booking)
+        try:
+            reservation, error = future.result(timeout)
+        except TimeoutError:
+            # Still queued: withdraw it. Already in a transaction: let that finish.
+            if future.cancel():
+                raise
+            reservation, error = future.result(timeout)
+    except WriterStopped as e:
+        raise TimeoutError(str(e)) from e
+    if error:
+        raise error
+    return reservation
+
+def place_booking(booking, shard):
+    """Runs one validated booking in its class's shard; returns (reservation, error_response) like run_cancellation()."""
+    def reserve(cursor):
+        user_ids = resolve_users(cursor, [booking])
         now_utc = datetime.datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')
-        cursor.execute("SELECT available_slots, start_time FROM Classes WHERE class_id = ?", (class_id,))
-        class_info = cursor.fetchone()
-
-        if not class_info:
-            raise ValueError("Class not found.")
-        if class_info['start_time'] <= now_utc:
-            raise ValueError("Cannot book a class that has already started.")
-        if class_info['available_slots'] <= 0:
-            raise ValueError("No available slots for this class.")
-        
-        # Check if user is already booked for this class
-        cursor.execute("SELECT booking_id FROM Bookings WHERE user_id = ? AND class_id = ?", (user_id, class_id))
-        if cursor.fetchone():
-            raise ValueError("You are already booked for this class.")
-
-        cursor.execute("UPDATE Classes SET available_slots = available_slots - 1 WHERE class_id = ?", (class_id,))
-        cursor.execute("INSERT INTO Bookings (user_id, class_id) VALUES (?, ?)", (user_id, class_id))
-        booking_id = cursor.lastrowid
-        
-        db.commit()
-        
-        logging.info(f"Booking successful for {client_email} for class_id {class_id}. ID: {booking_id}")
-        return jsonify({'success': True, 'message': 'Booking confirmed!', 'booking_id': booking_id}), 201
+        return reserve_once(cursor, user_ids[booking['client_email']], booking, now_utc)
 
+    try:
+        if current_app.config['BOOKING_GROUP_COMMIT']:
+            # The writer thread commits this booking together with concurrent ones.
+            reservation = reserve_in_group(booking, shard)
+        else:
+            reservation = run_write_transaction(get_db(shard), reserve)
+    except TimeoutError as e:
+        logging.error("Booking writer did not answer: %s", e)
+        return None, (jsonify({'error': 'The studio is busy, please try again.'}), 503, {'Retry-After': '1'})
+    except IdempotencyConflict as e:
+        return None, (jsonify({'error': str(e)}), 422)
+    except sqlite3.OperationalError as e:
+        if is_busy_error(e):
+            return None, busy_response(e)
+        logging.error("Error during booking: %s", e)
+        return None, (jsonify({'error': str(e)}), 400)
     except (sqlite3.Error, ValueError) as e:
-        db.rollback()
-        logging.error(f"Error during booking: {e}")
-        return jsonify({'error': str(e)}), 400
+        logging.error("Error during booking: %s", e)
+        return None, (jsonify({'error': str(e)}), 400)
+    return reservation, None
+
+def evict_idempotency_keys(cache, shard):
+    """Deletes a shard's expired Idempotency-Keys, at most once per IDEMPOTENCY_EVICT_INTERVAL in each worker."""
+    now = time.time()
+    if not cache.eviction_due(now, current_app.config['IDEMPOTENCY_EVICT_INTERVAL']):
+        return
+    try:
+        evicted = run_write_transaction(get_db(shard),
+                                        lambda cursor: cursor.execute(EVICT_EXPIRED_SQL, (int(now),)).rowcount)
+    except sqlite3.Error as e:
+        # The next interval retries; expired keys are never served meanwhile.
+        logging.error("Evicting expired idempotency keys failed: %s", e)
+        return
+    if evicted:
+        logging.info("Evicted %d expired idempotency keys.", evicted)
+
+def place_booking_once(key, booking, shard):
+    """
+    Runs a booking that carries an Idempotency-Key. Returns (reservation,
+    error_response, replayed). Keys are kept in the class's shard.
+
+    A key that already finished is answered from the LRU or IdempotencyKeys
+    without a write transaction. Concurrent requests with the same key in this
+    worker wait for the first one; across workers, reserve_once() finds the
+    key once it gets the write lock.
+    """
+    cache = get_idempotency_cache(shard.database)
+    booking['request_hash'] = fingerprint = request_hash(booking)
+    while True:
+        try:
+            stored = find_outcome(cache, get_db(shard), key, fingerprint)
+        except IdempotencyConflict as e:
+            return None, (jsonify({'error': str(e)}), 422), False
+        if stored is not None:
+            return stored, None, True
+        event, leader = cache.begin(key)
+        if leader:
+            break
+        # If it failed, it stored nothing and the next pass runs it again.
+        event.wait()
+
+    outcome = None
+    try:
+        # One that finished between the lookup and begin() left its outcome in the cache.
+        try:
+            stored = find_outcome(cache, None, key, fingerprint)
+        except IdempotencyConflict as e:
+            return None, (jsonify({'error': str(e)}), 422), False
+        if stored is not None:
+            return stored, None, True
+        booking['idempotency_key'] = key
+        booking['idempotency_expires_at'] = int(time.time()) + current_app.config['IDEMPOTENCY_TTL_SECONDS']
+        reservation, error_response = place_booking(booking, shard)
+        if reservation is not None:
+            outcome = StoredOutcome(fingerprint, reservation, booking['idempotency_expires_at'])
+    finally:
+        cache.finish(key, event, outcome)
+    evict_idempotency_keys(cache, shard)
+    return reservation, error_response, False
+
+@bp.route('/book', methods=['POST'])
+@admit_writes
+def book_class():
+    key = request.headers.get('Idempotency-Key')
+    booking, error = validate_booking(request.get_json())
+    if key is not None and not error:
+        try:
+            key = parse_key(key)
+        except ValueError as e:
+            error = str(e)
+    if error:
+        return jsonify({'error': error}), 400
+
+    client_email = booking['client_email']
+    class_id = booking['class_id']
+    try:
+        shard = shard_for_id(class_id)
+    except LookupError:
+        return jsonify({'error': 'Class not found.'}), 400
+    if key is None:
+        reservation, error_response = place_booking(booking, shard)
+        replayed = False
+    else:
+        reservation, error_response, replayed = place_booking_once(key, booking, shard)
+    if error_response:
+        return error_response
+
+    status = 201 if reservation.booking_id is not None else 202
+    if replayed:
+        logging.info("Replayed booking for %s for class_id %s (Idempotency-Key %s).", client_email, class_id, key,
+                     extra=SAMPLED)
+        return jsonify(reservation_json(reservation)), status, {'Idempotent-Replayed': 'true'}
+    if reservation.booking_id is None:
+        logging.info("Class %s is full; %s is number %d on the waitlist.", class_id, client_email,
+                     reservation.position, extra=SAMPLED)
+    else:
+        logging.info("Booking successful for %s for class_id %s. ID: %s", client_email, class_id,
+                     reservation.booking_id, extra=SAMPLED)
+    return jsonify(reservation_json(reservation)), status
+
+def run_cancellation(work, what, entity_id, missing):
+    """
+    Runs a cancellation in a write transaction on the shard entity_id belongs
+    to and maps its errors to responses; `missing` is the 404 message.
+    """
+    email = request.args.get('email')
+    if not email:
+        return None, (jsonify({'error': 'Email query parameter is required.'}), 400)
+    try:
+        shard = shard_for_id(entity_id)
+    except LookupError:
+        return None, (jsonify({'error': missing}), 404)
+    try:
+        return run_write_transaction(get_db(shard), lambda cursor: work(cursor, email.lower())), None
+    except LookupError as e:
+        return None, (jsonify({'error': str(e)}), 404)
+    except sqlite3.OperationalError as e:
+        if is_busy_error(e):
+            return None, busy_response(e)
+        logging.error("Error during %s: %s", what, e)
+        return None, (jsonify({'error': str(e)}), 400)
+    except (sqlite3.Error, ValueError) as e:
+        logging.error("Error during %s: %s", what, e)
+        return None, (jsonify({'error': str(e)}), 400)
+
+@bp.route('/bookings/<int:booking_id>', methods=['DELETE'])
+@admit_writes
+def cancel(booking_id):
+    """Cancels a booking; the freed slot goes to the head of the waitlist."""
+    def work(cursor, email):
+        now_utc = datetime.datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')
+        return cancel_booking(cursor, booking_id, email, now_utc)
+
+    promoted, error_response = run_cancellation(work, 'cancellation', booking_id, 'Booking not found.')
+    if error_response:
+        return error_response
+    logging.info("Booking %s cancelled; promoted booking: %s", booking_id, promoted, extra=SAMPLED)
+    return jsonify({'success': True, 'message': 'Booking cancelled.', 'promoted_booking_id': promoted})
+
+@bp.route('/waitlist/<int:waitlist_id>', methods=['DELETE'])
+@admit_writes
+def leave(waitlist_id):
+    """Takes a client off a class's waitlist."""
+    _, error_response = run_cancellation(lambda cursor, email: leave_waitlist(cursor, waitlist_id, email),
+                                         'leaving the waitlist', waitlist_id, 'Waitlist entry not found.')
+    if error_response:
+        return error_response
+    return jsonify({'success': True, 'message': 'Removed from the waitlist.'})
+
+@bp.route('/book/batch', methods=['POST'])
+@admit_writes
+def book_batch():
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Invalid data: expected a non-empty list of bookings.'}), 400
+    max_items = current_app.config['BOOKING_BATCH_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({'error': f'Too many bookings: at most {max_items} per batch.'}), 400
+
+    results = [None] * len(items)
+    by_shard = {}
+    for index, item in enumerate(items):
+        booking, error = validate_booking(item)
+        if not error:
+            try:
+                by_shard.setdefault(shard_for_id(booking['class_id']), []).append((index, booking))
+                continue
+            except LookupError:
+                error = 'Class not found.'
+        results[index] = {'success': False, 'error': error}
+
+    # One transaction per shard, all of them in parallel.
+    shards = list(by_shard)
+    dbs = {shard: get_db(shard) for shard in shards}
+
+    def reserve_all(shard):
+        def work(cursor):
+            now_utc = datetime.datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')
+            return reserve_each(cursor, [booking for _, booking in by_shard[shard]], now_utc)
+        try:
+            return run_write_transaction(dbs[shard], work), None
+        except sqlite3.Error as e:
+            return None, e
+
+    failures = []
+    for shard, (outcomes, failure) in zip(shards, gather(reserve_all, shards) if shards else []):
+        if failure is not None:
+            if len(failures) + 1 == len(shards):
+                # Nothing was booked at all: answer like a single transaction would.
+                if is_busy_error(failure):
+                    return busy_response(failure)
+                logging.error("Error during batch booking: %s", failure)
+                return jsonify({'error': str(failure)}), 400
+            failures.append(failure)
+            logging.error("Batch booking failed in shard %s: %s", shard.number, failure)
+            # The other shards' bookings stand; these ones report the error.
+            error = 'The studio is busy, please try again.' if is_busy_error(failure) else str(failure)
+            outcomes = [(None, error)] * len(by_shard[shard])
+        for (index, _), (reservation, error) in zip(by_shard[shard], outcomes):
+            if error:
+                results[index] = {'success': False, 'error': str(error)}
+            else:
+                results[index] = reservation_json(reservation)
+
+    booked = sum(1 for r in results if r['success'])
+    waitlisted = sum(1 for r in results if r.get('waitlisted'))
+    logging.info("Batch booking: %d of %d bookings confirmed, %d waitlisted.", booked, len(items), waitlisted,
+                 extra=SAMPLED)
+    return jsonify({'booked': booked, 'waitlisted': waitlisted, 'failed': len(items) - booked - waitlisted,
+                    'results': results})
 
 @bp.route('/bookings', methods=['GET'])
 def get_bookings():
@@ -114,33 +481,20 @@ def get_bookings():
         return jsonify({'error': 'Email query parameter is required.'}), 400
 
     try:
-        user_tz_str = request.args.get('timezone', 'UTC')
-        user_tz = pytz.timezone(user_tz_str)
-    except pytz.UnknownTimeZoneError:
-        return jsonify({'error': 'Invalid timezone specified.'}), 400
-
-    db = get_db()
-    cursor = db.cursor()
-    query = """
-        SELECT c.name, c.instructor, c.start_time, b.booking_date
-        FROM Bookings b
-        JOIN Users u ON b.user_id = u.user_id
-        JOIN Classes c ON b.class_id = c.class_id
-        WHERE u.email = ? ORDER BY c.start_time ASC;
-    """
-    cursor.execute(query, (email.lower(),)) # Use normalized email
-    bookings_utc = cursor.fetchall()
+        user_tz, filters, limit, shards = read_listing_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    dbs = {shard: get_read_db(shard) for shard in shards}
+    query = bookings_query(filters, email.lower(), limit) # Use normalized email
+    if stream_format():
+        rows = merge_shards(lambda shard: tuple_cursor(dbs[shard]).execute(*query), shards, BOOKING_SORT_KEY)
+        return streamed_listing(islice(rows, limit) if limit else rows, bookings_to_json, user_tz)
+    rows = merge_shards(lambda shard: tuple_cursor(dbs[shard]).execute(*query).fetchall(), shards, BOOKING_SORT_KEY)
+    bookings_utc, next_cursor = split_page(list(islice(rows, limit + 1)), limit, BOOKING_SORT_KEY)
     
-    if not bookings_utc:
+    if not bookings_utc and filters['cursor'] is None:
         return jsonify({'message': 'No bookings found for this email.'}), 404
 
     # Convert UTC times to user's timezone for display
-    bookings_list = [
-        {
-            "name": row["name"],
-            "instructor": row["instructor"],
-            "start_time": from_utc(row["start_time"], user_tz),
-            "booking_date": from_utc(row["booking_date"], user_tz)
-        } for row in bookings_utc
-    ]
-    return jsonify(bookings_list)
+    return jsonify(bookings_to_json(bookings_utc, user_tz)), 200, page_headers(next_cursor)
@@ -0,0 +1,165 @@
+# ==============================================================================
+#  FILE: app/schedules.py
+#  DESCRIPTION: Weekly class schedules expanded lazily into occurrences.
+# ==============================================================================
+import json
+import heapq
+import datetime
+
+from .utils import get_timezone, to_utc, DB_FORMAT
+from .listings import CLASS_SORT_KEY
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+OPEN_ENDED = '9999-12-31'
+
+# An occurrence that has not been booked yet has no Classes row. It is served
+# under a negative class_id that encodes its schedule and local date (in days
+# since 1970-01-01), so booking it needs nothing but the id.
+DAY_BITS = 20
+DAY_MASK = (1 << DAY_BITS) - 1
+
+SCHEDULE_COLUMNS = "schedule_id, name, instructor, weekday, local_time, timezone, capacity, starts_on, ends_on"
+SCHEDULE_SQL = f"SELECT {SCHEDULE_COLUMNS} FROM ClassSchedules WHERE schedule_id = ?"
+INSERT_SCHEDULE_SQL = f"INSERT INTO ClassSchedules ({SCHEDULE_COLUMNS}) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)"
+# Occurrences of these schedules that already have a Classes row.
+MATERIALIZED_SQL = """
+    SELECT schedule_id, start_time FROM Classes
+    WHERE schedule_id IN (SELECT value FROM json_each(?)) AND start_time >= ? AND start_time < ?
+"""
+MATERIALIZE_SQL = """
+    INSERT INTO Classes (name, start_time, instructor, capacity, available_slots, schedule_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+FIND_OCCURRENCE_SQL = "SELECT class_id FROM Classes WHERE schedule_id = ? AND start_time = ?"
+
+def schedules_query(filters, after_day):
+    """Builds the query for schedules that match the listing filters and haven't ended by after_day."""
+    clauses, params = ["ends_on >= ?"], [after_day]
+    if filters['instructor'] is not None:
+        clauses.append("instructor = ?")
+        params.append(filters['instructor'])
+    if filters['name'] is not None:
+        clauses.append("name = ?")
+        params.append(filters['name'])
+    return f"SELECT {SCHEDULE_COLUMNS} FROM ClassSchedules WHERE {' AND '.join(clauses)}", params
+
+def occurrence_id(schedule_id, day_number):
+    """The class_id of a not yet materialized occurrence."""
+    return -(schedule_id << DAY_BITS | day_number)
+
+def split_occurrence_id(class_id):
+    """Returns (schedule_id, day_number) for a class_id from occurrence_id()."""
+    return -class_id >> DAY_BITS, -class_id & DAY_MASK
+
+def _date(day_number):
+    return datetime.date.fromordinal(day_number + 719163)
+
+def _day_number(date):
+    return date.toordinal() - 719163
+
+def occurs_on(schedule, day_number):
+    """True if the schedule has an occurrence on this local day."""
+    date = _date(day_number)
+    return (date.weekday() == schedule['weekday']
+            and schedule['starts_on'] <= date.isoformat() <= schedule['ends_on'])
+
+def occurrence_start(schedule, day_number):
+    """
+    The UTC start time of the occurrence on a local day. The wall-clock time
+    stays fixed in the schedule's timezone, so the UTC time moves with DST.
+    """
+    local = datetime.datetime.combine(_date(day_number), datetime.time.fromisoformat(schedule['local_time']))
+    return to_utc(local, get_timezone(schedule['timezone']))
+
+def occurrence_row(schedule, day_number, start_time):
+    """An occurrence shaped like a Classes listing row (a CLASS_COLUMNS tuple)."""
+    return (occurrence_id(schedule['schedule_id'], day_number), schedule['name'], start_time,
+            schedule['instructor'], schedule['capacity'])
+
+def occurrences(schedule, lower, upper):
+    """
+    Yields the schedule's occurrences with a (start_time, class_id) key above
+    `lower` and a start_time before `upper`, in order, one week at a time.
+    """
+    # The local date can be a day either side of the UTC one.
+    first = max(datetime.date.fromisoformat(schedule['starts_on']),
+                datetime.date.fromisoformat(lower[0][:10]) - datetime.timedelta(days=1))
+    day_number = _day_number(first) + (schedule['weekday'] - first.weekday()) % 7
+    last = _day_number(datetime.date.fromisoformat(schedule['ends_on']))
+    while day_number <= last:
+        start_time = occurrence_start(schedule, day_number)
+        if start_time >= upper:
+            return
+        row = occurrence_row(schedule, day_number, start_time)
+        if (start_time, row[0]) > lower:
+            yield row
+        day_number += 7
+
+def virtual_classes(db, filters, lower, upper):
+    """
+    Returns an iterator over the not yet booked occurrences of the matching
+    schedules in [lower, upper), in (start_time, class_id) order.
+
+    Only the schedules and the occurrences already materialized in the window
+    are read up front; occurrences themselves are generated as they are consumed.
+    """
+    schedules = db.execute(*schedules_query(filters, lower[0][:10])).fetchall()
+    if not schedules:
+        return iter(())
+    ids = json.dumps([schedule['schedule_id'] for schedule in schedules])
+    booked = set(map(tuple, db.execute(MATERIALIZED_SQL, (ids, lower[0], upper)).fetchall()))
+    unbooked = ((row for row in occurrences(schedule, lower, upper)
+                 if (schedule['schedule_id'], row[2]) not in booked) for schedule in schedules)
+    return heapq.merge(*unbooked, key=CLASS_SORT_KEY)
+
+def horizon(now, days):
+    """The exclusive end of the expansion window: UTC midnight `days` after today."""
+    return (now.date() + datetime.timedelta(days=days)).strftime(DB_FORMAT)
+
+def materialize(cursor, class_id, now_utc):
+    """
+    Returns the real class_id behind an occurrence id, inserting its Classes
+    row on first use. Raises ValueError like reserve_slot() for bad occurrences.
+    """
+    schedule_id, day_number = split_occurrence_id(class_id)
+    cursor.execute(SCHEDULE_SQL, (schedule_id,))
+    schedule = cursor.fetchone()
+    if schedule is None or not occurs_on(schedule, day_number):
+        raise ValueError("Class not found.")
+    start_time = occurrence_start(schedule, day_number)
+    if start_time <= now_utc:
+        raise ValueError("Cannot book a class that has already started.")
+    cursor.execute(MATERIALIZE_SQL, (schedule['name'], start_time, schedule['instructor'],
+                                     schedule['capacity'], schedule['capacity'], schedule_id))
+    cursor.execute(FIND_OCCURRENCE_SQL, (schedule_id, start_time))
+    row = cursor.fetchone()
+    if row is None:
+        # A one-off class with the same name, instructor and time already exists.
+        raise ValueError("Class not found.")
+    return row[0]
+
+def validate_schedule(name, instructor, weekday, local_time, zone, capacity, starts_on, ends_on=None):
+    """Checks a new schedule and returns the parameters for INSERT_SCHEDULE_SQL; raises ValueError."""
+    if not name or not instructor:
+        raise ValueError('Missing data: name and instructor are required.')
+    if weekday not in WEEKDAYS:
+        raise ValueError(f'Invalid weekday: expected one of {", ".join(WEEKDAYS)}.')
+    try:
+        local_time = datetime.time.fromisoformat(local_time).strftime('%H:%M:%S')
+    except ValueError:
+        raise ValueError('Invalid time: expected HH:MM.')
+    try:
+        get_timezone(zone)
+    except KeyError:  # pytz.UnknownTimeZoneError
+        raise ValueError('Invalid timezone specified.')
+    if capacity < 1:
+        raise ValueError('Invalid capacity: must be a positive integer.')
+    try:
+        starts_on = datetime.date.fromisoformat(starts_on).isoformat()
+        ends_on = datetime.date.fromisoformat(ends_on).isoformat() if ends_on else OPEN_ENDED
+    except ValueError:
+        raise ValueError('Invalid date: expected YYYY-MM-DD.')
+    if ends_on < starts_on:
+        raise ValueError('Invalid dates: the schedule ends before it starts.')
+    return name, instructor, WEEKDAYS.index(weekday), local_time, zone, capacity, starts_on, ends_on
@@ -0,0 +1,125 @@
+# ==============================================================================
+#  FILE: app/shards.py
+#  DESCRIPTION: Per-studio database shards and scatter-gather over them.
+# ==============================================================================
+import os
+import atexit
+import threading
+from collections import namedtuple
+from flask import current_app
+
+from .schedules import split_occurrence_id
+
+# A studio and the SQLite file that holds its classes, bookings and waitlists.
+# Without SHARDS there is one shard, numbered 0, whose studio is None.
+Shard = namedtuple('Shard', 'studio number database')
+
+# Every shard hands out class, booking, waitlist and schedule ids from its own
+# range starting at number << ID_BITS, so an id alone says where it lives.
+ID_BITS = 32
+MAX_SHARD_NUMBER = 2 ** 11 - 1  # Occurrence ids put 20 more bits above schedule ids.
+SHARDED_TABLES = ('Classes', 'Bookings', 'Waitlist', 'ClassSchedules')
+ID_COLUMNS = {'Classes': 'class_id', 'Bookings': 'booking_id', 'Waitlist': 'waitlist_id',
+              'ClassSchedules': 'schedule_id'}
+
+SEED_SEQUENCE_SQL = """
+    INSERT INTO sqlite_sequence (name, seq) SELECT ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+"""
+RAISE_SEQUENCE_SQL = "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?"
+
+def shard_map(config):
+    """Returns the shards in the config by studio, ordered by shard number; raises ValueError if invalid."""
+    if not config['SHARDS']:
+        return {None: Shard(None, 0, config['DATABASE'])}
+    shards = {}
+    numbers = set()
+    for studio, (number, database) in sorted(config['SHARDS'].items(), key=lambda item: item[1][0]):
+        if not 0 <= number <= MAX_SHARD_NUMBER or number in numbers:
+            raise ValueError(f'Invalid shard number {number} for studio {studio!r}: '
+                             f'numbers must be unique and between 0 and {MAX_SHARD_NUMBER}.')
+        numbers.add(number)
+        shards[studio] = Shard(studio, number, database)
+    return shards
+
+def get_shards():
+    """The shards of the current app, in shard number order."""
+    return list(shard_map(current_app.config).values())
+
+def shard_for_studio(studio):
+    """Returns the studio's shard, or the only shard if studio is None; raises LookupError."""
+    shards = shard_map(current_app.config)
+    if studio is None and len(shards) == 1:
+        return next(iter(shards.values()))
+    if None in shards:
+        raise LookupError('Unknown studio: this deployment has no studios.')
+    if studio not in shards:
+        raise LookupError(f"Unknown studio: expected one of {', '.join(shards)}.")
+    return shards[studio]
+
+def shard_number(entity_id):
+    """The shard number encoded in a class, booking, waitlist or occurrence id."""
+    if entity_id < 0:
+        entity_id = split_occurrence_id(entity_id)[0]
+    return entity_id >> ID_BITS
+
+def shard_for_id(entity_id):
+    """Returns the shard an id was handed out by; raises LookupError if there is none."""
+    number = shard_number(entity_id)
+    for shard in shard_map(current_app.config).values():
+        if shard.number == number:
+            return shard
+    raise LookupError(f'No shard numbered {number}.')
+
+def prepare_shard(db, number):
+    """
+    Starts the shard's id sequences at number << ID_BITS (after migrate()).
+    Raises ValueError if the database already holds ids of another shard.
+    """
+    base = number << ID_BITS
+    for table in SHARDED_TABLES:
+        column = ID_COLUMNS[table]
+        low, high = db.execute(f'SELECT min({column}), max({column}) FROM {table}').fetchone()
+        if low is not None and (low < base or high >> ID_BITS != number):
+            raise ValueError(f'{table} already holds ids outside shard {number}; '
+                             f'a database cannot change shards once it has data.')
+        db.execute(SEED_SEQUENCE_SQL, (table, base, table))
+        db.execute(RAISE_SEQUENCE_SQL, (base, table))
+    db.commit()
+
+def tag_rows(rows, shard):
+    """Appends the shard's studio to each listing row, when the deployment has studios."""
+    if shard.studio is None:
+        return rows
+    studio = (shard.studio,)
+    return (row + studio for row in rows)
+
+_executor_lock = threading.Lock()
+
+def gather(fetch, shards):
+    """
+    Returns [fetch(shard) for shard in shards], running them in parallel on
+    this process's scatter pool when there are several. SQLite releases the
+    GIL while it steps, so the shards' queries really overlap.
+
+    fetch runs in an app context but not in the request's: open connections
+    with get_db()/get_read_db() before calling this and hand them over.
+    """
+    if len(shards) == 1:
+        return [fetch(shards[0])]
+    app = current_app._get_current_object()
+
+    def run(shard):
+        with app.app_context():
+            return fetch(shard)
+
+    with _executor_lock:
+        executor = current_app.extensions.get('shard_executor')
+        # Threads don't survive fork(); each worker starts its own pool.
+        if executor is None or executor.pid != os.getpid():
+            from concurrent.futures import ThreadPoolExecutor  # Unsharded deployments never need it.
+            executor = ThreadPoolExecutor(current_app.config['SHARD_GATHER_THREADS'], thread_name_prefix='shard-gather')
+            executor.pid = os.getpid()
+            current_app.extensions['shard_executor'] = executor
+            atexit.register(executor.shutdown, wait=False)
+    return list(executor.map(run, shards))
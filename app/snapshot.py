@@ -0,0 +1,127 @@
+# ==============================================================================
+#  FILE: app/snapshot.py
+#  DESCRIPTION: In-memory read snapshot of the database, refreshed by backup.
+# ==============================================================================
+import os
+import time
+import sqlite3
+import logging
+import threading
+import itertools
+
+from .metrics import REGISTRY
+
+class _Generation:
+    """One copy of the database, shared by its reader connections through a shared-cache URI."""
+
+    def __init__(self, uri, keeper):
+        self.uri = uri
+        self.keeper = keeper  # Keeps the in-memory database alive while it is current.
+        self.idle = []
+
+class ReadSnapshot:
+    """
+    An in-memory copy of the database that read routes query instead of the file.
+
+    A thread copies the database with the sqlite3 backup API into a new
+    shared-cache in-memory database every `interval` seconds and swaps it in,
+    so readers never wait on a copy in progress. A retired copy is freed once
+    its last reader connection is released. If nothing committed since the last
+    copy (PRAGMA data_version), the copy is kept and only marked fresh.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, source_pool, interval=1.0, pool_size=8, factory=sqlite3.Connection):
+        self.source_pool = source_pool
+        self.interval = interval
+        self.pool_size = pool_size
+        self.factory = factory
+        self.pid = os.getpid()
+        self.refreshed_at = None
+        self._name = f'read-snapshot-{self.pid}-{next(self._ids)}'
+        self._copies = itertools.count(1)
+        self._current = None
+        self._seen_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # data_version is only comparable on one connection, so keep ours.
+        self._source = source_pool.acquire()
+        try:
+            self.refresh()
+        except Exception:
+            source_pool.release(self._source)
+            raise
+        self._thread = threading.Thread(target=self._run, name='read-snapshot', daemon=True)
+        self._thread.start()
+
+    def age(self):
+        """Seconds since the copy was last known to match the database."""
+        return time.monotonic() - self.refreshed_at
+
+    def refresh(self):
+        """Copies the database if it changed since the last copy."""
+        checked_at = time.monotonic()
+        version = self._source.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._seen_version:
+            started = time.perf_counter()
+            uri = f'file:{self._name}-{next(self._copies)}?mode=memory&cache=shared'
+            keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                self._source.backup(keeper)
+            except Exception:
+                keeper.close()
+                raise
+            with self._lock:
+                retired, self._current = self._current, _Generation(uri, keeper)
+            if retired is not None:
+                self._retire(retired)
+            self._seen_version = version
+            REGISTRY.observe('read_snapshot_copy_seconds', (), time.perf_counter() - started)
+        self.refreshed_at = checked_at
+
+    def _retire(self, generation):
+        # Connections still in use close on release; the memory goes with the last one.
+        with self._lock:
+            idle, generation.idle = generation.idle, []
+        for conn in idle:
+            conn.close()
+        generation.keeper.close()
+
+    def acquire(self):
+        """Borrows a reader connection to the current copy; returns (connection, lease) for release()."""
+        with self._lock:
+            generation = self._current
+            if generation.idle:
+                return generation.idle.pop(), generation
+            # Connect under the lock: once a copy is retired and its last
+            # connection closed, the same URI would open an empty database.
+            conn = sqlite3.connect(generation.uri, uri=True, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA query_only = 1')
+        return conn, generation
+
+    def release(self, conn, generation):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if generation is self._current and len(generation.idle) < self.pool_size:
+                generation.idle.append(conn)
+                return
+        conn.close()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    # Keep the old copy; readers fall back once it is too stale.
+                    logging.error("Read snapshot refresh failed: %s", e)
+        finally:
+            self.source_pool.release(self._source)
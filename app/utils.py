@@ -2,22 +2,124 @@
 #  FILE: app/utils.py
 #  DESCRIPTION: Utility and helper functions.
 # ==============================================================================
+import bisect
 import datetime
-import pytz
+from functools import lru_cache
+
+# pytz and its zone files are loaded on the first get_timezone() call, not at
+# import: worker start-up and CLI commands that never convert times skip them.
 
 # It's best practice to store all datetime information in UTC in the database.
-UTC = pytz.utc
+UTC = datetime.timezone.utc
 # Set a default timezone for creating classes if not specified.
-DEFAULT_TZ = pytz.timezone('Asia/Kolkata') # IST
+DEFAULT_TZ_NAME = 'Asia/Kolkata' # IST
+
+DB_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+@lru_cache(maxsize=1024)
+def get_timezone(name):
+    """
+    Resolves a timezone name once; raises pytz.UnknownTimeZoneError if unknown.
+    That is a KeyError, which callers catch so they need not import pytz.
+    """
+    import pytz
+    return pytz.timezone(name)
+
+def __getattr__(name):
+    # DEFAULT_TZ is resolved on first use, like every other zone.
+    if name == 'DEFAULT_TZ':
+        return get_timezone(DEFAULT_TZ_NAME)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def to_utc(dt, tz):
     """Converts a naive datetime object to a UTC string for DB storage."""
-    return tz.localize(dt).astimezone(UTC).strftime('%Y-%m-%d %H:%M:%S')
+    offset = _steady_offset(tz, dt.toordinal() - 719163)
+    if offset is None:
+        return tz.localize(dt).astimezone(UTC).strftime(DB_FORMAT)
+    return (dt - datetime.timedelta(seconds=offset)).strftime(DB_FORMAT)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+@lru_cache(maxsize=256)
+def _offset_table(tz):
+    """
+    Returns (utc_transition_seconds, [(utc_offset_seconds, ' %Z%z' suffix)]) for a zone.
+
+    This is the same table pytz's DstTzInfo.fromutc() bisects, kept as plain
+    integers with the display suffix of every period formatted once up front.
+    """
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if transitions is None:
+        # Fixed-offset zones such as UTC have a single period.
+        local = datetime.datetime(2000, 1, 1, tzinfo=UTC).astimezone(tz)
+        return [float('-inf')], [(int(local.utcoffset().total_seconds()), local.strftime(' %Z%z'))]
+    seconds = [(t - EPOCH) // datetime.timedelta(seconds=1) for t in transitions]
+    periods = [
+        (int(info[0].total_seconds()), datetime.datetime(2000, 1, 1, tzinfo=tz._tzinfos[info]).strftime(' %Z%z'))
+        for info in tz._transition_info
+    ]
+    return seconds, periods
+
+@lru_cache(maxsize=4096)
+def _steady_offset(tz, day_number):
+    """
+    The zone's UTC offset in seconds on a local day, or None if it changes
+    anywhere near that day and tz.localize() has to decide.
+    """
+    transitions, periods = _offset_table(tz)
+    # A local day lies within a day of the same UTC day, whatever the offset.
+    first = bisect.bisect_right(transitions, (day_number - 2) * 86400)
+    if first != bisect.bisect_right(transitions, (day_number + 3) * 86400):
+        return None
+    return periods[max(0, first - 1)][0]
+
+@lru_cache(maxsize=4096)
+def _day_number(date_str):
+    """Days since 1970-01-01 for a 'YYYY-MM-DD' string."""
+    return datetime.date(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10])).toordinal() - 719163
+
+@lru_cache(maxsize=4096)
+def _day_string(day_number):
+    """'YYYY-MM-DD' for a number of days since 1970-01-01."""
+    day = datetime.date.fromordinal(day_number + 719163)
+    return f'{day.year:04d}-{day.month:02d}-{day.day:02d}'
+
+def _epoch_seconds(utc_str):
+    """Parses 'YYYY-MM-DD HH:MM:SS' by slicing; falls back to strptime for anything else."""
+    if len(utc_str) == 19 and utc_str[4] == '-' and utc_str[7] == '-' and utc_str[10] == ' ':
+        try:
+            return (_day_number(utc_str[:10]) * 86400 + int(utc_str[11:13]) * 3600
+                    + int(utc_str[14:16]) * 60 + int(utc_str[17:19]))
+        except ValueError:
+            pass
+    return (datetime.datetime.strptime(utc_str, DB_FORMAT) - EPOCH) // datetime.timedelta(seconds=1)
+
+def _format_local(utc_str, transitions, periods):
+    seconds = _epoch_seconds(utc_str)
+    offset, suffix = periods[max(0, bisect.bisect_right(transitions, seconds) - 1)]
+    day, rest = divmod(seconds + offset, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f'{_day_string(day)} {hours:02d}:{minutes:02d}:{secs:02d}{suffix}'
 
 def from_utc(utc_str, tz):
     """Converts a UTC string from the DB to a localized datetime string."""
     if not utc_str:
         return None
-    # Assuming the string from DB is naive UTC, make it aware.
-    dt_utc = UTC.localize(datetime.datetime.strptime(utc_str, '%Y-%m-%d %H:%M:%S'))
-    return dt_utc.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S %Z%z')
+    transitions, periods = _offset_table(tz)
+    return _format_local(utc_str, transitions, periods)
+
+def from_utc_many(utc_strs, tz):
+    """Converts a whole column of UTC strings at once, same output as from_utc()."""
+    transitions, periods = _offset_table(tz)
+    seen = {}
+    converted = []
+    for utc_str in utc_strs:
+        if not utc_str:
+            converted.append(None)
+            continue
+        local = seen.get(utc_str)
+        if local is None:
+            local = seen[utc_str] = _format_local(utc_str, transitions, periods)
+        converted.append(local)
+    return converted
@@ -0,0 +1,83 @@
+# ==============================================================================
+#  FILE: benchmarks/bench_group_commit.py
+#  DESCRIPTION: Per-request commits vs. the group-commit writer for /api/book.
+#  USAGE: python -m benchmarks.bench_group_commit [--threads 32] [--bookings 2000]
+#         [--synchronous FULL]
+# ==============================================================================
+import os
+import json
+import logging
+import time
+import sqlite3
+import argparse
+import datetime
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+from app.database import create_schema
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+def prepare_database(path, bookings):
+    db = sqlite3.connect(path)
+    create_schema(db)
+    start_time = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+    db.execute("INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) VALUES (?, ?, ?, ?, ?)",
+               ('Bench Class', start_time, 'Coach', bookings, bookings))
+    db.commit()
+    db.close()
+
+def run(group_commit, args):
+    workdir = tempfile.mkdtemp(prefix='bench-group-commit-')
+    path = os.path.join(workdir, 'bench.db')
+    prepare_database(path, args.bookings)
+
+    app = create_app('config.Config')
+    app.config.update(DATABASE=path, BOOKING_GROUP_COMMIT=group_commit, DB_SYNCHRONOUS=args.synchronous,
+                      GROUP_COMMIT_MAX_BATCH=args.max_batch, GROUP_COMMIT_MAX_WAIT_MS=args.max_wait_ms,
+                      WRITE_CONCURRENCY_LIMIT=args.threads, RATE_LIMIT_ENABLED=False)
+    client = app.test_client()
+
+    def book(i):
+        started = time.perf_counter()
+        response = client.post('/api/book', data=json.dumps({
+            "class_id": 1, "client_name": f"Client {i}", "client_email": f"client{i}@example.com"
+        }), content_type='application/json')
+        assert response.status_code == 201, response.get_json()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        latencies = sorted(pool.map(book, range(args.bookings)))
+    elapsed = time.perf_counter() - started
+
+    writer = app.extensions.get('booking_writers', {}).get(path)
+    if writer:
+        writer.stop()
+    return {
+        'bookings_per_s': args.bookings / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'avg_batch': writer.intents / writer.batches if writer else 1.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--bookings', type=int, default=2000)
+    parser.add_argument('--synchronous', default='NORMAL', help='PRAGMA synchronous for the run, e.g. FULL')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Keep per-booking log lines out of the measurement.
+
+    print(f'{args.bookings} bookings from {args.threads} threads, synchronous={args.synchronous}')
+    for label, group_commit in (('per-request commit', False), ('group commit', True)):
+        r = run(group_commit, args)
+        print(f'  {label:<20} {r["bookings_per_s"]:8.0f} bookings/s  p50 {r["p50_ms"]:6.2f} ms  '
+              f'p99 {r["p99_ms"]:7.2f} ms  avg batch {r["avg_batch"]:.1f}')
+
+if __name__ == '__main__':
+    main()
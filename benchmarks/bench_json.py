@@ -0,0 +1,74 @@
+# ==============================================================================
+#  FILE: benchmarks/bench_json.py
+#  DESCRIPTION: Serialization throughput of a large GET /api/classes response.
+#  USAGE: python -m benchmarks.bench_json [rows]
+# ==============================================================================
+import sys
+import sqlite3
+import timeit
+
+from app import create_app
+from app.database import create_schema, get_db
+from app.json_provider import make_json_provider, orjson
+from app.utils import from_utc_many, get_timezone
+
+def classes_to_json_reference(rows, tz):
+    """The original mapping: sqlite3.Row values looked up by column name."""
+    start_times = from_utc_many([row["start_time"] for row in rows], tz)
+    return [
+        {
+            "class_id": row["class_id"],
+            "name": row["name"],
+            "start_time": start_time,
+            "instructor": row["instructor"],
+            "available_slots": row["available_slots"]
+        } for row, start_time in zip(rows, start_times)
+    ]
+
+def make_app(rows, backend):
+    app = create_app('config.TestingConfig')
+    app.config.update(JSON_BACKEND=backend, PAGE_SIZE_MAX=rows, RESPONSE_CACHE_ENABLED=False, METRICS_ENABLED=False)
+    app.json = make_json_provider(app)
+    return app
+
+def seed(rows):
+    db = get_db()
+    create_schema(db)
+    db.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO Classes (name, start_time, instructor, capacity, available_slots)
+        SELECT 'Class ' || (i % 40), datetime('2030-01-01', '+' || (i / 10) || ' hours'), 'Coach ' || (i % 50), 20, i % 21
+        FROM n
+    ''', (rows,))
+    db.commit()
+
+def main(rows=10000, repeat=7):
+    backends = ['stdlib'] + (['orjson'] if orjson is not None else [])
+    tz = get_timezone('America/New_York')
+    query = 'timezone=America/New_York'
+    urls = {'page': f'/api/classes?limit={rows}&{query}', 'stream': f'/api/classes?stream=1&{query}'}
+    print(f'{rows}-row GET /api/classes response, best of {repeat}')
+    baseline = None
+    for backend in backends:
+        app = make_app(rows, backend)
+        with app.app_context():
+            seed(rows)
+            db = get_db()
+            client = app.test_client()
+            size = len(client.get(urls['page']).get_data())
+            cases = {}
+            if backend == 'stdlib':
+                def reference():
+                    db.row_factory = sqlite3.Row
+                    listing = db.execute(f'SELECT * FROM Classes ORDER BY start_time LIMIT {rows}').fetchall()
+                    return app.json.response(classes_to_json_reference(listing, tz)).get_data()
+                cases['old mapping, no HTTP: sqlite3.Row + stdlib'] = reference
+            for kind, url in urls.items():
+                cases[f'{kind}: tuple rows + {backend}'] = lambda url=url: client.get(url).get_data()
+            for name, fn in cases.items():
+                best = min(timeit.repeat(fn, number=1, repeat=repeat))
+                baseline = baseline or best
+                print(f'  {name:<44} {best * 1000:8.2f} ms  {size / best / 2 ** 20:8.1f} MiB/s  {baseline / best:5.1f}x')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,131 @@
+# ==============================================================================
+#  FILE: benchmarks/bench_logging.py
+#  DESCRIPTION: What logging costs a request thread: writing in place vs. the queue.
+#  USAGE: python -m benchmarks.bench_logging [--calls 5000] [--bookings 1000]
+#         [--sink-delay-us 100]
+# ==============================================================================
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import argparse
+import datetime
+import tempfile
+from logging.handlers import QueueListener
+
+from app import create_app
+from app.logs import (DeferredQueueHandler, JsonFormatter, RequestContextFilter, SuccessSampler, TEXT_FORMAT,
+                      SAMPLED)
+from app.database import create_schema
+
+# name -> (queued, JSON, success sample rate, level)
+SETUPS = {
+    'stream handler, text (before)': (False, False, 1.0, logging.INFO),
+    'queue, JSON': (True, True, 1.0, logging.INFO),
+    'queue, JSON, 10% sampled': (True, True, 0.1, logging.INFO),
+    'level WARNING': (True, True, 1.0, logging.WARNING),
+}
+
+class SlowFileHandler(logging.FileHandler):
+    """A file that takes `delay` seconds per write, like stderr piped to a collector that has fallen behind."""
+
+    def __init__(self, path, delay):
+        super().__init__(path)
+        self.delay = delay
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        super().emit(record)
+
+def install(setup, path, queue_size, delay):
+    """Replaces the root logger's handlers with `setup`, writing to `path`. Returns a stop function."""
+    queued, as_json, rate, level = setup
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    stream = SlowFileHandler(path, delay) if delay else logging.FileHandler(path)
+    stream.setFormatter(JsonFormatter() if as_json else logging.Formatter(TEXT_FORMAT))
+    root.setLevel(level)
+    if not queued:
+        root.addHandler(stream)
+        return stream.close
+    handler = DeferredQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(SuccessSampler(rate))
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    listener = QueueListener(handler.queue, stream)
+    listener.start()
+
+    def stop():
+        listener.stop()
+        stream.close()
+    return stop
+
+def per_call(app, setup, calls, path, delay):
+    """Microseconds per success message in the calling thread, inside a request."""
+    stop = install(setup, path, calls + 1, delay)
+    email, class_id, booking_id = 'client@example.com', 1, 42
+    with app.test_request_context('/api/book', method='POST'):
+        app.preprocess_request()  # Sets the request id the records are stamped with.
+        started = time.perf_counter()
+        if setup[0]:
+            for _ in range(calls):
+                logging.info("Booking successful for %s for class_id %s. ID: %s", email, class_id, booking_id,
+                             extra=SAMPLED)
+        else:
+            for _ in range(calls):
+                logging.info(f"Booking successful for {email} for class_id {class_id}. ID: {booking_id}")
+        elapsed = time.perf_counter() - started
+    stop()
+    return elapsed / calls * 1e6
+
+def per_booking(setup, bookings, workdir, delay):
+    """Microseconds per /api/book request, end to end in the test client."""
+    path = os.path.join(workdir, 'bench.db')
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    create_schema(db)
+    start_time = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+    db.execute("INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) VALUES (?, ?, ?, ?, ?)",
+               ('Bench Class', start_time, 'Coach', bookings, bookings))
+    db.commit()
+    db.close()
+
+    app = create_app('config.Config')
+    app.config.update(DATABASE=path, RATE_LIMIT_ENABLED=False)
+    client = app.test_client()
+    stop = install(setup, os.path.join(workdir, 'bench.log'), bookings * 4, delay)
+    started = time.perf_counter()
+    for i in range(bookings):
+        response = client.post('/api/book', data=json.dumps({
+            "class_id": 1, "client_name": f"Client {i}", "client_email": f"client{i}@example.com"
+        }), content_type='application/json')
+        assert response.status_code == 201, response.get_json()
+    elapsed = time.perf_counter() - started
+    stop()
+    return elapsed / bookings * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sink-delay-us', type=float, default=100, help='time per write of the slow sink')
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix='bench-logging-')
+    app = create_app('config.Config')
+
+    for sink, delay in (('buffered file', 0), (f'{args.sink_delay_us:g} us per write', args.sink_delay_us / 1e6)):
+        print(f'Sink: {sink}, best of {args.repeat}')
+        print(f'  {"":<30} {"per message":>12} {"per /api/book":>14}')
+        for name, setup in SETUPS.items():
+            call = min(per_call(app, setup, args.calls, os.path.join(workdir, 'calls.log'), delay)
+                       for _ in range(args.repeat))
+            booking = min(per_booking(setup, args.bookings, workdir, delay) for _ in range(args.repeat))
+            print(f'  {name:<30} {call:9.2f} us {booking:11.1f} us')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# ==============================================================================
+#  FILE: benchmarks/bench_startup.py
+#  DESCRIPTION: Cold start of a worker and per-test database setup.
+#  USAGE: python -m benchmarks.bench_startup [runs]
+# ==============================================================================
+import os
+import sys
+import json
+import sqlite3
+import timeit
+import statistics
+import subprocess
+
+from app.database import create_schema, seed_data, clone_template
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter, like a new worker. `preload` imports what the
+# app used to load eagerly, for comparison.
+COLD_START = """
+import sys, time, json
+started = time.perf_counter()
+{preload}
+from app import create_app
+imported = time.perf_counter()
+create_app('config.Config')
+created = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'create_app': created - imported}}))
+"""
+
+def cold_start(preload='', runs=10):
+    """Median seconds to import the app and to create it, each in a new process."""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', COLD_START.format(preload=preload)], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out))
+    return {key: statistics.median(s[key] for s in samples) for key in ('import', 'create_app')}
+
+def main(runs=10):
+    print(f'Cold start, median of {runs} processes')
+    cases = {
+        'current': '',
+        'pytz loaded eagerly (before)': "import pytz; pytz.timezone('Asia/Kolkata')",
+    }
+    for name, preload in cases.items():
+        times = cold_start(preload, runs)
+        print(f"  {name:<30} import {times['import'] * 1000:7.1f} ms  "
+              f"create_app {times['create_app'] * 1000:6.1f} ms")
+
+    db = sqlite3.connect(':memory:')
+
+    def rebuild():
+        create_schema(db)
+        seed_data(db)
+
+    clone_template(db)  # Builds the template once.
+    print('Per-test database setup, best of 5 x 50')
+    for name, fn in (('create_schema + seed_data', rebuild), ('clone_template', lambda: clone_template(db))):
+        best = min(timeit.repeat(fn, number=50, repeat=5)) / 50
+        print(f'  {name:<30} {best * 1000:8.3f} ms')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
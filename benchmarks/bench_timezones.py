@@ -0,0 +1,50 @@
+# ==============================================================================
+#  FILE: benchmarks/bench_timezones.py
+#  DESCRIPTION: Micro-benchmark of UTC-to-local conversion for listings.
+#  USAGE: python -m benchmarks.bench_timezones [rows]
+# ==============================================================================
+import sys
+import random
+import datetime
+import timeit
+import pytz
+
+from app.utils import from_utc, from_utc_many, get_timezone
+
+def from_utc_reference(utc_str, tz):
+    """The original from_utc: strptime, localize, astimezone and strftime per value."""
+    if not utc_str:
+        return None
+    dt_utc = pytz.utc.localize(datetime.datetime.strptime(utc_str, '%Y-%m-%d %H:%M:%S'))
+    return dt_utc.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S %Z%z')
+
+def sample_column(rows):
+    """Class start times spread over a year, as a schedule listing would return them."""
+    start = datetime.datetime(2025, 1, 1)
+    return [(start + datetime.timedelta(minutes=30 * random.randint(0, 17520))).strftime('%Y-%m-%d %H:%M:%S')
+            for _ in range(rows)]
+
+def main(rows=10000, repeat=5):
+    random.seed(42)
+    column = sample_column(rows)
+    zone = 'America/New_York'
+    tz = get_timezone(zone)
+    assert [from_utc_reference(v, tz) for v in column] == from_utc_many(column, tz)
+
+    cases = {
+        'reference (pytz.timezone + strptime per row)':
+            lambda: [from_utc_reference(v, pytz.timezone(zone)) for v in column],
+        'from_utc per row':
+            lambda: [from_utc(v, get_timezone(zone)) for v in column],
+        'from_utc_many per column':
+            lambda: from_utc_many(column, get_timezone(zone)),
+    }
+    baseline = None
+    print(f'{rows} timestamps, best of {repeat}')
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        baseline = baseline or best
+        print(f'  {name:<46} {best * 1000:8.2f} ms  {rows / best:>12,.0f} rows/s  {baseline / best:5.1f}x')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,104 @@
+# ==============================================================================
+#  FILE: benchmarks/datagen.py
+#  DESCRIPTION: Synthetic data generator for load tests, far beyond seed_data.
+#  USAGE: python -m benchmarks.datagen bench.db --classes 10000 --users 100000
+#         --bookings 1000000
+# ==============================================================================
+import time
+import random
+import sqlite3
+import argparse
+import datetime
+
+from app.database import create_schema
+
+NAMES = ['Yoga Flow', 'HIIT Blast', 'Spin Cycle', 'CrossFit', 'Meditation', 'Power Lifting',
+         'Pilates', 'Boxing', 'Barre', 'Zumba', 'Rowing', 'Mobility']
+INSTRUCTORS = ['Chloe', 'Mike', 'David', 'Sarah', 'Anya', 'Isabella', 'Omar', 'Priya', 'Lena', 'Tom']
+CHUNK = 50_000
+
+def user_email(i):
+    return f'user{i}@bench.example'
+
+def chunked(rows, size=CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def generate(path, classes=10_000, users=100_000, bookings=1_000_000, days=365, seed=42):
+    """
+    Builds a benchmark database at `path` and returns row counts.
+
+    Classes start from tomorrow and spread over `days`; every class gets
+    enough capacity for its bookings, and (user, class) pairs are unique.
+    """
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    create_schema(db)
+    # Bulk loading only: the file is thrown away if generation fails.
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = OFF')
+
+    per_class = -(-bookings // classes) if classes else 0
+    start = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)).replace(
+        hour=6, minute=0, second=0, microsecond=0, tzinfo=None)
+    step = datetime.timedelta(minutes=max(1, days * 24 * 60 // max(classes, 1)))
+
+    def class_rows():
+        for i in range(classes):
+            capacity = per_class + rng.randint(0, 20)
+            yield (rng.choice(NAMES), (start + step * i).strftime('%Y-%m-%d %H:%M:%S'),
+                   rng.choice(INSTRUCTORS), capacity, capacity)
+
+    def user_rows():
+        for i in range(users):
+            yield (f'Bench User {i}', user_email(i), 'dummy_hash')
+
+    def booking_rows():
+        # Spread bookings round-robin over classes; a random user stride per
+        # class keeps (user_id, class_id) unique as long as per_class <= users.
+        for n in range(bookings):
+            class_id = n % classes + 1
+            k = n // classes
+            user_id = (class_id * 7919 + k * 104729) % users + 1 if per_class <= users else k % users + 1
+            yield (user_id, class_id)
+
+    started = time.perf_counter()
+    for chunk in chunked(class_rows()):
+        db.executemany('INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) '
+                       'VALUES (?, ?, ?, ?, ?)', chunk)
+    for chunk in chunked(user_rows()):
+        db.executemany('INSERT INTO Users (name, email, password_hash) VALUES (?, ?, ?)', chunk)
+    for chunk in chunked(booking_rows()):
+        db.executemany('INSERT OR IGNORE INTO Bookings (user_id, class_id) VALUES (?, ?)', chunk)
+    db.execute('''
+        UPDATE Classes SET available_slots = capacity - (
+            SELECT COUNT(*) FROM Bookings b WHERE b.class_id = Classes.class_id)
+    ''')
+    db.commit()
+    db.execute('PRAGMA synchronous = NORMAL')
+    db.execute('ANALYZE')
+    counts = {table: db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('Classes', 'Users', 'Bookings')}
+    db.close()
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic booking database.')
+    parser.add_argument('path')
+    parser.add_argument('--classes', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(generate(args.path, args.classes, args.users, args.bookings, args.days, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# ==============================================================================
+#  FILE: benchmarks/load.py
+#  DESCRIPTION: Closed-loop HTTP load generator with latency percentiles.
+# ==============================================================================
+import time
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+class Client:
+    """One keep-alive HTTP connection per load thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, method, path, body=None):
+        headers = {'Connection': 'keep-alive'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            # Reconnect on dropped keep-alive connections and count an error.
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            return 0
+
+def run_scenario(base_url, make_request, concurrency, duration=None, requests=None):
+    """
+    Runs `concurrency` threads issuing make_request(client, worker, i) back to back
+    for `duration` seconds or `requests` total requests, and summarizes the latencies.
+    make_request returns the HTTP status (0 for a transport error).
+    """
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    counter = iter(range(requests)) if requests else None
+    lock = threading.Lock()
+    deadline = time.perf_counter() + (duration or 0)
+
+    def worker(w):
+        client = Client(base_url)
+        while True:
+            if counter is not None:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+            else:
+                if time.perf_counter() >= deadline:
+                    return
+                i = len(latencies[w])
+            started = time.perf_counter()
+            status = make_request(client, w, i)
+            latencies[w].append(time.perf_counter() - started)
+            statuses[w][status] = statuses[w].get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    merged = sorted(l for per_worker in latencies for l in per_worker)
+    by_status = {}
+    for per_worker in statuses:
+        for status, count in per_worker.items():
+            by_status[str(status)] = by_status.get(str(status), 0) + count
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(merged),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(merged) / elapsed, 1) if elapsed else 0,
+        'p50_ms': ms(percentile(merged, 50)),
+        'p95_ms': ms(percentile(merged, 95)),
+        'p99_ms': ms(percentile(merged, 99)),
+        'max_ms': ms(merged[-1] if merged else None),
+        'statuses': by_status,
+    }
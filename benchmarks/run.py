@@ -0,0 +1,134 @@
+# ==============================================================================
+#  FILE: benchmarks/run.py
+#  DESCRIPTION: Load-test suite for /api/classes, /api/book and /api/bookings.
+#  USAGE: python -m benchmarks.run [--classes 10000 --bookings 1000000]
+#         [--concurrency 32] [--duration 10] [--url http://host:port]
+#         [--compare benchmarks/results/<previous>.json]
+# ==============================================================================
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+
+from .datagen import generate, user_email
+from .load import run_scenario
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+TIMEZONES = ['UTC', 'Asia/Kolkata', 'America/New_York', 'Europe/London', 'Australia/Sydney']
+
+def scenarios(args):
+    """Each scenario maps (client, worker, i) to one request and returns its status."""
+    run_id = int(time.time())
+
+    def classes(client, worker, i):
+        return client.request('GET', f'/api/classes?timezone={TIMEZONES[i % len(TIMEZONES)]}')
+
+    def bookings(client, worker, i):
+        return client.request('GET', f'/api/bookings?email={user_email(random.randrange(args.users))}')
+
+    def book(client, worker, i):
+        return client.request('POST', '/api/book', {
+            'class_id': random.randint(1, args.classes),
+            'client_name': 'Load Test',
+            'client_email': f'load-{run_id}-{worker}-{i}@bench.example',
+        })
+
+    return {'GET /api/classes': classes, 'GET /api/bookings': bookings, 'POST /api/book': book}
+
+def wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'{url}/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {url} did not come up within {timeout}s.')
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(current, previous_path):
+    """Prints throughput and p99 changes against a saved result file."""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f'\nCompared with {previous.get("revision")} ({previous_path}):')
+    for name, result in current['endpoints'].items():
+        old = previous['endpoints'].get(name)
+        if not old:
+            continue
+        rps = (result['throughput_rps'] / old['throughput_rps'] - 1) * 100 if old['throughput_rps'] else 0
+        p99 = (result['p99_ms'] / old['p99_ms'] - 1) * 100 if old['p99_ms'] else 0
+        print(f'  {name:<20} throughput {rps:+6.1f}%   p99 {p99:+6.1f}%')
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the booking API.')
+    parser.add_argument('--url', help='Benchmark an already running server instead of starting one.')
+    parser.add_argument('--database', help='Reuse a database built by benchmarks.datagen.')
+    parser.add_argument('--classes', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per endpoint.')
+    parser.add_argument('--only', action='append', help='Run only these endpoints, e.g. "POST /api/book".')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--set', action='append', default=[], help='Config override passed to the server.')
+    parser.add_argument('--output', help='Where to save the JSON results.')
+    parser.add_argument('--compare', help='A previous results file to compare against.')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    database = args.database
+    if not url:
+        if not database:
+            database = os.path.join(tempfile.mkdtemp(prefix='booking-bench-'), 'bench.db')
+            print(f'Generating {database} ...', flush=True)
+            print(f'  {generate(database, args.classes, args.users, args.bookings)}', flush=True)
+        url = f'http://127.0.0.1:{args.port}'
+        command = [sys.executable, '-m', 'benchmarks.serve', database, '--port', str(args.port)]
+        for override in args.set:
+            command += ['--set', override]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(url)
+        report = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'params': {k: getattr(args, k) for k in ('classes', 'users', 'bookings', 'concurrency', 'duration', 'set')},
+            'endpoints': {},
+        }
+        for name, make_request in scenarios(args).items():
+            if args.only and name not in args.only:
+                continue
+            result = run_scenario(url, make_request, args.concurrency, duration=args.duration)
+            report['endpoints'][name] = result
+            print(f'{name:<20} {result["throughput_rps"]:9.1f} req/s  p50 {result["p50_ms"]:8.2f} ms  '
+                  f'p95 {result["p95_ms"]:8.2f} ms  p99 {result["p99_ms"]:8.2f} ms  {result["statuses"]}',
+                  flush=True)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{report["timestamp"].replace(":", "")}-{report["revision"]}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved {output}')
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == '__main__':
+    main()
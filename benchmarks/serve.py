@@ -0,0 +1,38 @@
+# ==============================================================================
+#  FILE: benchmarks/serve.py
+#  DESCRIPTION: Serves the API on a benchmark database for load tests.
+#  USAGE: python -m benchmarks.serve bench.db --port 5055
+# ==============================================================================
+import ast
+import logging
+import argparse
+from werkzeug.serving import make_server
+
+from app import create_app
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the API over a benchmark database.')
+    parser.add_argument('database')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--config', default='config.Config')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Override a config value (Python literal), e.g. BOOKING_GROUP_COMMIT=True')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    app.config['DATABASE'] = args.database
+    for override in args.set:
+        key, value = override.split('=', 1)
+        try:
+            app.config[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            app.config[key] = value
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server(args.host, args.port, app, threaded=True)
+    print(f'Serving {args.database} on http://{args.host}:{args.port}', flush=True)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,135 @@ class Config:
     DEBUG = False
     TESTING = False
 
+    # SQLite connection pool (one per worker process). Every pooled connection
+    # is opened and tuned once, then reused across requests.
+    DB_POOL_SIZE = 8                      # Idle connections kept per process.
+    DB_BUSY_TIMEOUT_MS = 5000             # How long SQLite waits on a locked database.
+    DB_CACHE_SIZE_KIB = 16384             # Page cache per connection (16 MiB).
+    DB_MMAP_SIZE = 64 * 1024 * 1024       # Memory-mapped I/O window (64 MiB).
+    DB_CACHED_STATEMENTS = 256            # Prepared statements cached per connection.
+    DB_JOURNAL_MODE = 'WAL'
+    DB_SYNCHRONOUS = 'NORMAL'
+    DB_BUSY_RETRIES = 5                   # Extra attempts for a write transaction hitting SQLITE_BUSY.
+    DB_BUSY_RETRY_BASE_DELAY = 0.01       # Seconds; doubled per attempt and jittered.
+    # Start every new in-memory connection as a copy of a template with the
+    # schema and seed data, built once per process (':memory:' only).
+    DB_TEMPLATE = False
+
+    # Logging goes through a bounded queue (LOG_QUEUE_SIZE records) to one
+    # writer thread per worker, so requests never wait on stderr. Records are
+    # JSON lines with the request id, endpoint and time into the request, or
+    # plain text with LOG_FORMAT = 'text'. LOG_SUCCESS_SAMPLE_RATE keeps that
+    # fraction of the per-booking success messages; errors are always kept.
+    LOG_LEVEL = 'INFO'
+    LOG_FORMAT = 'json'
+    LOG_QUEUE_SIZE = 10000
+    LOG_SUCCESS_SAMPLE_RATE = 1.0
+
+    # Request/SQL instrumentation exposed at /metrics in Prometheus format.
+    # With several workers, point METRICS_MULTIPROC_DIR at a directory they
+    # share; each worker publishes its values there at most every
+    # METRICS_FLUSH_INTERVAL seconds, and folds them into an aggregate file
+    # there as it exits, so /metrics totals never go down.
+    METRICS_ENABLED = True
+    METRICS_MULTIPROC_DIR = None
+    METRICS_FLUSH_INTERVAL = 1.0
+
+    # GET /api/classes and GET /api/bookings read through mode=ro connections
+    # that never take the write lock. With READ_SNAPSHOT_ENABLED each worker
+    # serves them from an in-memory copy instead, refreshed with the backup
+    # API every READ_SNAPSHOT_INTERVAL seconds, so reads can be that stale. A
+    # copy older than READ_SNAPSHOT_MAX_STALENESS (e.g. the refresh is failing)
+    # is skipped. Both need a file database.
+    READ_SNAPSHOT_ENABLED = False
+    READ_SNAPSHOT_INTERVAL = 1.0
+    READ_SNAPSHOT_MAX_STALENESS = 5.0
+
+    # JSON encoding of responses: 'orjson', 'stdlib' or 'auto' (orjson when
+    # it is installed). Use the same backend in every worker, since ETags are
+    # computed over the encoded bytes.
+    JSON_BACKEND = 'auto'
+
+    # Per-studio shards: {'studio': (shard_number, path_to_sqlite_file)}. Each
+    # studio's classes, bookings and waitlists live in their own file, and its
+    # ids start at shard_number << 32, so an id routes to its shard by itself.
+    # Class-scoped routes touch one shard; listings across studios query them
+    # in parallel on up to SHARD_GATHER_THREADS threads per worker. Empty means
+    # a single database at DATABASE. `flask init-db` / `migrate-db` visit them all.
+    SHARDS = {}
+    SHARD_GATHER_THREADS = 8
+
+    # Keyset pagination for GET /api/classes and GET /api/bookings.
+    PAGE_SIZE_DEFAULT = 100
+    PAGE_SIZE_MAX = 500
+    STREAM_CHUNK_ROWS = 1000              # Rows per chunk for ?stream=1 / NDJSON exports.
+
+    # Recurring schedules are expanded into classes this many days ahead.
+    SCHEDULE_HORIZON_DAYS = 90
+
+    # GET /api/classes/stream (Server-Sent Events). Each worker tails the
+    # SlotEvents log every SSE_POLL_INTERVAL seconds and fans new events out
+    # to its subscribers from a ring buffer. Needs a file database.
+    SSE_POLL_INTERVAL = 0.1
+    SSE_BUFFER_EVENTS = 4096
+    SSE_BACKLOG_BATCH = 1000              # Logged events sent per read when a client catches up.
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_STREAM_SECONDS = 300          # Clients then reconnect with Last-Event-ID.
+
+    # GET /api/classes response cache, validated against DataVersions.
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 512      # Per worker, e.g. one per timezone.
+
+    # POST /api/book/batch
+    BOOKING_BATCH_MAX_ITEMS = 100
+
+    # Idempotency-Key on POST /api/book: a key's outcome is kept this long in
+    # IdempotencyKeys, the most recent ones also in a per-worker LRU. Each
+    # worker deletes expired keys at most every IDEMPOTENCY_EVICT_INTERVAL seconds.
+    IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+    IDEMPOTENCY_CACHE_MAX_ENTRIES = 10000
+    IDEMPOTENCY_EVICT_INTERVAL = 60
+
+    # Admission control for the write routes (booking, batch, cancellation,
+    # leaving a waitlist). Each worker runs at most WRITE_CONCURRENCY_LIMIT of
+    # them at once; up to WRITE_QUEUE_SIZE more wait for a slot, each for at
+    # most WRITE_QUEUE_TIMEOUT seconds. The rest get 503 with Retry-After at
+    # once, so a rush for one class can't tie up every worker thread. With
+    # BOOKING_GROUP_COMMIT, raise the limit towards GROUP_COMMIT_MAX_BATCH so
+    # that batches can fill.
+    WRITE_CONCURRENCY_LIMIT = 4
+    WRITE_QUEUE_SIZE = 32
+    WRITE_QUEUE_TIMEOUT = 2.0
+    WRITE_RETRY_AFTER = 1                 # Seconds, for the 503 responses.
+
+    # Per-client token buckets (by client email, else IP) on the same routes:
+    # RATE_LIMIT_BURST requests at once, refilled at RATE_LIMIT_PER_SECOND;
+    # beyond that, 429 with Retry-After. Every worker shares the buckets
+    # through RATE_LIMIT_DATABASE, a small SQLite file of its own, and deletes
+    # refilled ones at most every RATE_LIMIT_EVICT_INTERVAL seconds.
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_DATABASE = os.path.join(basedir, 'instance', 'rate_limits.sqlite')
+    RATE_LIMIT_PER_SECOND = 1.0
+    RATE_LIMIT_BURST = 20
+    RATE_LIMIT_EVICT_INTERVAL = 60
+
+    # Group commit: hand bookings to one writer thread per worker that commits
+    # up to GROUP_COMMIT_MAX_BATCH of them per transaction. Needs a file database.
+    BOOKING_GROUP_COMMIT = False
+    GROUP_COMMIT_MAX_BATCH = 64
+    GROUP_COMMIT_MAX_WAIT_MS = 2          # How long a batch waits for more bookings to join.
+    GROUP_COMMIT_TIMEOUT = 10             # Seconds a request waits for the writer before a 503.
+
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
+    LOG_FORMAT = 'text'
     
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     # Use a separate in-memory DB for tests to keep them isolated and fast.
-    DATABASE = ':memory:'
\ No newline at end of file
+    DATABASE = ':memory:'
+    DB_TEMPLATE = True
+    RATE_LIMIT_ENABLED = False
+    RATE_LIMIT_DATABASE = ':memory:'
\ No newline at end of file
@@ -1,9 +1,12 @@
 # ==============================================================================
 #  FILE: conftest.py
-#  DESCRIPTION: Shared fixtures for pytest.
+#  DESCRIPTION: Shared fixtures and helpers for pytest.
 # ==============================================================================
+import json
+import datetime
 import pytest
 from app import create_app
+from app.database import clone_template, get_db
 
 @pytest.fixture(scope='module')
 def app():
@@ -13,3 +16,48 @@ def app():
     """
     app = create_app('config.TestingConfig')
     yield app
+
+@pytest.fixture
+def config_overrides():
+    """Config values the `client` fixture sets for one test; a module overrides this for its own needs."""
+    return {}
+
+@pytest.fixture
+def client(app, monkeypatch, config_overrides):
+    """
+    A test client for the app with a clean, seeded database for each test.
+    The overrides apply first, so a DATABASE among them is the one cloned into.
+    """
+    for key, value in config_overrides.items():
+        monkeypatch.setitem(app.config, key, value)
+    with app.app_context():
+        clone_template(get_db())
+        yield app.test_client()
+
+def add_future_class(name='Future Flow', capacity=5, days=1, instructor='Tess'):
+    """Inserts a class that starts in the future and returns its class_id."""
+    start_time = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=days)).strftime('%Y-%m-%d 09:00:00')
+    db = get_db()
+    cursor = db.execute(
+        "INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) VALUES (?, ?, ?, ?, ?)",
+        (name, start_time, instructor, capacity, capacity))
+    db.commit()
+    return cursor.lastrowid
+
+def book(client, class_id, email, name='Test User', key=None):
+    """POSTs one booking, with an Idempotency-Key header when `key` is given."""
+    headers = {'Idempotency-Key': key} if key is not None else {}
+    return client.post('/api/book', data=json.dumps({
+        "class_id": class_id, "client_name": name, "client_email": email
+    }), content_type='application/json', headers=headers)
+
+def seed_classes(count):
+    """Inserts `count` upcoming classes, one minute apart, entirely inside SQLite."""
+    db = get_db()
+    db.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO Classes (name, start_time, instructor, capacity, available_slots)
+        SELECT 'Class ' || i, datetime('2030-01-01', '+' || i || ' minutes'), 'Coach ' || (i % 50), 20, 20
+        FROM n
+    ''', (count,))
+    db.commit()
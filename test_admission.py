@@ -0,0 +1,89 @@
+# ==============================================================================
+#  FILE: test_admission.py
+#  DESCRIPTION: Tests for admission control and rate limits on write routes.
+# ==============================================================================
+import threading
+import pytest
+from app.admission import AdmissionGate, TokenBucketLimiter, get_admission_gate, check_config
+from conftest import add_future_class, book
+
+@pytest.fixture
+def config_overrides():
+    return {'RATE_LIMIT_ENABLED': True, 'RATE_LIMIT_BURST': 3, 'RATE_LIMIT_PER_SECOND': 0.5}
+
+@pytest.fixture
+def client(client, app):
+    """The shared client, with a limiter and a gate built from this test's config."""
+    app.extensions.pop('rate_limiter', None)
+    app.extensions.pop('admission_gate', None)
+    yield client
+    app.extensions.pop('rate_limiter', None)
+    app.extensions.pop('admission_gate', None)
+
+def test_rate_limit_per_client(client):
+    class_ids = [add_future_class(name=f'Flow {i}') for i in range(4)]
+    for class_id in class_ids[:3]:
+        assert book(client, class_id, 'eager@example.com').status_code == 201
+    response = book(client, class_ids[3], 'Eager@example.com')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+    assert response.get_json()['error'] == 'Too many requests, please slow down.'
+    # Other clients have their own buckets, and reads are never limited.
+    assert book(client, class_ids[3], 'calm@example.com').status_code == 201
+    assert client.get('/api/classes').status_code == 200
+
+def test_buckets_are_shared_and_refill(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = TokenBucketLimiter(path, rate=2.0, burst=2), TokenBucketLimiter(path, rate=2.0, burst=2)
+    assert first.take('ip:1', now=100.0) == 0
+    assert second.take('ip:1', now=100.0) == 0
+    assert first.take('ip:1', now=100.0) == pytest.approx(0.5)
+    assert second.take('ip:1', now=100.25) == pytest.approx(0.25)
+    assert second.take('ip:1', now=100.5) == 0
+    assert first.take('ip:2', now=100.0) == 0
+
+    # A bucket that has refilled is deleted; a missing row is a full bucket.
+    assert first.evict_full(101.25, interval=60) == 1
+    assert first.evict_full(103.0, interval=60) == 0
+    assert first.evict_full(162.0, interval=60) == 1
+    plan = first._conn.execute("EXPLAIN QUERY PLAN DELETE FROM TokenBuckets WHERE updated_at <= 1").fetchall()
+    assert 'idx_token_buckets_updated_at' in str(plan)
+    first.close()
+    second.close()
+
+def test_unworkable_rate_limits_are_rejected():
+    config = {'RATE_LIMIT_ENABLED': True, 'RATE_LIMIT_PER_SECOND': 0, 'RATE_LIMIT_BURST': 20}
+    with pytest.raises(ValueError, match='RATE_LIMIT_PER_SECOND'):
+        check_config(config)
+    with pytest.raises(ValueError, match='RATE_LIMIT_BURST'):
+        check_config(dict(config, RATE_LIMIT_PER_SECOND=1.0, RATE_LIMIT_BURST=0))
+    check_config(dict(config, RATE_LIMIT_ENABLED=False))
+
+def test_gate_queues_then_sheds():
+    gate = AdmissionGate(limit=1, queue_size=1)
+    assert gate.enter(timeout=0) is None
+    assert gate.enter(timeout=0.01) == 'queue_timeout'
+
+    waiter = threading.Thread(target=lambda: results.append(gate.enter(timeout=5)))
+    results = []
+    waiter.start()
+    while not gate.waiting:
+        pass
+    assert gate.enter(timeout=5) == 'queue_full'
+    gate.leave()
+    waiter.join(5)
+    assert results == [None] and gate.in_flight == 1
+
+def test_overloaded_worker_answers_503(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', False)
+    monkeypatch.setitem(app.config, 'WRITE_CONCURRENCY_LIMIT', 1)
+    monkeypatch.setitem(app.config, 'WRITE_QUEUE_SIZE', 0)
+    class_id = add_future_class()
+    gate = get_admission_gate()
+    assert gate.enter(timeout=0) is None
+    response = book(client, class_id, 'late@example.com')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    gate.leave()
+    assert book(client, class_id, 'late@example.com').status_code == 201
+    assert gate.in_flight == 0
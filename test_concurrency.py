@@ -0,0 +1,166 @@
+# ==============================================================================
+#  FILE: test_concurrency.py
+#  DESCRIPTION: Multi-process stress test for the booking write path.
+# ==============================================================================
+import datetime
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app
+from app.database import create_schema, get_pool
+from app.booking import INVALID_CLIENT
+
+PROCESSES = 8
+ATTEMPTS_PER_PROCESS = 25
+CAPACITY = 60
+
+def book_many(db_path, worker, class_id, results):
+    """Runs in a child process: books the same class with distinct clients."""
+    app = create_app('config.TestingConfig')
+    app.config['DATABASE'] = db_path
+    client = app.test_client()
+    statuses = []
+    for i in range(ATTEMPTS_PER_PROCESS):
+        response = client.post('/api/book', data=json.dumps({
+            "class_id": class_id, "client_name": f"Worker {worker}",
+            "client_email": f"w{worker}-{i}@example.com"
+        }), content_type='application/json')
+        statuses.append((response.status_code, response.get_json().get('position')))
+    results.put(statuses)
+
+def class_database(tmp_path, capacity):
+    """Creates a file database holding one class, class_id 1, tomorrow. Returns its path and a connection."""
+    db_path = str(tmp_path / "stress.db")
+    db = sqlite3.connect(db_path)
+    create_schema(db)
+    start_time = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    db.execute("INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) VALUES (?, ?, ?, ?, ?)",
+               ('Stress Spin', start_time, 'Rita', capacity, capacity))
+    db.commit()
+    return db_path, db
+
+def group_commit_app(tmp_path, capacity=10, **config):
+    """An app with group commit on, over a class_database(). Returns the app and the connection."""
+    db_path, db = class_database(tmp_path, capacity)
+    app = create_app('config.TestingConfig')
+    app.config.update(DATABASE=db_path, BOOKING_GROUP_COMMIT=True, **config)
+    return app, db
+
+def book_one(client, email):
+    return client.post('/api/book', data=json.dumps({
+        "class_id": 1, "client_name": "Group", "client_email": email
+    }), content_type='application/json')
+
+def test_concurrent_bookings_never_oversell(tmp_path):
+    """
+    Many processes booking one class at once must fill it exactly, never below
+    zero, and queue everyone else on the waitlist in distinct positions.
+    """
+    db_path, db = class_database(tmp_path, CAPACITY)
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    workers = [ctx.Process(target=book_many, args=(db_path, w, 1, results)) for w in range(PROCESSES)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    statuses = [s for _ in workers for s in results.get(timeout=60)]
+    for w in workers:
+        w.join(timeout=60)
+    elapsed = time.perf_counter() - started
+
+    created = [s for s in statuses if s[0] == 201]
+    waitlisted = [s for s in statuses if s[0] == 202]
+    assert len(created) == CAPACITY
+    assert len(created) + len(waitlisted) == PROCESSES * ATTEMPTS_PER_PROCESS
+    assert sorted(position for _, position in waitlisted) == list(range(1, len(waitlisted) + 1))
+
+    slots, = db.execute("SELECT available_slots FROM Classes WHERE class_id = 1").fetchone()
+    bookings, = db.execute("SELECT COUNT(*) FROM Bookings WHERE class_id = 1").fetchone()
+    assert slots == 0
+    assert bookings == CAPACITY
+
+    print(f"\n{len(statuses)} booking requests from {PROCESSES} processes in {elapsed:.2f}s "
+          f"({len(statuses) / elapsed:.0f} requests/s, {len(created) / elapsed:.0f} bookings/s)")
+
+def test_group_commit_batches_concurrent_bookings(tmp_path):
+    """With group commit on, concurrent bookings share transactions and keep their own results."""
+    app, db = group_commit_app(tmp_path, capacity=40, GROUP_COMMIT_MAX_WAIT_MS=20)
+    client = app.test_client()
+
+    def book(i):
+        return book_one(client, 'dup@example.com' if i in (0, 1) else f'g{i}@example.com')
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(book, range(30)))
+
+    errors = [r.get_json()['error'] for r in responses if r.status_code != 201]
+    assert sum(r.status_code == 201 for r in responses) == 29
+    assert errors == ['You are already booked for this class.']
+    assert db.execute("SELECT available_slots FROM Classes WHERE class_id = 1").fetchone()[0] == 11
+
+    writer = app.extensions['booking_writers'][app.config['DATABASE']]
+    assert writer.intents == 30
+    assert writer.batches < writer.intents
+    writer.stop()
+
+def test_group_commit_isolates_a_bad_intent(tmp_path):
+    """An intent whose user can't be stored fails alone, not the batch it shares."""
+    app, db = group_commit_app(tmp_path, GROUP_COMMIT_MAX_WAIT_MS=200)
+    with app.app_context():
+        from app.group_commit import get_booking_writer
+        writer = get_booking_writer()
+        # Bypasses validate_booking(), as a caller with a bug would.
+        futures = [writer.submit({'class_id': 1, 'client_email': f'p{i}@example.com',
+                                  'client_name': None if i == 3 else 'Group'}) for i in range(6)]
+        outcomes = [future.result(5) for future in futures]
+    writer.stop()
+
+    assert writer.batches == 1
+    assert [error and str(error) for _, error in outcomes] == [None, None, None, INVALID_CLIENT, None, None]
+    assert db.execute("SELECT COUNT(*) FROM Bookings").fetchone()[0] == 5
+
+def test_dead_writer_answers_503_and_is_replaced(tmp_path, monkeypatch):
+    app, db = group_commit_app(tmp_path)
+    client = app.test_client()
+    with app.app_context():
+        pool = get_pool()
+
+    def broken():
+        raise sqlite3.OperationalError('unable to open database file')
+    monkeypatch.setattr(pool, 'acquire', broken)
+    response = book_one(client, 'early@example.com')
+    assert response.status_code == 503
+    writer = app.extensions['booking_writers'][app.config['DATABASE']]
+    writer._thread.join(5)
+    assert writer.dead
+
+    monkeypatch.undo()
+    assert book_one(client, 'later@example.com').status_code == 201
+    replacement = app.extensions['booking_writers'][app.config['DATABASE']]
+    assert replacement is not writer
+    replacement.stop()
+
+def test_request_stops_waiting_for_a_stuck_writer(tmp_path, monkeypatch):
+    app, db = group_commit_app(tmp_path, GROUP_COMMIT_TIMEOUT=0.05)
+    client = app.test_client()
+    with app.app_context():
+        pool = get_pool()
+    acquire, unstuck = pool.acquire, threading.Event()
+
+    def stuck():
+        unstuck.wait(5)
+        return acquire()
+    monkeypatch.setattr(pool, 'acquire', stuck)
+    response = book_one(client, 'stuck@example.com')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+    # The withdrawn booking is skipped once the writer gets going.
+    unstuck.set()
+    assert book_one(client, 'next@example.com').status_code == 201
+    app.extensions['booking_writers'][app.config['DATABASE']].stop()
+    assert db.execute("SELECT COUNT(*) FROM Bookings").fetchone()[0] == 1
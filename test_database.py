@@ -4,23 +4,60 @@
 # ==============================================================================
 import pytest
 import sqlite3
-from app.database import get_db
+from app.database import get_db, get_pool, ConnectionPool
+from app.migrations import MIGRATIONS, LATEST_VERSION, migrate, schema_version, check_query_plans
+from app.routes import ROUTE_QUERIES
 
 # The 'app' fixture is now defined in conftest.py and available automatically.
 
+def get_pool_stats(app):
+    """Reads the pool stats from outside of a request."""
+    with app.app_context():
+        return get_pool().stats()
+
 def test_get_close_db(app):
     """
     Tests that get_db returns the same connection within an app context
-    and that the connection is closed afterwards.
+    and that the connection is returned to the pool afterwards.
     """
     with app.app_context():
         db = get_db()
         assert db is get_db()
+        assert get_pool().stats()['in_use'] == 1
+
+    stats = get_pool_stats(app)
+    assert stats['in_use'] == 0
+    assert stats['idle'] >= 1
 
-    with pytest.raises(sqlite3.ProgrammingError) as e:
+    # The next app context borrows the pooled connection instead of opening one.
+    with app.app_context():
+        assert get_db() is db
         db.execute('SELECT 1')
-    
-    assert 'closed' in str(e.value)
+
+def test_pool_applies_pragmas(app, monkeypatch, tmp_path):
+    """Tests that pooled connections are tuned once when they are opened."""
+    monkeypatch.setitem(app.config, 'DATABASE', str(tmp_path / "pool.db"))
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert db.execute('PRAGMA busy_timeout').fetchone()[0] == app.config['DB_BUSY_TIMEOUT_MS']
+        assert db.execute('PRAGMA cache_size').fetchone()[0] == -app.config['DB_CACHE_SIZE_KIB']
+
+def test_pool_discards_connections_beyond_size():
+    """Tests that the pool closes connections once it holds DB_POOL_SIZE idle ones."""
+    pool = ConnectionPool(':memory:', size=1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    stats = pool.stats()
+    assert stats['created'] == 2
+    assert stats['idle'] == 1
+    assert stats['discarded'] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        second.execute('SELECT 1')
 
 def test_init_db_command(app, monkeypatch, tmp_path):
     """
@@ -47,3 +84,42 @@ def test_init_db_command(app, monkeypatch, tmp_path):
     
     # This assertion will now pass because the table exists in the file.
     assert cursor.fetchone() is not None, "The 'Classes' table was not created by init-db command."
+
+def test_migrate_upgrades_existing_database_in_place(tmp_path):
+    """Tests that migrations adopt a pre-migration database without losing data."""
+    db = sqlite3.connect(tmp_path / "legacy.db")
+    db.executescript('''
+        CREATE TABLE Users (user_id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(100) NOT NULL,
+                            email VARCHAR(100) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL);
+        CREATE TABLE Classes (class_id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(100) NOT NULL,
+                              start_time TEXT NOT NULL, instructor VARCHAR(100) NOT NULL,
+                              capacity INTEGER NOT NULL, available_slots INTEGER NOT NULL);
+        CREATE TABLE Bookings (booking_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                               class_id INTEGER NOT NULL, booking_date TEXT DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO Classes (name, start_time, instructor, capacity, available_slots)
+            VALUES ('Yoga', '2030-01-01 08:00:00', 'Chloe', 10, 8);
+        INSERT INTO Bookings (user_id, class_id) VALUES (1, 1), (1, 1);
+    ''')
+
+    assert migrate(db) == [version for version, _, _ in MIGRATIONS]
+    assert schema_version(db) == LATEST_VERSION
+    assert db.execute("SELECT COUNT(*) FROM Classes").fetchone()[0] == 1
+    # The duplicate booking is dropped so the unique index can be built.
+    assert db.execute("SELECT COUNT(*) FROM Bookings").fetchone()[0] == 1
+    assert migrate(db) == []
+
+def test_migrate_db_command(app, monkeypatch, tmp_path):
+    """Tests the 'migrate-db' Flask CLI command on a fresh database file."""
+    monkeypatch.setitem(app.config, 'DATABASE', str(tmp_path / "migrate.db"))
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['migrate-db'])
+    assert 'Applied migrations' in result.output
+    result = runner.invoke(args=['migrate-db'])
+    assert 'Database is up to date.' in result.output
+
+def test_route_queries_use_indexes():
+    """Every query the routes run must be answered without a full table SCAN."""
+    db = sqlite3.connect(':memory:')
+    migrate(db)
+    assert check_query_plans(db, ROUTE_QUERIES) == {}
@@ -0,0 +1,73 @@
+# ==============================================================================
+#  FILE: test_events.py
+#  DESCRIPTION: Tests for the slot-availability Server-Sent Events stream.
+# ==============================================================================
+import pytest
+import sqlite3
+from app.database import get_db
+from app.events import EventHub, format_event
+from conftest import add_future_class, book
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    """Events cross connections through the SlotEvents log, so use a file database."""
+    return {'DATABASE': str(tmp_path / "events.db"), 'SSE_HEARTBEAT_SECONDS': 0.5, 'SSE_MAX_STREAM_SECONDS': 5}
+
+def open_stream(client, **headers):
+    response = client.get('/api/classes/stream', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 1000\n\n'
+    return chunks
+
+def next_events(chunks):
+    """Returns the next chunk that carries events, skipping heartbeats."""
+    for chunk in chunks:
+        if not chunk.startswith(b':'):
+            return chunk.decode()
+    raise AssertionError('The stream ended without events.')
+
+def test_hub_serves_from_ring_buffer():
+    hub = EventHub(buffer_size=3)
+    assert hub.wait(0, timeout=0.01) == []
+    hub.publish([(i, format_event(i, 1, 10 - i)) for i in range(1, 6)])
+    assert [event_id for event_id, _ in hub.wait(3, timeout=0)] == [4, 5]
+    # Event 2 has already left the buffer.
+    assert hub.wait(1, timeout=0) is None
+
+def test_stream_pushes_slot_changes_from_any_connection(client, app):
+    class_id = add_future_class(capacity=5)
+    chunks = open_stream(client)
+
+    assert book(client, class_id, 'sse@example.com').status_code == 201
+    assert f'data: {{"class_id":{class_id},"available_slots":4}}' in next_events(chunks)
+
+    # A write from another process's connection reaches the stream through the log.
+    other = sqlite3.connect(app.config['DATABASE'])
+    other.execute("UPDATE Classes SET available_slots = 2 WHERE class_id = ?", (class_id,))
+    other.commit()
+    assert f'"class_id":{class_id},"available_slots":2' in next_events(chunks)
+
+def test_stream_resumes_from_last_event_id(client):
+    class_id = add_future_class(capacity=5)
+    book(client, class_id, 'one@example.com')
+    book(client, class_id, 'two@example.com')
+    first_id = get_db().execute("SELECT MIN(event_id) FROM SlotEvents").fetchone()[0]
+
+    events = next_events(open_stream(client, **{'Last-Event-ID': str(first_id)}))
+    assert events == format_event(first_id + 1, class_id, 3)
+
+def test_stream_resets_when_log_was_pruned(client):
+    class_id = add_future_class(capacity=5)
+    book(client, class_id, 'one@example.com')
+    book(client, class_id, 'two@example.com')
+    db = get_db()
+    db.execute("DELETE FROM SlotEvents WHERE event_id = (SELECT MIN(event_id) FROM SlotEvents)")
+    db.commit()
+
+    assert next_events(open_stream(client, **{'Last-Event-ID': '0'})) == 'event: reset\ndata: {}\n\n'
+
+def test_stream_rejects_bad_last_event_id(client):
+    response = client.get('/api/classes/stream', headers={'Last-Event-ID': 'abc'})
+    assert response.status_code == 400
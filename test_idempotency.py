@@ -0,0 +1,125 @@
+# ==============================================================================
+#  FILE: test_idempotency.py
+#  DESCRIPTION: Tests for Idempotency-Key support on POST /api/book.
+# ==============================================================================
+import time
+import threading
+import pytest
+from app import routes
+from app.database import get_db
+from app.idempotency import get_idempotency_cache
+from conftest import add_future_class, book
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    """A file database, so that concurrent requests share it (and a fresh key cache per test)."""
+    return {'DATABASE': str(tmp_path / "idempotency.db")}
+
+def count_bookings(class_id):
+    return get_db().execute("SELECT COUNT(*) FROM Bookings WHERE class_id = ?", (class_id,)).fetchone()[0]
+
+def test_resend_replays_original_response(client, app, monkeypatch):
+    class_id = add_future_class()
+    first = book(client, class_id, 'flaky@example.com', key='key-1')
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    # A replay never opens a write transaction, from the LRU or from the table.
+    def no_writes(db, work):
+        raise AssertionError('A replay must not write.')
+    monkeypatch.setattr(routes, 'run_write_transaction', no_writes)
+    for clear_cache in (False, True):
+        if clear_cache:
+            app.extensions['idempotency_caches'].clear()
+        again = book(client, class_id, 'flaky@example.com', key='key-1')
+        assert again.status_code == 201
+        assert again.headers['Idempotent-Replayed'] == 'true'
+        assert again.get_json() == first.get_json()
+    assert count_bookings(class_id) == 1
+
+def test_waitlist_outcome_is_replayed(client):
+    class_id = add_future_class(capacity=1)
+    assert book(client, class_id, 'a@example.com', key='key-a').status_code == 201
+    first = book(client, class_id, 'b@example.com', key='key-b')
+    assert first.status_code == 202
+    again = book(client, class_id, 'b@example.com', key='key-b')
+    assert again.status_code == 202 and again.get_json() == first.get_json()
+
+def test_key_reused_for_another_booking(client):
+    class_id = add_future_class()
+    other_id = add_future_class(name='Other Flow')
+    assert book(client, class_id, 'a@example.com', key='shared').status_code == 201
+    response = book(client, other_id, 'a@example.com', key='shared')
+    assert response.status_code == 422
+    assert 'already used for a different booking' in response.get_json()['error']
+    assert count_bookings(other_id) == 0
+
+def test_conflict_found_by_the_group_commit_writer(client, app, monkeypatch):
+    """A key another worker stored meanwhile is still a 422 when the writer thread finds it."""
+    monkeypatch.setitem(app.config, 'BOOKING_GROUP_COMMIT', True)
+    class_id = add_future_class()
+    other_id = add_future_class(name='Other Flow')
+    assert book(client, class_id, 'a@example.com', key='shared').status_code == 201
+    # As if the first booking happened in another worker after our lookup.
+    monkeypatch.setattr(routes, 'find_outcome', lambda *args: None)
+    response = book(client, other_id, 'a@example.com', key='shared')
+    app.extensions['booking_writers'].pop(app.config['DATABASE']).stop()
+    assert response.status_code == 422
+    assert 'already used for a different booking' in response.get_json()['error']
+    assert count_bookings(other_id) == 0
+
+def test_invalid_key_and_failed_bookings(client):
+    class_id = add_future_class()
+    response = book(client, class_id, 'a@example.com', key='x' * 256)
+    assert response.status_code == 400
+    assert 'Invalid Idempotency-Key' in response.get_json()['error']
+
+    # Errors are not stored, so the same key runs again on a resend.
+    for _ in range(2):
+        response = book(client, 9999, 'a@example.com', key='missing')
+        assert response.status_code == 400 and 'Idempotent-Replayed' not in response.headers
+    assert book(client, class_id, 'a@example.com', key='first').status_code == 201
+    response = book(client, class_id, 'a@example.com', key='second')
+    assert response.get_json()['error'] == 'You are already booked for this class.'
+    stored = [row[0] for row in get_db().execute("SELECT key FROM IdempotencyKeys")]
+    assert stored == ['first']
+
+def test_concurrent_resends_run_once(client, app):
+    class_id = add_future_class(capacity=50)
+    responses = []
+    start = threading.Barrier(8)
+
+    def resend():
+        start.wait()
+        responses.append(book(app.test_client(), class_id, 'burst@example.com', key='burst'))
+
+    threads = [threading.Thread(target=resend) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert [r.status_code for r in responses] == [201] * 8
+    assert len({r.get_json()['booking_id'] for r in responses}) == 1
+    assert sum('Idempotent-Replayed' not in r.headers for r in responses) == 1
+    assert count_bookings(class_id) == 1
+
+def test_expired_keys_are_evicted_in_bulk(client):
+    class_id = add_future_class(capacity=10)
+    db = get_db()
+    now = int(time.time())
+    db.executemany("INSERT INTO IdempotencyKeys (key, request_hash, booking_id, expires_at) VALUES (?, 'x', 1, ?)",
+                   [(f'old-{i}', now - 1) for i in range(500)] + [('live', now + 3600)])
+    db.commit()
+
+    # An expired key is not replayed; it is simply run again.
+    response = book(client, class_id, 'late@example.com', key='old-1')
+    assert response.status_code == 201 and 'Idempotent-Replayed' not in response.headers
+    remaining = [row[0] for row in db.execute("SELECT key FROM IdempotencyKeys ORDER BY key")]
+    assert remaining == ['live', 'old-1']
+
+    # Eviction runs at most once per interval in each worker.
+    db.execute("UPDATE IdempotencyKeys SET expires_at = ? WHERE key = 'live'", (now - 1,))
+    db.commit()
+    assert book(client, class_id, 'later@example.com', key='new').status_code == 201
+    assert db.execute("SELECT COUNT(*) FROM IdempotencyKeys").fetchone()[0] == 3
+    assert get_idempotency_cache().get('old-1', time.time()) is not None
@@ -0,0 +1,110 @@
+# ==============================================================================
+#  FILE: test_import.py
+#  DESCRIPTION: Tests for the bulk class import command.
+# ==============================================================================
+import json
+import sqlite3
+import pytest
+from app.importer import convert_row, import_classes, read_rows
+from app.migrations import migrate
+from app.utils import DEFAULT_TZ
+
+@pytest.fixture
+def db_path(app, monkeypatch, tmp_path):
+    """A migrated file database that the app's CLI commands use."""
+    path = str(tmp_path / "import.db")
+    monkeypatch.setitem(app.config, 'DATABASE', path)
+    migrate(sqlite3.connect(path))
+    return path
+
+def read_classes(path):
+    db = sqlite3.connect(path)
+    return db.execute(
+        "SELECT name, instructor, start_time, capacity, available_slots FROM Classes ORDER BY start_time").fetchall()
+
+def test_convert_row_uses_row_timezone():
+    """Local times are converted to UTC in the row's timezone, or the default one."""
+    row = {'name': 'Yoga', 'instructor': 'Chloe', 'start_time': '2030-01-07 08:00', 'capacity': '20'}
+    assert convert_row(row, DEFAULT_TZ) == ('Yoga', '2030-01-07 02:30:00', 'Chloe', 20, 20)
+    row = dict(row, timezone='America/New_York', available_slots=5)
+    assert convert_row(row, DEFAULT_TZ)[1:] == ('2030-01-07 13:00:00', 'Chloe', 20, 5)
+
+@pytest.mark.parametrize('change, error', [
+    ({'name': ''}, 'Missing name.'),
+    ({'start_time': '07/01/2030'}, 'Invalid start_time'),
+    ({'timezone': 'Mars/Olympus'}, 'Invalid timezone specified.'),
+    ({'capacity': '0'}, 'Invalid capacity'),
+    ({'available_slots': 21}, 'cannot exceed capacity'),
+])
+def test_convert_row_rejects_bad_rows(change, error):
+    row = {'name': 'Yoga', 'instructor': 'Chloe', 'start_time': '2030-01-07 08:00', 'capacity': 20}
+    with pytest.raises(ValueError, match=error):
+        convert_row(dict(row, **change), DEFAULT_TZ)
+
+def test_import_csv_upserts_on_natural_key(app, db_path, tmp_path):
+    """Re-importing a class updates its capacity and keeps the seats already booked."""
+    csv_path = tmp_path / "timetable.csv"
+    csv_path.write_text("name,instructor,start_time,timezone,capacity\n"
+                        "Yoga,Chloe,2030-01-07 08:00,,20\n"
+                        "Spin,David,2030-01-07 09:00,Europe/London,10\n")
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['import-classes', str(csv_path)])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 classes: 2 new or changed' in result.output
+    assert 'rows/s' in result.output
+
+    db = sqlite3.connect(db_path)
+    db.execute("UPDATE Classes SET available_slots = 15 WHERE name = 'Yoga'")  # 5 seats booked
+    db.commit()
+    csv_path.write_text("name,instructor,start_time,capacity\n"
+                        "Yoga,Chloe,2030-01-07 02:30:00+00:00,12\n"
+                        "Spin,David,2030-01-07 09:00:00,10\n")
+    result = runner.invoke(args=['import-classes', str(csv_path), '--timezone', 'Europe/London'])
+    assert 'Imported 2 classes: 1 new or changed' in result.output
+    assert read_classes(db_path) == [
+        ('Yoga', 'Chloe', '2030-01-07 02:30:00', 12, 7),
+        ('Spin', 'David', '2030-01-07 09:00:00', 10, 10),
+    ]
+
+def test_import_jsonl_skips_invalid_rows_up_to_max_errors(app, db_path, tmp_path):
+    jsonl_path = tmp_path / "timetable.jsonl"
+    jsonl_path.write_text('{"name": "Yoga", "instructor": "Chloe", "start_time": "2030-01-07T08:00", "capacity": 20}\n'
+                          'not json\n'
+                          '{"name": "Spin", "instructor": "David", "start_time": "2030-01-08 08:00", "capacity": -1}\n')
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['import-classes', str(jsonl_path)])
+    assert result.exit_code != 0
+    assert 'Line 2: Row is not a JSON object.' in result.output
+    assert read_classes(db_path) == []
+
+    result = runner.invoke(args=['import-classes', str(jsonl_path), '--max-errors', '2'])
+    assert result.exit_code == 0, result.output
+    assert '2 invalid rows skipped' in result.output
+    assert [row[0] for row in read_classes(db_path)] == ['Yoga']
+
+def test_import_commits_in_chunks_and_can_defer_indexes(db_path):
+    """
+    Large loads are split into transactions that bump the data version once
+    each, and suspended triggers and deferred indexes come back afterwards.
+    """
+    db = sqlite3.connect(db_path)
+    schema = "SELECT type, name FROM sqlite_master WHERE tbl_name = 'Classes' ORDER BY name"
+    version = "SELECT version FROM DataVersions WHERE name = 'classes'"
+    before = db.execute(schema).fetchall()
+    lines = [json.dumps({'name': f'Class {i}', 'instructor': 'Tess',
+                         'start_time': f'2030-01-{1 + i % 28:02d} {6 + i % 12:02d}:00', 'capacity': 10})
+             for i in range(1000)]
+    progress = []
+
+    stats = import_classes(db, read_rows(lines, 'jsonl'), DEFAULT_TZ, chunk_rows=100, commit_rows=300,
+                           on_progress=lambda s: progress.append(s['read']))
+    assert stats['written'] == 1000
+    assert progress == [300, 600, 900]
+    assert db.execute(version).fetchone()[0] == 4
+
+    stats = import_classes(db, read_rows(lines, 'jsonl'), DEFAULT_TZ, defer_indexes=True)
+    assert stats['read'] == 1000 and stats['written'] == 0
+    assert db.execute(schema).fetchall() == before
+    assert db.execute(version).fetchone()[0] == 4
+    assert db.execute("SELECT COUNT(*) FROM Classes").fetchone()[0] == 1000
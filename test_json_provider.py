@@ -0,0 +1,46 @@
+# ==============================================================================
+#  FILE: test_json_provider.py
+#  DESCRIPTION: Tests for the pluggable JSON provider.
+# ==============================================================================
+import datetime
+import decimal
+import pytest
+from app import create_app
+from app.database import create_schema, get_db
+from app.json_provider import OrjsonProvider, StdlibProvider, make_json_provider, compact_dumps, orjson
+from conftest import seed_classes
+
+def make_app(backend):
+    app = create_app('config.TestingConfig')
+    app.config['JSON_BACKEND'] = backend
+    app.json = make_json_provider(app)
+    return app
+
+def listing_bodies(app):
+    with app.app_context():
+        create_schema(get_db())
+        seed_classes(30)
+        client = app.test_client()
+        return [client.get(url).get_data() for url in
+                ('/api/classes?limit=10&timezone=Asia/Kolkata', '/api/classes?stream=1')]
+
+def test_stdlib_backend_and_bad_names():
+    assert type(make_app('stdlib').json) is StdlibProvider
+    with pytest.raises(ValueError, match='Invalid JSON_BACKEND'):
+        make_app('simplejson')
+
+@pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+def test_orjson_output_matches_stdlib():
+    """Both backends send the same bytes for the listings, so ETags agree across workers."""
+    fast = make_app('auto')
+    assert isinstance(fast.json, OrjsonProvider)
+    assert listing_bodies(fast) == listing_bodies(make_app('stdlib'))
+
+    value = {'b': datetime.datetime(2030, 1, 7, 8, 0), 'a': decimal.Decimal('1.5'), 'c': None, 'd': 'Zoë'}
+    slow = make_app('stdlib')
+    with fast.app_context():
+        assert compact_dumps(fast.json)(value) == compact_dumps(slow.json)(value)
+        body = fast.json.response(value).get_data()
+        assert body == '{"a":"1.5","b":"Mon, 07 Jan 2030 08:00:00 GMT","c":null,"d":"Zoë"}\n'.encode()
+    with slow.app_context():
+        assert slow.json.response(value).get_data() == body
@@ -0,0 +1,103 @@
+# ==============================================================================
+#  FILE: test_logs.py
+#  DESCRIPTION: Tests for queue-based, structured request logging.
+# ==============================================================================
+import os
+import sys
+import json
+import queue
+import logging
+import subprocess
+import pytest
+from app.logs import JsonFormatter, SuccessSampler, DeferredQueueHandler, configure_logging, SAMPLED
+from app.metrics import REGISTRY
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# A worker process: logs go through the queue, and exiting drains it.
+WORKER = """
+from app import create_app
+from app.database import clone_template, get_db
+from conftest import add_future_class, book
+app = create_app('config.TestingConfig')
+with app.app_context():
+    clone_template(get_db())
+    response = book(app.test_client(), add_future_class(), 'queued@example.com')
+    print(response.headers['X-Request-ID'])
+"""
+
+# A preloading server: the app is created, then workers are forked from it.
+FORKED = """
+import os, logging
+from app import create_app
+create_app('config.TestingConfig')
+logging.warning('preloaded')
+pid = os.fork()
+if pid == 0:
+    logging.warning('from the child')
+    raise SystemExit(0)
+os.waitpid(pid, 0)
+logging.warning('from the parent')
+"""
+
+def make_record(msg, *args, **extra):
+    record = logging.LogRecord('app', logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_fields():
+    entry = json.loads(JsonFormatter().format(make_record('Booked %s', 7, request_id='abc', endpoint='/api/book',
+                                                          duration_ms=1.5)))
+    assert entry['message'] == 'Booked 7'
+    assert (entry['level'], entry['logger']) == ('INFO', 'app')
+    assert (entry['request_id'], entry['endpoint'], entry['duration_ms']) == ('abc', '/api/book', 1.5)
+    assert entry['ts'].endswith('+00:00')
+    assert 'request_id' not in json.loads(JsonFormatter().format(make_record('Started')))
+
+def test_sampler_only_drops_sampled_records():
+    sampler = SuccessSampler(0.0)
+    assert not sampler.filter(make_record('Booked', **SAMPLED))
+    assert sampler.filter(make_record('Error during booking'))
+    assert SuccessSampler(1.0).filter(make_record('Booked', **SAMPLED))
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    handler = DeferredQueueHandler(queue.Queue(1))
+    handler.handle(make_record('Booked %s for %d', 'a@example.com', 7))
+    dropped = REGISTRY.counters.get(('log_records_dropped_total', ()), 0)
+    handler.handle(make_record('Booked %s', 8))
+    assert REGISTRY.counters[('log_records_dropped_total', ())] == dropped + 1
+    assert handler.queue.get_nowait().args == ('a@example.com', 7)
+
+def test_queue_handler_formats_mutable_args_at_call_time():
+    handler = DeferredQueueHandler(queue.Queue())
+    emails = ['a@example.com']
+    handler.handle(make_record('Booked %s', emails))
+    emails.append('b@example.com')
+    record = handler.queue.get_nowait()
+    assert (record.getMessage(), record.args) == ("Booked ['a@example.com']", None)
+
+def test_configure_logging_rejects_unknown_format():
+    with pytest.raises(ValueError, match='LOG_FORMAT'):
+        configure_logging({'LOG_FORMAT': 'xml'})
+
+def test_request_id_header(client):
+    response = client.get('/api/classes', headers={'X-Request-ID': 'trace-42'})
+    assert response.headers['X-Request-ID'] == 'trace-42'
+    generated = client.get('/api/classes').headers['X-Request-ID']
+    assert len(generated) == 16 and generated != client.get('/api/classes').headers['X-Request-ID']
+    assert client.get('/api/classes', headers={'X-Request-ID': 'x' * 500}).headers['X-Request-ID'] != 'x' * 500
+
+def test_forked_worker_starts_its_own_listener():
+    out = subprocess.run([sys.executable, '-c', FORKED], cwd=ROOT, capture_output=True, text=True, check=True)
+    messages = sorted(json.loads(line)['message'] for line in out.stderr.splitlines())
+    assert messages == ['from the child', 'from the parent', 'preloaded']
+
+def test_worker_writes_json_lines_on_exit():
+    out = subprocess.run([sys.executable, '-c', WORKER], cwd=ROOT, capture_output=True, text=True, check=True)
+    request_id = out.stdout.strip()
+    entries = [json.loads(line) for line in out.stderr.splitlines()]
+    booked = [e for e in entries if e['message'].startswith('Booking successful for queued@example.com')]
+    assert len(booked) == 1
+    assert booked[0]['request_id'] == request_id
+    assert booked[0]['endpoint'] == '/api/book'
+    assert booked[0]['duration_ms'] >= 0
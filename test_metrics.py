@@ -0,0 +1,102 @@
+# ==============================================================================
+#  FILE: test_metrics.py
+#  DESCRIPTION: Tests for request/SQL instrumentation and the /metrics endpoint.
+# ==============================================================================
+import os
+import re
+import glob
+import json
+import pytest
+from app.database import create_schema, get_db
+from app import metrics
+from app.metrics import (HELP, REGISTRY, Registry, collect, mark_process_dead, remove_snapshot, render,
+                         statement_label, write_snapshot)
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        create_schema(get_db())
+        yield app.test_client()
+
+def test_metrics_records_requests_and_statements(client):
+    """Requests, SQL statements and write-lock waits all show up at /metrics."""
+    client.get('/api/classes')
+    client.post('/api/book', data=json.dumps({
+        "class_id": 999, "client_name": "M", "client_email": "m@example.com"
+    }), content_type='application/json')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_count{endpoint="/api/classes",method="GET",status="200"}' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="/api/book",method="POST",status="400",le="+Inf"}' in text
+    assert 'sqlite_statement_duration_seconds_count{statement="SELECT generation, version FROM DataVersions WHERE name = ?"}' in text
+    assert 'sqlite_lock_wait_seconds_count' in text
+    assert 'sqlite_pool_in_use{database=":memory:"' in text
+
+def test_metrics_merges_other_workers(app, client, monkeypatch, tmp_path):
+    """Snapshots published by other workers, running or exited, are added to this worker's values."""
+    other = Registry()
+    other.inc('sqlite_busy_retries_total', value=3)
+    other.observe('http_request_duration_seconds', ('/api/classes', 'GET', '200'), 0.002)
+    for pid in (101, 102):
+        (tmp_path / f'metrics-{pid}.json').write_text(json.dumps(other.snapshot()))
+    monkeypatch.setitem(app.config, 'METRICS_MULTIPROC_DIR', str(tmp_path))
+
+    REGISTRY.reset()
+    REGISTRY.inc('sqlite_busy_retries_total', value=2)
+    counters, histograms = collect(str(tmp_path))
+    assert counters[('sqlite_busy_retries_total', ())] == 8
+    assert histograms[('http_request_duration_seconds', ('/api/classes', 'GET', '200'))][0] == 2
+
+    # A worker marked dead, and this one as it exits, are folded into the aggregate: the totals don't drop.
+    mark_process_dead(str(tmp_path), 102)
+    client.get('/api/classes')
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
+    remove_snapshot(str(tmp_path))
+    REGISTRY.reset()
+    assert sorted(p.name for p in tmp_path.glob('metrics-*.json')) == ['metrics-101.json', 'metrics-aggregate.json']
+    counters, histograms = collect(str(tmp_path))
+    assert counters[('sqlite_busy_retries_total', ())] == 8
+    assert histograms[('http_request_duration_seconds', ('/api/classes', 'GET', '200'))][0] == 3
+
+def test_reused_pid_folds_its_predecessor(monkeypatch, tmp_path):
+    """A worker killed without folding itself in still counts once its pid is taken by a new one."""
+    monkeypatch.setattr(metrics, '_published_pid', None)  # As in a freshly started worker.
+    killed = Registry()
+    killed.inc('sqlite_busy_retries_total', value=4)
+    (tmp_path / f'metrics-{os.getpid()}.json').write_text(json.dumps(killed.snapshot()))
+    REGISTRY.reset()
+    assert collect(str(tmp_path))[0][('sqlite_busy_retries_total', ())] == 4
+    REGISTRY.inc('sqlite_busy_retries_total')
+    write_snapshot(str(tmp_path))
+    assert collect(str(tmp_path))[0][('sqlite_busy_retries_total', ())] == 5
+    remove_snapshot(str(tmp_path))
+    assert [p.name for p in tmp_path.glob('metrics-*.json')] == ['metrics-aggregate.json']
+
+def test_every_recorded_metric_is_typed():
+    """Each name passed to REGISTRY.inc()/observe() has a HELP entry, so none renders as untyped."""
+    recorded = set()
+    for path in glob.glob(os.path.join(os.path.dirname(metrics.__file__), '*.py')):
+        with open(path) as f:
+            recorded.update(re.findall(r"REGISTRY\.(?:inc|observe)\('(\w+)'", f.read()))
+    assert 'read_snapshot_copy_seconds' in recorded
+    assert recorded <= set(HELP)
+
+def test_render_histogram_is_cumulative():
+    """Prometheus buckets are cumulative and end with +Inf."""
+    registry = Registry()
+    for seconds in (0.0001, 0.003, 0.003, 20):
+        registry.observe('sqlite_lock_wait_seconds', (), seconds)
+    snap = registry.snapshot()
+    name, labels, count, total, counts, buckets = snap['histograms'][0]
+    text = render({}, {(name, tuple(labels)): [count, total, counts, buckets]})
+    assert 'sqlite_lock_wait_seconds_bucket{le="0.0005"} 1' in text
+    assert 'sqlite_lock_wait_seconds_bucket{le="0.005"} 3' in text
+    assert 'sqlite_lock_wait_seconds_bucket{le="+Inf"} 4' in text
+    assert 'sqlite_lock_wait_seconds_count 4' in text
+
+def test_statement_label_is_bounded():
+    """Whitespace and IN-lists are normalized so labels don't explode."""
+    assert statement_label("SELECT *\n   FROM Users WHERE id IN (?, ?, ?)") == "SELECT * FROM Users WHERE id IN (?...)"
@@ -2,22 +2,12 @@
 #  FILE: test_routes.py
 #  DESCRIPTION: Unit tests for the API endpoints.
 # ==============================================================================
-import pytest
 import json
-from app.database import create_schema, seed_data, get_db
+import datetime
+from app.database import get_db
+from conftest import add_future_class, book
 
-# The 'app' fixture is now defined in conftest.py and available automatically.
-
-@pytest.fixture
-def client(app):
-    """
-    A test client for the app. This fixture depends on the 'app' fixture
-    from conftest.py and sets up a clean database for each test.
-    """
-    with app.app_context():
-        create_schema(get_db())
-        seed_data(get_db())
-        yield app.test_client()
+# The 'app' and 'client' fixtures are defined in conftest.py and available automatically.
 
 # --- Test Cases for /api/classes ---
 
@@ -37,6 +27,86 @@ def test_get_classes_with_timezone(client):
     data = response.get_json()
     assert 'EDT' in data[0]['start_time'] or 'EST' in data[0]['start_time']
 
+def test_get_classes_etag_and_304(client):
+    """Unchanged schedules answer If-None-Match with 304; a booking changes the ETag."""
+    class_id = add_future_class(capacity=4)
+    first = client.get('/api/classes')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+
+    again = client.get('/api/classes', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+
+    assert book(client, class_id, 'etag@example.com').status_code == 201
+    after_booking = client.get('/api/classes', headers={'If-None-Match': etag})
+    assert after_booking.status_code == 200
+    assert after_booking.headers['ETag'] != etag
+    assert after_booking.get_json()[0]['available_slots'] == 3
+
+def test_get_classes_cache_is_keyed_by_timezone(client):
+    """Cached listings are kept per timezone."""
+    add_future_class()
+    utc = client.get('/api/classes').get_json()
+    ist = client.get('/api/classes?timezone=Asia/Kolkata').get_json()
+    assert utc[0]['start_time'].endswith('UTC+0000')
+    assert ist[0]['start_time'].endswith('IST+0530')
+
+def test_get_classes_invalidated_by_any_class_write(client):
+    """Triggers bump the shared version, so writes outside book_class invalidate the cache too."""
+    class_id = add_future_class(capacity=4)
+    etag = client.get('/api/classes').headers['ETag']
+    db = get_db()
+    db.execute("UPDATE Classes SET available_slots = 1 WHERE class_id = ?", (class_id,))
+    db.commit()
+
+    response = client.get('/api/classes', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]['available_slots'] == 1
+
+def test_get_classes_keyset_pagination(client):
+    """Following X-Next-Cursor walks every upcoming class once, in order, ties included."""
+    expected = [add_future_class(name=f'Class {i}', days=1 + i // 2) for i in range(7)]
+    seen, url = [], '/api/classes?limit=3'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 3
+        seen += [c['class_id'] for c in page]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/classes?limit=3&cursor={cursor}' if cursor else None
+    assert seen == expected
+
+def test_get_classes_filters(client):
+    """Instructor, name and local from/to filters are applied in SQL."""
+    mike = add_future_class(name='Spin', days=2, instructor='Mike')
+    add_future_class(name='Spin', days=3, instructor='Sarah')
+    add_future_class(name='Yoga', days=4, instructor='Mike')
+
+    assert [c['class_id'] for c in client.get('/api/classes?instructor=Mike&name=Spin').get_json()] == [mike]
+
+    day = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=3)).strftime('%Y-%m-%d')
+    ranged = client.get(f'/api/classes?from={day}&to={day}').get_json()
+    assert [c['instructor'] for c in ranged] == ['Sarah']
+
+def test_get_classes_rejects_bad_paging_args(client):
+    """Bad cursors, limits and dates are client errors."""
+    assert client.get('/api/classes?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/classes?limit=0').status_code == 400
+    response = client.get('/api/classes?limit=²')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid limit: must be a positive integer.'
+    # Well-formed, but with an id beyond SQLite's integers, or a bool.
+    for cursor in ('WyJ4Iiw5OTk5OTk5OTk5OTk5OTk5OTk5OTk5XQ', 'WyJ4Iix0cnVlXQ'):
+        for url in ('/api/classes', '/api/bookings?email=a@example.com'):
+            response = client.get(f'{url}{"&" if "?" in url else "?"}cursor={cursor}')
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Invalid cursor.'
+    response = client.get('/api/classes?from=yesterday')
+    assert response.status_code == 400
+    assert 'Invalid from' in response.get_json()['error']
+
 # --- Test Cases for /api/book ---
 
 def test_book_class_success(client):
@@ -73,8 +143,155 @@ def test_book_full_class(client):
         "class_id": 2, "client_name": "Extra User", "client_email": "extra@example.com"
     }), content_type='application/json')
     
-    assert final_response.status_code == 400
-    assert final_response.get_json()['error'] == 'No available slots for this class.'
+    # A full class puts the client on the waitlist instead of failing.
+    assert final_response.status_code == 202
+    data = final_response.get_json()
+    assert data['waitlisted'] is True
+    assert data['position'] == 1
+
+def test_book_twice_is_rejected_and_keeps_slot(client):
+    """The UNIQUE(user_id, class_id) constraint rejects a second booking without using a slot."""
+    class_id = add_future_class(capacity=3)
+    assert book(client, class_id, 'twice@example.com').status_code == 201
+
+    response = book(client, class_id, 'Twice@Example.com')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'You are already booked for this class.'
+    slots = get_db().execute("SELECT available_slots FROM Classes WHERE class_id = ?", (class_id,)).fetchone()[0]
+    assert slots == 2
+
+def test_book_fills_class_exactly(client):
+    """The conditional decrement stops at zero slots."""
+    class_id = add_future_class(capacity=2)
+    assert [book(client, class_id, f'fill{i}@example.com').status_code for i in range(3)] == [201, 201, 202]
+    slots = get_db().execute("SELECT available_slots FROM Classes WHERE class_id = ?", (class_id,)).fetchone()[0]
+    assert slots == 0
+
+# --- Test Cases for cancellation and the waitlist ---
+
+def class_state(class_id):
+    db = get_db()
+    slots = db.execute("SELECT available_slots FROM Classes WHERE class_id = ?", (class_id,)).fetchone()[0]
+    waiting = db.execute("SELECT COUNT(*) FROM Waitlist WHERE class_id = ?", (class_id,)).fetchone()[0]
+    return slots, waiting
+
+def test_cancel_promotes_head_of_waitlist(client):
+    """A cancelled slot goes to the first client on the waitlist, in the same transaction."""
+    class_id = add_future_class(capacity=1)
+    booking_id = book(client, class_id, 'first@example.com').get_json()['booking_id']
+    assert book(client, class_id, 'second@example.com').get_json()['position'] == 1
+    assert book(client, class_id, 'third@example.com').get_json()['position'] == 2
+    response = book(client, class_id, 'second@example.com')
+    assert response.get_json()['error'] == 'You are already on the waitlist for this class.'
+    response = book(client, class_id, 'first@example.com')
+    assert response.get_json()['error'] == 'You are already booked for this class.'
+
+    response = client.delete(f'/api/bookings/{booking_id}?email=first@example.com')
+    assert response.status_code == 200
+    promoted = response.get_json()['promoted_booking_id']
+    assert promoted is not None
+    assert class_state(class_id) == (0, 1)
+    assert client.get('/api/bookings?email=second@example.com').status_code == 200
+    # The next client to join lines up behind the one still waiting.
+    assert book(client, class_id, 'fourth@example.com').get_json()['position'] == 2
+
+def test_cancel_without_waitlist_gives_slot_back(client):
+    class_id = add_future_class(capacity=2)
+    booking_id = book(client, class_id, 'solo@example.com').get_json()['booking_id']
+    response = client.delete(f'/api/bookings/{booking_id}?email=solo@example.com')
+    assert response.get_json()['promoted_booking_id'] is None
+    assert class_state(class_id) == (2, 0)
+
+def test_cancel_checks_owner(client):
+    class_id = add_future_class(capacity=2)
+    booking_id = book(client, class_id, 'owner@example.com').get_json()['booking_id']
+    assert client.delete(f'/api/bookings/{booking_id}').status_code == 400
+    response = client.delete(f'/api/bookings/{booking_id}?email=someone@example.com')
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'Booking not found.'
+    assert class_state(class_id) == (1, 0)
+
+def test_leave_waitlist(client):
+    class_id = add_future_class(capacity=1)
+    booking_id = book(client, class_id, 'first@example.com').get_json()['booking_id']
+    waitlist_id = book(client, class_id, 'second@example.com').get_json()['waitlist_id']
+    book(client, class_id, 'third@example.com')
+
+    assert client.delete(f'/api/waitlist/{waitlist_id}?email=third@example.com').status_code == 404
+    assert client.delete(f'/api/waitlist/{waitlist_id}?email=second@example.com').status_code == 200
+    client.delete(f'/api/bookings/{booking_id}?email=first@example.com')
+    # The slot skipped the client who left.
+    assert client.get('/api/bookings?email=second@example.com').status_code == 404
+    assert client.get('/api/bookings?email=third@example.com').status_code == 200
+
+# --- Test Cases for /api/book/batch ---
+
+def test_book_batch_reports_each_item(client):
+    """A batch books what it can and reports the same errors as /api/book per item."""
+    class_id = add_future_class(capacity=2)
+    response = client.post('/api/book/batch', data=json.dumps([
+        {"class_id": class_id, "client_name": "Ann", "client_email": "ann@example.com"},
+        {"class_id": class_id, "client_name": "Ann", "client_email": "ANN@example.com"},
+        {"class_id": 999, "client_name": "Ben", "client_email": "ben@example.com"},
+        {"class_id": class_id, "client_name": "Cat", "client_email": "not-an-email"},
+        {"class_id": class_id, "client_name": "Dan", "client_email": "dan@example.com"},
+        {"class_id": class_id, "client_name": "Eve", "client_email": "eve@example.com"},
+    ]), content_type='application/json')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['booked'] == 2
+    assert data['waitlisted'] == 1
+    assert [r.get('error') for r in data['results']] == [
+        None,
+        'You are already booked for this class.',
+        'Class not found.',
+        'Invalid email format.',
+        None,
+        None,
+    ]
+    assert data['results'][5]['position'] == 1
+    slots = get_db().execute("SELECT available_slots FROM Classes WHERE class_id = ?", (class_id,)).fetchone()[0]
+    assert slots == 0
+
+def test_book_batch_isolates_malformed_items(client):
+    """Items with a missing name, a non-string email or a bool class_id fail alone."""
+    class_id = add_future_class()
+    response = client.post('/api/book/batch', data=json.dumps([
+        {"class_id": class_id, "client_name": None, "client_email": "nil@example.com"},
+        {"class_id": class_id, "client_name": "Num", "client_email": 1},
+        {"class_id": True, "client_name": "Tru", "client_email": "tru@example.com"},
+        {"class_id": class_id, "client_name": "Fay", "client_email": "fay@example.com"},
+    ]), content_type='application/json')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['booked'] == 1
+    assert [r.get('error') for r in data['results']] == [
+        'Invalid client_name: must be a non-empty string.',
+        'Invalid email format.',
+        'Invalid class_id: must be an integer.',
+        None,
+    ]
+
+def test_book_rejects_malformed_fields(client):
+    class_id = add_future_class()
+    response = book(client, class_id, 'nil@example.com', name=None)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid client_name: must be a non-empty string.'
+    response = book(client, class_id, 1)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid email format.'
+
+def test_book_batch_rejects_invalid_payload(client):
+    """The batch endpoint needs a non-empty list of bounded size."""
+    response = client.post('/api/book/batch', data=json.dumps({"class_id": 1}), content_type='application/json')
+    assert response.status_code == 400
+
+    too_many = [{"class_id": 1, "client_name": "X", "client_email": "x@example.com"}] * 101
+    response = client.post('/api/book/batch', data=json.dumps(too_many), content_type='application/json')
+    assert response.status_code == 400
+    assert 'Too many bookings' in response.get_json()['error']
 
 # --- Test Cases for /api/bookings ---
 
@@ -90,6 +307,21 @@ def test_get_bookings_success(client):
     assert len(data) == 1
     assert data[0]['name'] == 'Yoga Flow'
 
+def test_get_bookings_pagination(client):
+    """A user's bookings page by class start time."""
+    class_ids = [add_future_class(name=f'Class {i}', days=1 + i) for i in range(5)]
+    for class_id in class_ids:
+        book(client, class_id, 'pager@example.com')
+
+    first = client.get('/api/bookings?email=pager@example.com&limit=2')
+    assert [b['name'] for b in first.get_json()] == ['Class 0', 'Class 1']
+    cursor = first.headers['X-Next-Cursor']
+    assert 'rel="next"' in first.headers['Link']
+
+    rest = client.get(f'/api/bookings?email=pager@example.com&limit=10&cursor={cursor}')
+    assert [b['name'] for b in rest.get_json()] == ['Class 2', 'Class 3', 'Class 4']
+    assert 'X-Next-Cursor' not in rest.headers
+
 def test_get_bookings_no_email(client):
     """Test that the /bookings endpoint requires an email parameter."""
     response = client.get('/api/bookings')
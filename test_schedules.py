@@ -0,0 +1,116 @@
+# ==============================================================================
+#  FILE: test_schedules.py
+#  DESCRIPTION: Tests for recurring class schedules.
+# ==============================================================================
+import datetime
+from app.database import get_db
+from app.schedules import (INSERT_SCHEDULE_SQL, WEEKDAYS, validate_schedule, occurrences,
+                           occurrence_id, split_occurrence_id)
+from conftest import add_future_class, book
+
+def add_schedule(name='Weekly Yoga', instructor='Chloe', weekday=None, local_time='07:00',
+                 zone='Asia/Kolkata', capacity=10, starts_on=None, ends_on=None):
+    """Inserts a schedule that starts today and returns its schedule_id."""
+    today = datetime.date.today()
+    weekday = weekday or WEEKDAYS[(today.weekday() + 2) % 7]
+    params = validate_schedule(name, instructor, weekday, local_time, zone, capacity,
+                               starts_on or today.isoformat(), ends_on)
+    db = get_db()
+    cursor = db.execute(INSERT_SCHEDULE_SQL, params)
+    db.commit()
+    return cursor.lastrowid
+
+def test_occurrence_ids_round_trip():
+    class_id = occurrence_id(42, 23000)
+    assert class_id < 0
+    assert split_occurrence_id(class_id) == (42, 23000)
+
+def test_occurrences_keep_local_time_across_dst():
+    """A 07:00 New York class is at 12:00 UTC in winter and 11:00 UTC in summer."""
+    schedule = dict(zip(
+        ('schedule_id', 'name', 'instructor', 'weekday', 'local_time', 'timezone', 'capacity', 'starts_on', 'ends_on'),
+        (1,) + validate_schedule('Spin', 'David', 'mon', '07:00', 'America/New_York', 5, '2030-01-01', '2030-12-31')))
+    rows = list(occurrences(schedule, ('2030-02-25 00:00:00', 0), '2030-03-19 00:00:00'))
+    assert [row[2] for row in rows] == [
+        '2030-02-25 12:00:00', '2030-03-04 12:00:00', '2030-03-11 11:00:00', '2030-03-18 11:00:00']
+    assert rows[0][0] > rows[-1][0]  # Later days have bigger magnitudes.
+
+def test_get_classes_serves_virtual_occurrences_in_order(client, app):
+    schedule_id = add_schedule()
+    real_id = add_future_class(days=3)
+    response = client.get('/api/classes?limit=5')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert len(data) == 5
+    assert [c['start_time'] for c in data] == sorted(c['start_time'] for c in data)
+    assert real_id in [c['class_id'] for c in data]
+
+    virtual = [c for c in data if c['class_id'] < 0]
+    assert virtual and all(split_occurrence_id(c['class_id'])[0] == schedule_id for c in virtual)
+    assert virtual[0]['name'] == 'Weekly Yoga' and virtual[0]['available_slots'] == 10
+    assert virtual[0]['start_time'].endswith('01:30:00 UTC+0000')
+    local = client.get('/api/classes?limit=1&timezone=Asia/Kolkata').get_json()[0]
+    assert local['class_id'] == data[0]['class_id'] and local['start_time'].endswith('07:00:00 IST+0530')
+
+    # Keyset paging walks through the merged listing without gaps or repeats.
+    seen, url = [], '/api/classes?limit=2'
+    for _ in range(3):
+        page = client.get(url)
+        seen += [c['class_id'] for c in page.get_json()]
+        url = '/api/classes?limit=2&cursor=' + page.headers['X-Next-Cursor']
+    assert seen[:5] == [c['class_id'] for c in data]
+    assert len(set(seen)) == 6
+
+    # Occurrences stop at the expansion horizon.
+    app.config['SCHEDULE_HORIZON_DAYS'] = 7
+    try:
+        horizon_data = client.get('/api/classes?stream=1').get_json()
+        assert len([c for c in horizon_data if c['class_id'] < 0]) == 1
+    finally:
+        app.config['SCHEDULE_HORIZON_DAYS'] = 90
+
+def test_booking_an_occurrence_materializes_it(client):
+    add_schedule(capacity=2)
+    virtual_id = client.get('/api/classes?limit=1').get_json()[0]['class_id']
+    assert virtual_id < 0
+
+    response = book(client, virtual_id, 'first@example.com')
+    assert response.status_code == 201
+
+    first = client.get('/api/classes?limit=2').get_json()
+    assert first[0]['class_id'] > 0  # Now a real Classes row...
+    assert first[0]['available_slots'] == 1
+    assert first[1]['class_id'] < 0  # ...and next week's occurrence is still virtual.
+
+    # The virtual id keeps pointing at the same class.
+    response = book(client, virtual_id, 'first@example.com')
+    assert response.get_json()['error'] == 'You are already booked for this class.'
+    assert book(client, virtual_id, 'second@example.com').status_code == 201
+    response = book(client, virtual_id, 'third@example.com')
+    assert response.status_code == 202 and response.get_json()['position'] == 1
+
+def test_booking_an_invalid_occurrence(client):
+    schedule_id = add_schedule(ends_on=(datetime.date.today() + datetime.timedelta(days=10)).isoformat())
+    today = (datetime.date.today() - datetime.date(1970, 1, 1)).days
+    for day in (today + 1, today + 16):  # Wrong weekday, then after ends_on.
+        response = book(client, occurrence_id(schedule_id, day), 'a@example.com')
+        assert response.get_json()['error'] == 'Class not found.'
+    response = book(client, occurrence_id(schedule_id + 1, today + 2), 'a@example.com')
+    assert response.get_json()['error'] == 'Class not found.'
+
+def test_filters_apply_to_schedules(client):
+    add_schedule(name='Weekly Yoga', instructor='Chloe')
+    add_schedule(name='Weekly Spin', instructor='David')
+    data = client.get('/api/classes?instructor=David&limit=3').get_json()
+    assert len(data) == 3
+    assert {c['name'] for c in data} == {'Weekly Spin'}
+
+def test_add_schedule_command(app, client):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['add-schedule', 'Pilates', 'Anya', '--weekday', 'Tue', '--time', '18:30',
+                                 '--timezone', 'Europe/London', '--capacity', '12'])
+    assert 'Added schedule 1: Pilates with Anya every tue at 18:30 Europe/London.' in result.output
+    result = runner.invoke(args=['add-schedule', 'Pilates', 'Anya', '--weekday', 'tue', '--time', '25:00',
+                                 '--capacity', '12'])
+    assert result.exit_code != 0
+    assert 'Invalid time' in result.output
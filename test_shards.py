@@ -0,0 +1,123 @@
+# ==============================================================================
+#  FILE: test_shards.py
+#  DESCRIPTION: Tests for per-studio database shards.
+# ==============================================================================
+import json
+import sqlite3
+import datetime
+import pytest
+from app.database import get_db, create_schema
+from app.shards import ID_BITS, prepare_shard, shard_for_studio, shard_for_id
+from conftest import book
+
+@pytest.fixture
+def client(app, monkeypatch, tmp_path):
+    """Two studios, each in its own file, set up by `flask init-db`."""
+    monkeypatch.setitem(app.config, 'SHARDS', {
+        'north': (0, str(tmp_path / "north.db")),
+        'east': (1, str(tmp_path / "east.db")),
+    })
+    app.extensions.pop('response_caches', None)
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert 'Initialized studio east (shard 1).' in result.output
+    with app.app_context():
+        yield app.test_client()
+
+def add_class(studio, name, hours, capacity=5):
+    """Inserts a class in a studio's shard and returns its class_id."""
+    start_time = (datetime.datetime.now(datetime.timezone.utc)
+                  + datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:00')
+    db = get_db(shard_for_studio(studio))
+    cursor = db.execute(
+        "INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) VALUES (?, ?, ?, ?, ?)",
+        (name, start_time, 'Tess', capacity, capacity))
+    db.commit()
+    return cursor.lastrowid
+
+def test_ids_encode_their_shard(client):
+    north_id = add_class('north', 'Row', 1)
+    east_id = add_class('east', 'Row', 1)
+    assert north_id < 1 << ID_BITS <= east_id
+    assert shard_for_id(east_id).studio == 'east'
+    with pytest.raises(LookupError):
+        shard_for_id(5 << ID_BITS)
+
+    # A database that already has rows can't be moved to another shard.
+    with pytest.raises(ValueError, match='outside shard 2'):
+        prepare_shard(get_db(shard_for_studio('east')), 2)
+
+def test_classes_merge_every_studio(client):
+    add_class('north', 'Early North', 1)
+    add_class('east', 'Early East', 2)
+    add_class('north', 'Late North', 3)
+    add_class('east', 'Late East', 4)
+
+    response = client.get('/api/classes?limit=3')
+    assert response.status_code == 200
+    page = response.get_json()
+    assert [(c['name'], c['studio']) for c in page] == [
+        ('Early North', 'north'), ('Early East', 'east'), ('Late North', 'north')]
+    rest = client.get('/api/classes', query_string={'limit': 3, 'cursor': response.headers['X-Next-Cursor']})
+    assert [c['name'] for c in rest.get_json()] == ['Late East']
+
+    streamed = client.get('/api/classes?stream=1').get_json()
+    assert [c['name'] for c in streamed] == ['Early North', 'Early East', 'Late North', 'Late East']
+
+    east = client.get('/api/classes?studio=east').get_json()
+    assert [c['name'] for c in east] == ['Early East', 'Late East']
+    response = client.get('/api/classes?studio=west')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown studio: expected one of north, east.'
+
+def test_bookings_go_to_the_class_shard(client):
+    north_id = add_class('north', 'North Row', 1)
+    east_id = add_class('east', 'East Row', 2)
+    first = book(client, east_id, 'ann@example.com')
+    assert first.status_code == 201
+    assert book(client, north_id, 'ann@example.com').status_code == 201
+    assert first.get_json()['booking_id'] >> ID_BITS == 1
+
+    east_db = get_db(shard_for_studio('east'))
+    assert east_db.execute("SELECT COUNT(*) FROM Bookings").fetchone()[0] == 1
+    listing = client.get('/api/bookings?email=ann@example.com').get_json()
+    assert [(b['name'], b['studio']) for b in listing] == [('North Row', 'north'), ('East Row', 'east')]
+
+    response = client.delete(f"/api/bookings/{first.get_json()['booking_id']}?email=ann@example.com")
+    assert response.status_code == 200
+    assert east_db.execute("SELECT available_slots FROM Classes WHERE class_id = ?", (east_id,)).fetchone()[0] == 5
+    assert client.delete(f'/api/bookings/{7 << ID_BITS}?email=ann@example.com').status_code == 404
+    assert book(client, 7 << ID_BITS, 'ann@example.com').get_json()['error'] == 'Class not found.'
+
+def test_batch_spans_shards(client):
+    north_id = add_class('north', 'North Row', 1)
+    east_id = add_class('east', 'East Row', 2, capacity=1)
+    response = client.post('/api/book/batch', data=json.dumps([
+        {"class_id": east_id, "client_name": "A", "client_email": "a@example.com"},
+        {"class_id": north_id, "client_name": "A", "client_email": "a@example.com"},
+        {"class_id": east_id, "client_name": "B", "client_email": "b@example.com"},
+        {"class_id": 9 << ID_BITS, "client_name": "B", "client_email": "b@example.com"},
+    ]), content_type='application/json')
+    body = response.get_json()
+    assert (body['booked'], body['waitlisted'], body['failed']) == (2, 1, 1)
+    assert body['results'][2]['position'] == 1
+    assert body['results'][3]['error'] == 'Class not found.'
+
+def test_slot_stream_needs_a_studio(client):
+    response = client.get('/api/classes/stream')
+    assert response.status_code == 400
+    assert 'Unknown studio' in response.get_json()['error']
+
+def test_migrate_prepares_every_shard(app, tmp_path, monkeypatch):
+    paths = [str(tmp_path / "a.db"), str(tmp_path / "b.db")]
+    for path in paths:
+        db = sqlite3.connect(path)
+        create_schema(db)
+        db.close()
+    monkeypatch.setitem(app.config, 'SHARDS', {'a': (0, paths[0]), 'b': (3, paths[1])})
+    result = app.test_cli_runner().invoke(args=['migrate-db'])
+    assert result.exit_code == 0, result.output
+    assert 'b: Database is up to date.' in result.output
+    db = sqlite3.connect(paths[1])
+    cursor = db.execute("INSERT INTO Classes (name, start_time, instructor, capacity, available_slots) "
+                        "VALUES ('X', '2030-01-01 00:00:00', 'Y', 1, 1)")
+    assert cursor.lastrowid == (3 << ID_BITS) + 1
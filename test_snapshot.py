@@ -0,0 +1,77 @@
+# ==============================================================================
+#  FILE: test_snapshot.py
+#  DESCRIPTION: Tests for the read-only connections and the read snapshot.
+# ==============================================================================
+import sqlite3
+import pytest
+from app.database import get_pool, get_read_snapshot
+from conftest import add_future_class, book
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    """mode=ro and snapshots need a file database."""
+    return {'DATABASE': str(tmp_path / "snapshot.db")}
+
+@pytest.fixture
+def client(client, app):
+    yield client
+    for snapshot in app.extensions.pop('read_snapshots', {}).values():
+        snapshot.stop()
+
+@pytest.fixture
+def snapshot_client(client, monkeypatch, app):
+    """Snapshots that only refresh when the test says so."""
+    monkeypatch.setitem(app.config, 'READ_SNAPSHOT_ENABLED', True)
+    monkeypatch.setitem(app.config, 'READ_SNAPSHOT_INTERVAL', 60)
+    return client
+
+def class_ids(client):
+    return [c['class_id'] for c in client.get('/api/classes').get_json()]
+
+def test_read_only_pool_sees_commits_but_cannot_write(client):
+    pool = get_pool(read_only=True)
+    conn = pool.acquire()
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            conn.execute("DELETE FROM Classes")
+    finally:
+        pool.release(conn)
+    class_id = add_future_class()
+    assert class_id in class_ids(client)
+
+def test_snapshot_serves_reads_until_refreshed(snapshot_client):
+    client = snapshot_client
+    first_id = add_future_class()
+    assert class_ids(client) == [first_id]
+
+    second_id = add_future_class(days=2)
+    assert book(client, first_id, 'snap@example.com').status_code == 201
+    assert class_ids(client) == [first_id]  # Still the copy taken before.
+    assert client.get('/api/bookings?email=snap@example.com').status_code == 404
+
+    get_read_snapshot().refresh()
+    assert class_ids(client) == [first_id, second_id]
+    assert client.get('/api/bookings?email=snap@example.com').status_code == 200
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'read_snapshot_age_seconds{database=' in metrics
+
+def test_stale_snapshot_falls_back_to_read_only(snapshot_client, app, monkeypatch):
+    client = snapshot_client
+    assert class_ids(client) == []
+    class_id = add_future_class()
+    monkeypatch.setitem(app.config, 'READ_SNAPSHOT_MAX_STALENESS', 0)
+    assert class_ids(client) == [class_id]
+
+def test_retired_copy_stays_readable_until_released(snapshot_client):
+    snapshot = get_read_snapshot()
+    old, old_lease = snapshot.acquire()
+    add_future_class()
+    snapshot.refresh()
+    new, new_lease = snapshot.acquire()
+    count = "SELECT COUNT(*) FROM Classes"
+    assert new.execute(count).fetchone()[0] == old.execute(count).fetchone()[0] + 1
+    snapshot.refresh()  # Nothing committed since: the copy is kept.
+    assert snapshot.acquire()[1] is new_lease
+    snapshot.release(old, old_lease)
+    snapshot.release(new, new_lease)
@@ -0,0 +1,48 @@
+# ==============================================================================
+#  FILE: test_startup.py
+#  DESCRIPTION: Start-up time budget for worker processes.
+# ==============================================================================
+import os
+import sys
+import json
+import sqlite3
+import subprocess
+from app.database import clone_template
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Generous enough for a loaded CI machine; a regression such as an eager
+# import of a large library or work at import time still shows up in LAZY.
+IMPORT_BUDGET_SECONDS = 1.5
+CREATE_APP_BUDGET_SECONDS = 0.5
+# Modules that only the requests or deployments that need them import.
+LAZY = ('pytz', 'concurrent.futures', 'app.snapshot', 'app.group_commit')
+
+MEASURE = """
+import sys, time, json
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app('config.Config')
+created = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+""" % (LAZY,)
+
+def test_cold_start_within_budget():
+    out = subprocess.run([sys.executable, '-c', MEASURE], cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout)
+    assert result['loaded'] == []
+    assert result['import'] < IMPORT_BUDGET_SECONDS
+    assert result['create_app'] < CREATE_APP_BUDGET_SECONDS
+
+def test_clone_template_resets_a_database():
+    db = sqlite3.connect(':memory:')
+    clone_template(db)
+    db.execute("DELETE FROM Classes")
+    db.execute("INSERT INTO Users (name, email, password_hash) VALUES ('X', 'x@example.com', 'h')")
+    db.commit()
+    clone_template(db)
+    assert db.execute("SELECT COUNT(*) FROM Classes").fetchone()[0] == 7
+    assert db.execute("SELECT COUNT(*) FROM Users WHERE email = 'x@example.com'").fetchone()[0] == 0
+    assert db.execute("PRAGMA user_version").fetchone()[0] > 0
@@ -0,0 +1,63 @@
+# ==============================================================================
+#  FILE: test_streaming.py
+#  DESCRIPTION: Tests for streamed (JSON array / NDJSON) listing exports.
+# ==============================================================================
+import sys
+import json
+import resource
+import pytest
+from app.database import create_schema, get_db
+from conftest import seed_classes
+
+SEED_CLASSES = 1_000_000
+
+@pytest.fixture
+def client(app):
+    """A test client over an empty schema."""
+    with app.app_context():
+        create_schema(get_db())
+        yield app.test_client()
+
+def test_stream_json_array_matches_paged_listing(client):
+    """?stream=1 returns the same objects as the paged endpoint, as one array."""
+    seed_classes(250)
+    streamed = client.get('/api/classes?stream=1&timezone=Asia/Kolkata')
+    assert streamed.is_streamed
+    assert len(streamed.get_json()) == 250
+    paged = client.get('/api/classes?limit=100&timezone=Asia/Kolkata').get_json()
+    assert streamed.get_json()[:100] == paged
+
+def test_stream_ndjson(client):
+    """Accept: application/x-ndjson returns one JSON object per line."""
+    seed_classes(60)
+    response = client.get('/api/classes?instructor=Coach 1', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['name'] for line in lines] == ['Class 1', 'Class 51']
+
+def test_stream_empty_listing(client):
+    """An empty export is still a valid JSON array."""
+    assert client.get('/api/classes?stream=1').get_json() == []
+    assert client.get('/api/bookings?email=nobody@example.com&stream=1').get_json() == []
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def test_stream_memory_stays_bounded(client):
+    """Exporting 1M classes must not hold the result set in memory."""
+    seed_classes(SEED_CLASSES)
+    response = client.get('/api/classes?stream=1', buffered=False)
+
+    before = peak_rss_bytes()
+    try:
+        total_bytes = sum(len(chunk) for chunk in response.response)
+    finally:
+        response.close()
+    growth = peak_rss_bytes() - before
+
+    # Materializing the listing would take hundreds of MB of dicts and strings;
+    # streaming it should only ever hold a chunk.
+    assert total_bytes > 100 * 1024 * 1024
+    assert growth < 48 * 1024 * 1024
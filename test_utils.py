@@ -5,7 +5,7 @@
 import pytest
 import datetime
 import pytz
-from app.utils import to_utc, from_utc, DEFAULT_TZ
+from app.utils import to_utc, from_utc, from_utc_many, get_timezone, DEFAULT_TZ
 
 def test_to_utc_conversion():
     """
@@ -48,3 +48,47 @@ def test_from_utc_handles_none():
     Tests that from_utc returns None if given None.
     """
     assert from_utc(None, DEFAULT_TZ) is None
+
+def from_utc_reference(utc_str, tz):
+    """The strptime/astimezone/strftime conversion from_utc must stay identical to."""
+    dt_utc = pytz.utc.localize(datetime.datetime.strptime(utc_str, '%Y-%m-%d %H:%M:%S'))
+    return dt_utc.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S %Z%z')
+
+@pytest.mark.parametrize("zone", ["UTC", "Asia/Kolkata", "America/New_York", "Europe/London",
+                                  "Australia/Lord_Howe", "Asia/Kathmandu"])
+def test_from_utc_matches_reference_around_transitions(zone):
+    """
+    Tests the cached offset tables against pytz on both sides of every DST
+    transition from 2020 to 2030.
+    """
+    tz = get_timezone(zone)
+    instants = [datetime.datetime(2025, 1, 1, 12, 0, 0)]
+    for transition in getattr(tz, '_utc_transition_times', []):
+        if 2020 <= transition.year <= 2030:
+            instants += [transition + datetime.timedelta(seconds=delta) for delta in (-1, 0, 1)]
+    utc_strs = [dt.strftime('%Y-%m-%d %H:%M:%S') for dt in instants]
+
+    expected = [from_utc_reference(s, tz) for s in utc_strs]
+    assert [from_utc(s, tz) for s in utc_strs] == expected
+    assert from_utc_many(utc_strs, tz) == expected
+
+@pytest.mark.parametrize("zone", ["UTC", "Asia/Kolkata", "America/New_York", "Europe/London",
+                                  "Australia/Lord_Howe", "America/St_Johns"])
+def test_to_utc_matches_localize(zone):
+    """Tests the cached steady offsets against tz.localize() hour by hour through 2024."""
+    tz = get_timezone(zone)
+    start = datetime.datetime(2024, 1, 1, 0, 30)
+    for hour in range(0, 366 * 24):
+        local = start + datetime.timedelta(hours=hour)
+        assert to_utc(local, tz) == tz.localize(local).astimezone(pytz.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def test_from_utc_many_handles_none():
+    """Tests that column conversion keeps empty values in place."""
+    assert from_utc_many(["2025-07-08 14:00:00", None], pytz.timezone("America/New_York")) == [
+        "2025-07-08 10:00:00 EDT-0400", None]
+
+def test_get_timezone_caches_and_rejects_unknown_names():
+    """Tests that timezones are resolved once and unknown names still raise."""
+    assert get_timezone("Europe/Paris") is get_timezone("Europe/Paris")
+    with pytest.raises(pytz.UnknownTimeZoneError):
+        get_timezone("Mars/Olympus_Mons")